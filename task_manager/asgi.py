@@ -9,8 +9,29 @@ https://docs.djangoproject.com/en/4.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'task_manager.settings')
 
-application = get_asgi_application()
+# What get_asgi_application does, with a handler awaiting the parts of the exports it streams
+django.setup(set_prefix=False)
+
+from django.core.signals import request_finished
+
+from tasks.connections import close_request_connections
+from tasks.events import EVENTS_PATH, EventStream
+from tasks.streaming import StreamingASGIHandler
+
+django_application = StreamingASGIHandler()
+
+# Connections are kept open by the threads that outlive requests only
+request_finished.connect(close_request_connections)
+
+events_application = EventStream()
+
+
+async def application(scope, receive, send):
+    # Event streams are long-lived, they are served by a plain ASGI application rather than a Django view
+    if scope['type'] == 'http' and scope['path'] == EVENTS_PATH:
+        return await events_application(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend starting its transactions with BEGIN IMMEDIATE when SQLITE_IMMEDIATE_TRANSACTIONS is set. A
+    transaction started with BEGIN takes the write lock at its first write, SQLite fails that write at once when
+    another connection wrote since the transaction read, without waiting busy_timeout : taking the lock upfront makes
+    concurrent writers wait for each other instead. Read-only transactions take it too, and wait behind the writers.
+    """
+    def _start_transaction_under_autocommit(self):
+        if getattr(settings, 'SQLITE_IMMEDIATE_TRANSACTIONS', False):
+            self.cursor().execute('BEGIN IMMEDIATE')
+        else:
+            super()._start_transaction_under_autocommit()
@@ -13,6 +13,10 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 from pathlib import Path
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
+from task_manager.database import database_from_url
+
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -48,6 +52,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tasks.middleware.CustomMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,10 +60,12 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'django_browser_reload.middleware.BrowserReloadMiddleware',
-    'tasks.middleware.CustomMiddleware'
 ]
 
+# The reload middleware is sync only and does nothing without DEBUG : left out, every middleware can serve async views
+if DEBUG:
+    MIDDLEWARE.append('django_browser_reload.middleware.BrowserReloadMiddleware')
+
 ROOT_URLCONF = 'task_manager.urls'
 
 SITE_ROOT = os.path.realpath(os.path.dirname(__file__))
@@ -84,12 +91,63 @@ WSGI_APPLICATION = 'task_manager.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Postgres from DATABASE_URL in production, SQLite locally and in the tests. Postgres connections are kept open
+# DATABASE_CONN_MAX_AGE seconds by the threads that outlive requests : sync gunicorn workers, Celery workers and the
+# async read threads, the threads of the requests served under ASGI close theirs. The connections of every process
+# are pooled by a PgBouncer in transaction mode when DATABASE_URL leads to one and DATABASE_POOLED is set.
+if os.environ.get("DATABASE_URL"):
+    DATABASES = {
+        'default': database_from_url(
+            os.environ["DATABASE_URL"],
+            conn_max_age=int(os.environ.get("DATABASE_CONN_MAX_AGE", 600)),
+            pooled=bool(os.environ.get("DATABASE_POOLED")),
+        )
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'task_manager.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+
+# Read replica of the primary from DATABASE_REPLICA_URL, or locally the SQLite file SQLITE_REPLICA_NAME kept in sync
+# by the sync_replica command. The list, detail and history views and the report aggregation read it, the reads of
+# a user stay on the primary for REPLICA_STICKY_SECONDS after each change to their tasks : longer than the replica
+# lags behind, a user always reads their own writes. The writes are remembered in the task cache, a replica needs
+# a shared one (TASK_CACHE_SHARED) : Redis, or the cache of the only process serving the site, e.g. runserver with
+# SQLITE_REPLICA_NAME and TASK_CACHE_SHARED=1 to try the replica locally. In the tests the alias mirrors the primary.
+if os.environ.get("DATABASE_REPLICA_URL"):
+    DATABASES['replica'] = database_from_url(
+        os.environ["DATABASE_REPLICA_URL"],
+        conn_max_age=int(os.environ.get("DATABASE_CONN_MAX_AGE", 600)),
+        pooled=bool(os.environ.get("DATABASE_POOLED")),
+    )
+elif os.environ.get("SQLITE_REPLICA_NAME"):
+    DATABASES['replica'] = {
+        'ENGINE': 'task_manager.backends.sqlite3',
+        'NAME': os.environ["SQLITE_REPLICA_NAME"],
     }
+if 'replica' in DATABASES:
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+DATABASE_REPLICA = 'replica' if 'replica' in DATABASES else None
+DATABASE_ROUTERS = ['tasks.replicas.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.environ.get("REPLICA_STICKY_SECONDS", 10))
+
+# Connections kept open are checked with a round trip at the start of each request or Celery task, a connection
+# the server dropped is replaced rather than failing the first query
+DATABASE_HEALTH_CHECKS = True
+
+# Applied in order to each new SQLite connection : a connection waits busy_timeout milliseconds for a lock held by
+# another, readers do not block the writer in WAL mode, which syncs to disk at checkpoints only
+SQLITE_PRAGMAS = {
+    'busy_timeout': 20000,
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
 }
+# Start the transactions with BEGIN IMMEDIATE : concurrent writers wait for the lock rather than failing with
+# "database is locked", but every atomic block takes it, the read-only ones too. For write heavy deployments.
+SQLITE_IMMEDIATE_TRANSACTIONS = bool(os.environ.get("SQLITE_IMMEDIATE_TRANSACTIONS"))
 
 
 # Password validation
@@ -149,4 +207,71 @@ CELERY_RESULT_BACKEND = "redis://localhost:6379"
 
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 
+# Task lists are cached per user until their tasks change, in Redis when REDIS_URL is set
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds a cached task list is kept, 0 disables the cache
+TASK_CACHE_TIMEOUT = 300
+
+# The task caches need a cache every process reads : in a cache of its own, a process never sees the generations
+# bumped by the writes of the other workers and of the Celery jobs, and would serve the lists it cached until they
+# expire. Without Redis the task lists are read uncached, unless TASK_CACHE_SHARED=1 says the process is the only
+# one reading and writing the tasks (runserver, no Celery worker).
+TASK_CACHE_SHARED = os.environ.get("TASK_CACHE_SHARED", "1" if os.environ.get("REDIS_URL") else "0").lower() in ("1", "true", "yes")
+if DATABASE_REPLICA and not TASK_CACHE_SHARED:
+    raise ImproperlyConfigured(
+        "A read replica needs a shared task cache, the workers share the recent writes of the users through it : "
+        "set REDIS_URL, or TASK_CACHE_SHARED=1 when a single process serves the site"
+    )
+
+# Task and notification events reach the streams of every worker through Redis pub/sub when set,
+# otherwise they only reach the streams of the process making the change
+TASK_EVENTS_REDIS_URL = os.environ.get("REDIS_URL")
+
+# Notifications older than NOTIFICATION_RETENTION_DAYS are compacted by the `compact_notifications` job, a batch of
+# NOTIFICATION_COMPACTION_BATCH_SIZE rows per transaction : 'summarize' merges the old notifications of a user into
+# one, 'delete' removes them
+NOTIFICATION_RETENTION_DAYS = 90
+NOTIFICATION_RETENTION_POLICY = 'summarize'
+NOTIFICATION_COMPACTION_BATCH_SIZE = 1000
+
+# The ReportDelivery records of the reports scheduled more than REPORT_DELIVERY_RETENTION_DAYS ago are deleted by the
+# `purge_old_report_deliveries` job, REPORT_DELIVERY_PURGE_BATCH_SIZE rows per query
+REPORT_DELIVERY_RETENTION_DAYS = 7
+REPORT_DELIVERY_PURGE_BATCH_SIZE = 1000
+
+# Deleted and completed tasks left alone for TASK_ARCHIVE_AFTER_DAYS are moved to the archive tables by the
+# `archive_tasks` job, TASK_ARCHIVE_BATCH_SIZE tasks per transaction
+TASK_ARCHIVE_AFTER_DAYS = 180
+TASK_ARCHIVE_BATCH_SIZE = 500
+
+# Request metrics : per route histograms served on /metrics, added to the counters shared in the cache every
+# REQUEST_METRICS_FLUSH_SECONDS. Without a shared cache (TASK_CACHE_SHARED) every process counts on its own and
+# /metrics shows the requests of the process answering it. Scrapers authenticate with the METRICS_TOKEN bearer
+# token, without it only staff users can read them. Requests slower than REQUEST_SLOW_SECONDS (None disables it)
+# are logged to `tasks.requests` with their REQUEST_SLOW_STATEMENTS slowest SQL statements.
+REQUEST_METRICS_FLUSH_SECONDS = 10
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+REQUEST_SERVER_TIMING = True
+REQUEST_SLOW_SECONDS = 1.0
+REQUEST_SLOW_STATEMENTS = 10
+
+# Threads running the queries of the async read views, at most as many database connections are held by them
+ASYNC_READ_THREADS = 8
+
+# List actions of the task API serialize `.values_list()` rows instead of model instances
+FAST_LIST_SERIALIZERS = True
+
 STATIC_ROOT = BASE_DIR / "staticfiles"
\ No newline at end of file
@@ -20,7 +20,8 @@ from django.urls import include, path
 from django.views.generic import RedirectView
 from rest_framework.routers import SimpleRouter
 from rest_framework_nested import routers
-from tasks.apiviews import TaskListAPI, TaskStatusHistoryViewSet, TaskViewSet
+from tasks import asyncviews
+from tasks.apiviews import NotificationViewSet, TaskListAPI, TaskStatusHistoryViewSet, TaskViewSet
 from tasks.views import (CreateTaskView, GenericAllTaskView,
                          GenericReportUpdateView,
                          GenericTaskCompleteListView,
@@ -31,10 +32,11 @@ from tasks.views import (CreateTaskView, GenericAllTaskView,
                          UserCreateView, UserLoginView, add_task_view,
                          all_tasks_view, complete_list_view,
                          complete_task_view, delete_task_view,
-                         session_storage_view)
+                         metrics_view, session_storage_view)
 
 router = SimpleRouter()
 router.register("api/task", TaskViewSet, 'api-task')
+router.register("api/notification", NotificationViewSet, 'api-notification')
 
 task_router = routers.NestedSimpleRouter(router, "api/task", lookup="task")
 task_router.register("history", TaskStatusHistoryViewSet, 'api-task-status-history')
@@ -57,5 +59,10 @@ urlpatterns = [
     path('', RedirectView.as_view(url='tasks/')),
     path("__reload__/", include("django_browser_reload.urls")),
     path("taskapi", TaskListAPI.as_view()),
-    path('create-report', GenericReportUpdateView.as_view(), name='create-report')
+    path('create-report', GenericReportUpdateView.as_view(), name='create-report'),
+    path('metrics', metrics_view, name='metrics'),
+    path('api/async/task/', asyncviews.task_list, name='async-task-list'),
+    path('api/async/task/<pk>/', asyncviews.task_detail, name='async-task-detail'),
+    path('api/async/task/<task_pk>/history/', asyncviews.task_history_list, name='async-task-status-history-list'),
+    path('api/async/task/<task_pk>/history/<pk>/', asyncviews.task_history_detail, name='async-task-status-history-detail'),
 ] + router.urls + task_router.urls
@@ -0,0 +1,99 @@
+from datetime import timedelta
+
+from tasks.models import COMPLETED_STATUS, TaskStatusRollup, bucket_starts
+
+ANALYTICS_PERIODS = ('day', 'week')
+# Buckets returned when the request gives no `since`
+ANALYTICS_DEFAULT_BUCKETS = {'day': 30, 'week': 12}
+ANALYTICS_MAX_BUCKETS = 366
+IN_PROGRESS_STATUS = 'IN_PROGRESS'
+
+
+class InvalidRange(Exception):
+    pass
+
+
+def period_start(period, day):
+    return dict(bucket_starts(day))[period]
+
+
+def bucket_range(period, since, until):
+    """
+    Starts of the `period` buckets from the one holding `since` to the one holding `until`
+    """
+    step = timedelta(days=1 if period == 'day' else 7)
+    start, last = period_start(period, since), period_start(period, until)
+    if start > last:
+        raise InvalidRange('since is after until')
+    if (last - start) // step >= ANALYTICS_MAX_BUCKETS:
+        raise InvalidRange(f'At most {ANALYTICS_MAX_BUCKETS} buckets per request')
+    starts = []
+    while start <= last:
+        starts.append(start)
+        start += step
+    return starts
+
+
+def default_since(period, until):
+    step = timedelta(days=1 if period == 'day' else 7)
+    return until - step * (ANALYTICS_DEFAULT_BUCKETS[period] - 1)
+
+
+def average(seconds, count):
+    return seconds / count if count else None
+
+
+def trend(values):
+    """
+    Least squares slope of `values` over their index : how much they grow from one bucket to the next
+    """
+    n = len(values)
+    if n < 2:
+        return 0.0
+    mean_x, mean_y = (n - 1) / 2, sum(values) / n
+    return sum((x - mean_x) * (y - mean_y) for x, y in enumerate(values)) / sum((x - mean_x) ** 2 for x in range(n))
+
+
+def task_analytics(user, period, since, until):
+    """
+    Status analytics of the tasks of `user` over the `period` buckets from `since` to `until`, read from the rollups
+    only : the cost depends on the number of buckets, not on the length of the history
+    """
+    starts = bucket_range(period, since, until)
+    buckets = {start: {'entered': {}, 'exited': {}, 'seconds': {}} for start in starts}
+    rollups = TaskStatusRollup.objects.filter(user=user, period=period, start__gte=starts[0], start__lte=starts[-1]).values_list(
+        'start', 'status', 'entered', 'exited', 'seconds_in_status'
+    )
+    for start, status, entered, exited, seconds in rollups:
+        bucket = buckets[start]
+        if entered:
+            bucket['entered'][status] = entered
+        bucket['exited'][status] = exited
+        bucket['seconds'][status] = seconds
+
+    completions = [buckets[start]['entered'].get(COMPLETED_STATUS, 0) for start in starts]
+    exited, seconds = {}, {}
+    for bucket in buckets.values():
+        for status, count in bucket['exited'].items():
+            exited[status] = exited.get(status, 0) + count
+            seconds[status] = seconds.get(status, 0) + bucket['seconds'][status]
+    return {
+        'period': period,
+        'since': starts[0],
+        'until': starts[-1],
+        'completed': sum(completions),
+        'average_in_progress_seconds': average(seconds.get(IN_PROGRESS_STATUS, 0), exited.get(IN_PROGRESS_STATUS, 0)),
+        # Completions gained (or lost) per bucket over the range
+        'throughput_trend': trend(completions),
+        'buckets': [
+            {
+                'start': start,
+                'completed': completed,
+                'entered': buckets[start]['entered'],
+                'average_seconds': {
+                    status: average(buckets[start]['seconds'][status], count) for status, count in buckets[start]['exited'].items() if count
+                },
+            }
+            for start, completed in zip(starts, completions)
+        ],
+    }
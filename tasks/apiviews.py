@@ -1,14 +1,46 @@
+import datetime
+
 from django.contrib.auth.models import User
-from django.http.response import JsonResponse
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.functional import cached_property
+from django.http.response import JsonResponse, StreamingHttpResponse
 from django.views import View
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.generics import ListAPIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.serializers import ModelSerializer
+from rest_framework.serializers import ModelSerializer, SerializerMethodField
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 from django_filters.rest_framework import FilterSet, CharFilter, DjangoFilterBackend, ChoiceFilter, BooleanFilter, DateFilter
 
-from .models import STATUS_CHOICES, Task, TaskStatusChange
+from .analytics import ANALYTICS_PERIODS, InvalidRange, default_since, task_analytics
+from .archive import ArchiveReadThroughMixin
+from .bulk import BulkValidationError, apply_operations
+from .cache import CachedListMixin, ConditionalReadMixin
+from .events import publish_on_commit
+from .models import COMPLETED_STATUS, STATUS_CHOICES, ArchivedTaskStatusChange, Notification, NotificationReadState, Task, TaskStats, TaskStatusChange
+from .pagination import InvalidCursor, KeysetPagination, KeysetPaginator, encode_cursor
+from .priority import make_room_for_priority
+from .projection import ProjectedQuerysetMixin, SparseFieldsMixin, ValuesListMixin, ValuesRepresentation
+from .replicas import ReplicaReadMixin
+from .search import SEARCH_ORDERING, search_tasks
+from .streaming import AsyncStreamingHttpResponse, iterate_in_thread
+
+# Rows fetched per query when streaming an export, memory use is bounded by it and not by the number of tasks
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = ('json', 'ndjson')
+
+# Changes are read in the order they were made, a change stamping several tasks is ordered by id
+CHANGES_ORDERING = ('change_seq', 'id')
+CHANGES_PAGE_SIZE = 500
+CHANGES_MAX_PAGE_SIZE = 5000
 
 
 class UserSerializer(ModelSerializer):
@@ -17,53 +49,223 @@ class UserSerializer(ModelSerializer):
         model = User
         fields = ("first_name","last_name","username")
 
-class TaskSerializer(ModelSerializer):
+class TaskSerializer(SparseFieldsMixin, ModelSerializer):
 
     user = UserSerializer(read_only = True)
 
     class Meta:
         model = Task
-        fields = ['id','title', 'description', 'completed','user', 'status']
+        fields = ['id','title', 'description', 'completed','user', 'status', 'priority']
+
+class TaskChangeSerializer(TaskSerializer):
+
+    class Meta(TaskSerializer.Meta):
+        fields = TaskSerializer.Meta.fields + ['deleted', 'change_seq']
+        read_only_fields = ['deleted', 'change_seq']
 
 class TaskFilter(FilterSet):
     title = CharFilter(lookup_expr="icontains")
     status = ChoiceFilter(choices = STATUS_CHOICES)
     completed = BooleanFilter()
+    search = CharFilter(method="filter_search")
+
+    def filter_search(self, queryset, name, value):
+        return search_tasks(queryset, value, user = self.request.user)
 
-class TaskViewSet(ModelViewSet):
+class TaskViewSet(ReplicaReadMixin, ConditionalReadMixin, CachedListMixin, ValuesListMixin, ProjectedQuerysetMixin, ModelViewSet):
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
+    cache_name = 'api-tasks'
 
     permission_classes = (IsAuthenticated,)
 
     filter_backends = (DjangoFilterBackend,)
     filterset_class = TaskFilter
 
+    pagination_class = KeysetPagination
+    keyset_ordering = ('completed', 'priority', 'id')
+
     def get_queryset(self):
-        return Task.objects.filter(user = self.request.user, deleted = False)
+        return self.project(Task.objects.filter(user = self.request.user, deleted = False).order_by(*self.keyset_ordering))
+
+    def get_keyset_ordering(self):
+        # Search results are ranked
+        if self.request.query_params.get('search'):
+            return SEARCH_ORDERING
+        return self.keyset_ordering
+
+    def estimate_count(self):
+        if any(name in self.request.query_params for name in self.filterset_class.base_filters):
+            return None
+        return TaskStats.objects.for_user(self.request.user).all_count
 
     def perform_create(self, serializer):
-        serializer.save(user = self.request.user)
+        with transaction.atomic():
+            make_room_for_priority(self.request.user, serializer.validated_data.get('priority', Task._meta.get_field('priority').get_default()))
+            serializer.save(user = self.request.user)
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            priority = serializer.validated_data.get('priority')
+            if priority is not None and priority != serializer.instance.priority:
+                make_room_for_priority(self.request.user, priority, exclude_pk = serializer.instance.pk)
+            # Completing a task without a status moves it to COMPLETED, as the complete views do
+            if serializer.validated_data.get('completed') and not serializer.instance.completed and 'status' not in serializer.validated_data:
+                serializer.save(status = COMPLETED_STATUS)
+            else:
+                serializer.save()
+
+    def perform_destroy(self, instance):
+        # Deletes are soft as in the views, so the change feed can report them
+        Task.objects.filter(id = instance.id).soft_delete()
+
+    @action(detail = False, methods = ['post'])
+    def bulk(self, request):
+        """
+        Applies a list of {"op": "create" | "update" | "complete" | "delete", "id": ..., "data": {...}} operations
+        in one transaction. Nothing is applied when an operation is invalid, the errors are reported per operation.
+        """
+        try:
+            results = apply_operations(request.user, request.data, self.get_serializer_class(), self.get_serializer_context())
+        except BulkValidationError as error:
+            return Response({'results': error.results}, status = status.HTTP_400_BAD_REQUEST)
+        return Response({'results': results})
+
+    @action(detail = False, serializer_class = TaskChangeSerializer)
+    def changes(self, request):
+        """
+        Tasks created, updated or deleted since the `since` cursor, in the order of their last change, with the cursor
+        to ask for the following changes. Without a cursor the live tasks are returned, the changes made while they
+        are read come next. A deleted task is returned once with `deleted` set, it may be one the client never had.
+        """
+        since = request.query_params.get('since')
+        tasks = Task.objects.filter(user = request.user)
+        if not since:
+            tasks = tasks.filter(deleted = False)
+        try:
+            page_size = min(max(int(request.query_params.get('page_size', CHANGES_PAGE_SIZE)), 1), CHANGES_MAX_PAGE_SIZE)
+        except ValueError:
+            page_size = CHANGES_PAGE_SIZE
+        serializer = self.get_serializer(many = True)
+        representation = ValuesRepresentation.for_serializer(serializer.child, CHANGES_ORDERING)
+        if representation is not None:
+            tasks = representation.rows(tasks)
+        try:
+            page = KeysetPaginator(tasks, CHANGES_ORDERING, page_size).page(since)
+        except InvalidCursor:
+            raise NotFound("Invalid cursor")
+        changes = representation.to_representation(page) if representation is not None else serializer.to_representation(page)
+        return Response({
+            'changes': changes,
+            # Sequence numbers start at 1 and ids are positive : the cursor of an empty feed covers every task
+            'since': encode_cursor(page.last_values or [0, 0]),
+            'has_more': page.has_next(),
+        })
+
+
+    @action(detail = False)
+    def analytics(self, request):
+        """
+        Completions, time spent in each status and throughput trend of the tasks of the user, per `period` (day or week)
+        bucket from `since` to `until` (YYYY-MM-DD). Read from the status rollups, never from the history.
+        """
+        period = request.query_params.get('period', 'day')
+        if period not in ANALYTICS_PERIODS:
+            raise ValidationError({'period': f'Expected one of {", ".join(ANALYTICS_PERIODS)}'})
+        dates = {}
+        for name in ('since', 'until'):
+            value = request.query_params.get(name)
+            try:
+                dates[name] = parse_date(value) if value else None
+            except ValueError:
+                dates[name] = None
+            if value and dates[name] is None:
+                raise ValidationError({name: 'Expected a YYYY-MM-DD date'})
+        until = dates['until'] or timezone.now().date()
+        try:
+            return Response(task_analytics(request.user, period, dates['since'] or default_since(period, until), until))
+        except InvalidRange as error:
+            raise ValidationError({'since': str(error)})
+
+
+def export_chunks(tasks):
+    """
+    The `tasks`, ordered by id, EXPORT_CHUNK_SIZE at a time : each chunk is a query of its own starting after the last
+    id of the previous one. No cursor stays open across chunks, Postgres behind a pooler in transaction mode cannot
+    keep one and would load the whole result at once.
+    """
+    last_id = None
+    while True:
+        chunk = list((tasks if last_id is None else tasks.filter(id__gt = last_id))[:EXPORT_CHUNK_SIZE])
+        if chunk:
+            yield chunk
+        if len(chunk) < EXPORT_CHUNK_SIZE:
+            return
+        last_id = chunk[-1].id
+
+
+def export_rows(tasks, serializer, export_format):
+    """
+    Yields the serialized `tasks` chunk by chunk, as a JSON document or as one JSON object per line.
+    `serializer` is a `many` serializer reused for every chunk : serializers hold reference cycles that only
+    the cyclic GC frees, one per chunk would grow the memory with the number of tasks.
+    """
+    encoder = JSONEncoder()
+    if export_format == 'json':
+        yield '{"tasks": ['
+    separator = ''
+    for chunk in export_chunks(tasks):
+        rows = [encoder.encode(row) for row in serializer.to_representation(chunk)]
+        if export_format == 'json':
+            yield separator + ','.join(rows)
+            separator = ','
+        else:
+            yield ''.join(row + '\n' for row in rows)
+    if export_format == 'json':
+        yield ']}'
+
+
+class TaskListAPI(ReplicaReadMixin, ProjectedQuerysetMixin, ListAPIView):
+    """
+    Live tasks one keyset page at a time, or all of them streamed with `?export=json` / `?export=ndjson`
+    """
+    serializer_class = TaskSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering = ('id',)
 
+    def get_queryset(self):
+        return self.project(Task.objects.filter(deleted = False).order_by(*self.keyset_ordering))
 
-class TaskListAPI(APIView):
-    def get(self,request):
-        tasks = Task.objects.filter(deleted = False)
-        data = TaskSerializer(tasks, many=True).data
-        return Response({"tasks": data})
+    def list(self, request, *args, **kwargs):
+        export_format = request.query_params.get('export')
+        if export_format is None:
+            return super().list(request, *args, **kwargs)
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({'export': f'Expected one of {", ".join(EXPORT_FORMATS)}'})
+        content_type = 'application/json' if export_format == 'json' else 'application/x-ndjson'
+        rows = export_rows(self.get_queryset(), self.get_serializer(many = True), export_format)
+        if getattr(request._request, 'async_streaming', False):
+            # Sent from the event loop, where the database cannot be read : each chunk is fetched in a thread
+            return AsyncStreamingHttpResponse(iterate_in_thread(rows), content_type = content_type)
+        return StreamingHttpResponse(rows, content_type = content_type)
 
 class TaskStatusFilter(FilterSet):
     new_status = ChoiceFilter(choices = STATUS_CHOICES)
-    timestamp = DateFilter(lookup_expr="contains")
+    timestamp = DateFilter(method="filter_day")
+
+    def filter_day(self, queryset, name, value):
+        # A range on the column rather than a text match on it, the (task, timestamp) index serves it
+        start = timezone.make_aware(datetime.datetime.combine(value, datetime.time.min))
+        return queryset.filter(timestamp__gte = start, timestamp__lt = start + datetime.timedelta(days = 1))
 
-class TaskStatusSerializer(ModelSerializer):
+class TaskStatusSerializer(SparseFieldsMixin, ModelSerializer):
 
     class Meta:
         model = TaskStatusChange
         read_only_fields =  ['old_status', 'new_status', 'timestamp']
         fields = ['old_status', 'new_status', 'timestamp']
 
-class TaskStatusHistoryViewSet(ReadOnlyModelViewSet):
+class TaskStatusHistoryViewSet(ReplicaReadMixin, ConditionalReadMixin, ArchiveReadThroughMixin, ValuesListMixin, ProjectedQuerysetMixin, ReadOnlyModelViewSet):
     queryset = TaskStatusChange.objects.all()
     serializer_class = TaskStatusSerializer
 
@@ -73,4 +275,72 @@ class TaskStatusHistoryViewSet(ReadOnlyModelViewSet):
     filterset_class = TaskStatusFilter
 
     def get_queryset(self):
-        return TaskStatusChange.objects.filter(task = self.kwargs['task_pk'], task__user=self.request.user)
+        history = ArchivedTaskStatusChange if self.archived else TaskStatusChange
+        return self.project(history.objects.filter(task = self.kwargs['task_pk'], task__user=self.request.user))
+
+
+class NotificationSerializer(SparseFieldsMixin, ModelSerializer):
+
+    read = SerializerMethodField()
+
+    class Meta:
+        model = Notification
+        fields = ['id', 'content', 'timestamp', 'count', 'read']
+
+    def get_read(self, notification):
+        return self.context['read_state'].is_read(notification.id)
+
+class NotificationViewSet(ReadOnlyModelViewSet):
+    """
+    Notifications of the user, newest first. `?unread=true` lists the unread ones only.
+    """
+    serializer_class = NotificationSerializer
+
+    permission_classes = (IsAuthenticated,)
+
+    pagination_class = KeysetPagination
+    # Ids grow with the time notifications are sent at
+    keyset_ordering = ('-id',)
+
+    @cached_property
+    def read_state(self):
+        return NotificationReadState.objects.for_user(self.request.user)
+
+    def get_queryset(self):
+        notifications = Notification.objects.filter(user = self.request.user)
+        if self.request.query_params.get('unread') in ('true', 'True', '1'):
+            notifications = self.read_state.unread(notifications)
+        return notifications.order_by(*self.keyset_ordering)
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'read_state': self.read_state}
+
+    def update_read_state(self, update):
+        with transaction.atomic():
+            self.read_state = NotificationReadState.objects.locked(self.request.user)
+            update(self.read_state)
+            # The other streams of the user refresh their unread notifications
+            publish_on_commit([self.request.user.id], 'notifications')
+
+    @action(detail = True, methods = ['post'])
+    def read(self, request, pk = None):
+        notification = self.get_object()
+        self.update_read_state(lambda state: state.mark_read([notification.id]))
+        return Response(self.get_serializer(notification).data)
+
+    @action(detail = False, methods = ['post'])
+    def read_all(self, request):
+        """
+        Marks every notification up to the `up_to` id read, all of them without one
+        """
+        up_to = request.data.get('up_to')
+        if up_to is None:
+            up_to = Notification.objects.filter(user = request.user).aggregate(Max('id'))['id__max'] or 0
+        elif not isinstance(up_to, int) or isinstance(up_to, bool):
+            raise ValidationError({'up_to': 'Expected a notification id.'})
+        self.update_read_state(lambda state: state.mark_read_through(up_to))
+        return Response({'unread': self.read_state.unread(Notification.objects.filter(user = request.user)).count()})
+
+    @action(detail = False)
+    def unread_count(self, request):
+        return Response({'unread': self.read_state.unread(Notification.objects.filter(user = request.user)).count()})
@@ -0,0 +1,126 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Exists, Max, OuterRef, Q
+from django.http import Http404
+from django.utils import timezone
+
+from tasks.cache import invalidate_task_caches
+from tasks.models import (
+    HISTORY_BATCH_SIZE, ArchivedTask, ArchivedTaskStatusChange, Task, TaskStats, TaskStatusChange, add_counts, live_counts,
+)
+
+ARCHIVED_TASK_FIELDS = [field.attname for field in Task._meta.concrete_fields]
+ARCHIVED_CHANGE_FIELDS = [field.attname for field in TaskStatusChange._meta.concrete_fields]
+
+
+def archive_policy():
+    """
+    (days, batch size) of the task archival, from the TASK_ARCHIVE_* settings
+    """
+    return (
+        getattr(settings, 'TASK_ARCHIVE_AFTER_DAYS', 180),
+        getattr(settings, 'TASK_ARCHIVE_BATCH_SIZE', 500),
+    )
+
+
+def archivable_tasks(cutoff):
+    """
+    Deleted or completed tasks left alone since `cutoff` : created before it, with no status change after it
+    """
+    recent_changes = TaskStatusChange.objects.filter(task=OuterRef('pk'), timestamp__gte=cutoff)
+    return Task.objects.filter(Q(deleted=True) | Q(completed=True), created_date__lt=cutoff).filter(~Exists(recent_changes))
+
+
+def archive_batch(candidates, task_ids, now):
+    """
+    Moves the `task_ids` tasks still among the `candidates`, with their history, to the archive in one transaction.
+    Returns the number of tasks archived.
+    """
+    with transaction.atomic():
+        # Read again under lock : a task restored or changed since it was picked stays where it is
+        rows = list(candidates.filter(id__in = task_ids).select_for_update().values(*ARCHIVED_TASK_FIELDS))
+        if not rows:
+            return 0
+        task_ids = [row['id'] for row in rows]
+        ArchivedTask.objects.bulk_create([ArchivedTask(archived_at=now, **row) for row in rows])
+        history = TaskStatusChange.objects.filter(task_id__in = task_ids)
+        ArchivedTaskStatusChange.objects.bulk_create(
+            [ArchivedTaskStatusChange(**row) for row in history.values(*ARCHIVED_CHANGE_FIELDS)], batch_size=HISTORY_BATCH_SIZE,
+        )
+        history.delete()
+        # Deleted with a plain DELETE rather than QuerySet.delete() : its collector would load every task and send
+        # pre_delete for each one, adjusting the counters and the caches a task at a time. The history, the only
+        # rows cascading from a task, is already moved. One statement for the batch, and one adjustment per user.
+        deltas = {}
+        for row in rows:
+            if row['user_id'] is not None:
+                total, completed = live_counts(row['deleted'], row['completed'])
+                add_counts(deltas, row['user_id'], (-total, -completed))
+        connection = connections[Task.objects.db]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {connection.ops.quote_name(Task._meta.db_table)} WHERE id IN ({", ".join(["%s"] * len(task_ids))})',
+                task_ids,
+            )
+            archived = cursor.rowcount
+        TaskStats.objects.adjust(deltas)
+        invalidate_task_caches(deltas)
+    return archived
+
+
+def archive_tasks(now=None, days=None, batch_size=None):
+    """
+    Moves the deleted and completed tasks untouched for `days` out of the Task table, in batches of `batch_size`
+    tasks each committed on its own. A run stopped halfway loses nothing : the archived batches are gone from the
+    Task table and the next run carries on with the rest. Returns the number of tasks archived.
+    """
+    default_days, default_batch_size = archive_policy()
+    days = default_days if days is None else days
+    batch_size = batch_size or default_batch_size
+    now = now or timezone.now()
+    candidates = archivable_tasks(now - timedelta(days = days))
+    last_id = candidates.aggregate(Max('id'))['id__max']
+    archived = 0
+    position = 0
+    while last_id is not None:
+        task_ids = list(candidates.filter(id__gt = position, id__lte = last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not task_ids:
+            break
+        position = task_ids[-1]
+        archived += archive_batch(candidates, task_ids, now)
+    return archived
+
+
+class ArchiveReadThroughMixin:
+    """
+    ViewSet reading from the archive what is not in the hot tables anymore. `get_queryset` reads the archive when
+    `archived` is set, which only happens once the hot tables came up empty and `in_archive()` holds : reads of
+    live rows cost no extra query.
+    """
+    archived = False
+    # URL argument holding the id of the task read
+    archive_lookup = 'task_pk'
+
+    def in_archive(self):
+        """
+        Whether the task of the `archive_lookup` URL argument is an archived task of the user
+        """
+        return ArchivedTask.objects.filter(id = self.kwargs[self.archive_lookup], user = self.request.user).exists()
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if not response.data and self.in_archive():
+            self.archived = True
+            response = super().list(request, *args, **kwargs)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            if not self.in_archive():
+                raise
+        self.archived = True
+        return super().retrieve(request, *args, **kwargs)
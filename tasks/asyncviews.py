@@ -0,0 +1,59 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponseNotAllowed
+
+from .apiviews import TaskStatusHistoryViewSet, TaskViewSet
+from .connections import check_connections
+
+READ_METHODS = ('GET', 'HEAD')
+
+executor_lock = threading.Lock()
+executor = None
+
+
+def read_executor():
+    """
+    Thread pool running the async read views. Under ASGI a sync view gets a thread, and a database connection,
+    per request in flight : reads queue here instead, a burst of clients holds ASYNC_READ_THREADS connections.
+    """
+    global executor
+    with executor_lock:
+        if executor is None:
+            executor = ThreadPoolExecutor(getattr(settings, 'ASYNC_READ_THREADS', 8), thread_name_prefix='task-read')
+    return executor
+
+
+def read(view, request, *args, **kwargs):
+    # Pool threads outlive requests : their connections are checked as request_started / request_finished would
+    close_old_connections()
+    check_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_read_view(view):
+    """
+    Async view answering the GET and HEAD requests of the sync `view` from the read thread pool. The whole read,
+    authentication and serialization included, is one hop to the pool : the event loop keeps serving other
+    requests while its queries run.
+    """
+    async def async_view(request, *args, **kwargs):
+        if request.method not in READ_METHODS:
+            return HttpResponseNotAllowed(READ_METHODS)
+        return await sync_to_async(read, thread_sensitive = False, executor = read_executor())(view, request, *args, **kwargs)
+    return async_view
+
+
+task_list = async_read_view(TaskViewSet.as_view({'get': 'list'}, basename = 'api-task', detail = False))
+task_detail = async_read_view(TaskViewSet.as_view({'get': 'retrieve'}, basename = 'api-task', detail = True))
+task_history_list = async_read_view(TaskStatusHistoryViewSet.as_view({'get': 'list'}, basename = 'api-task-status-history', detail = False))
+task_history_detail = async_read_view(TaskStatusHistoryViewSet.as_view({'get': 'retrieve'}, basename = 'api-task-status-history', detail = True))
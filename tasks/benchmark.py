@@ -0,0 +1,252 @@
+"""
+Route benchmark : seeds users x tasks x status changes, requests every route of the URLconf as one of the users and
+compares the queries, SQL time, wall time and peak memory of each request with a committed baseline
+"""
+import json
+import statistics
+import tracemalloc
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.test import Client
+from django.urls import resolve
+
+from tasks.cache import task_cache
+from tasks.metrics import known_routes, match_label
+from tasks.models import (
+    HISTORY_BATCH_SIZE, STATUS_CHOICES, Notification, ReportConfig, Task, TaskStats, TaskStatusChange, TaskStatusRollup,
+)
+from tasks.management.commands._benchmark import rolled_back
+
+BASELINE_PATH = Path(__file__).with_name('benchmark_baseline.json')
+# Included URLconfs left out : the admin, and the browser reload stream which never ends
+SKIPPED_NAMESPACES = ('admin', 'django_browser_reload')
+SEED_BATCH_SIZE = 5000
+# Ids the placeholders of the paths are formatted with when only the route they resolve to matters
+PLACEHOLDER_IDS = {'task': 1, 'change': 1, 'notification': 1}
+
+# measure : (allowed ratio to the baseline, allowed slack on top of it). A query more than the baseline is a
+# regression whatever the dataset, times and memory depend on the machine and only get a loose bound.
+TOLERANCES = {
+    'queries': (1, 0),
+    'sql_ms': (3, 5),
+    'ms': (3, 20),
+    'peak_kib': (1.5, 256),
+}
+
+
+class Route:
+    """
+    One request of the benchmark : `path` is formatted with the ids of the seeded rows, and `data` called with them
+    when it needs them. Writes are rolled back after each run so every run sees the same data.
+    """
+    def __init__(self, name, method, path, data=None, as_json=False):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.data = data
+        self.as_json = as_json
+
+    @property
+    def writes(self):
+        return self.method != 'get'
+
+    def payload(self, ids):
+        return self.data(ids) if callable(self.data) else self.data
+
+    def request(self, client, ids):
+        kwargs = {'content_type': 'application/json'} if self.as_json else {}
+        return getattr(client, self.method)(self.path.format(**ids), self.payload(ids), **kwargs)
+
+
+TASK_FORM = {'title': 'benchmark task', 'description': 'benchmark', 'priority': 1, 'status': STATUS_CHOICES[0][0]}
+
+ROUTES = [
+    Route('tasks-view', 'get', '/tasks/'),
+    Route('tasks-view search', 'get', '/tasks/', {'search': 'task'}),
+    Route('add-task', 'get', '/add-task/', {'task': 'benchmark'}),
+    Route('delete-task', 'get', '/delete-task/{task}'),
+    Route('delete-task post', 'post', '/delete-task/{task}'),
+    Route('complete-task post', 'post', '/complete_task/{task}/', {'completed': 'on'}),
+    Route('complete-list', 'get', '/completed_tasks/'),
+    Route('all-tasks-view', 'get', '/all_tasks/'),
+    Route('create-task', 'get', '/create-task/'),
+    Route('create-task post', 'post', '/create-task/', TASK_FORM),
+    Route('update-task', 'get', '/update-task/{task}'),
+    Route('update-task post', 'post', '/update-task/{task}', dict(TASK_FORM, priority=3)),
+    Route('detail-task', 'get', '/detail-task/{task}'),
+    Route('user-signup', 'get', '/user/signup'),
+    Route('user-login', 'get', '/user/login'),
+    Route('user-logout', 'post', '/user/logout'),
+    Route('sessiontest', 'get', '/sessiontest'),
+    Route('root', 'get', '/'),
+    Route('taskapi', 'get', '/taskapi'),
+    Route('taskapi export', 'get', '/taskapi', {'export': 'ndjson'}),
+    Route('create-report', 'get', '/create-report'),
+    Route('create-report post', 'post', '/create-report', {'time': '21:00'}),
+    Route('metrics', 'get', '/metrics'),
+    Route('async-task-list', 'get', '/api/async/task/'),
+    Route('async-task-detail', 'get', '/api/async/task/{task}/'),
+    Route('async-task-status-history-list', 'get', '/api/async/task/{task}/history/'),
+    Route('async-task-status-history-detail', 'get', '/api/async/task/{task}/history/{change}/'),
+    Route('api-task-list', 'get', '/api/task/'),
+    Route('api-task-list post', 'post', '/api/task/', TASK_FORM, as_json=True),
+    Route('api-task-analytics', 'get', '/api/task/analytics/'),
+    Route('api-task-bulk', 'post', '/api/task/bulk/', lambda ids: [
+        {'op': 'create', 'data': TASK_FORM},
+        {'op': 'update', 'id': ids['task'], 'data': {'status': STATUS_CHOICES[1][0]}},
+    ], as_json=True),
+    Route('api-task-changes', 'get', '/api/task/changes/'),
+    Route('api-task-detail', 'get', '/api/task/{task}/'),
+    Route('api-task-detail patch', 'patch', '/api/task/{task}/', {'status': STATUS_CHOICES[2][0]}, as_json=True),
+    Route('api-task-detail delete', 'delete', '/api/task/{task}/'),
+    Route('api-notification-list', 'get', '/api/notification/'),
+    Route('api-notification-read-all', 'post', '/api/notification/read_all/'),
+    Route('api-notification-unread-count', 'get', '/api/notification/unread_count/'),
+    Route('api-notification-detail', 'get', '/api/notification/{notification}/'),
+    Route('api-notification-read', 'post', '/api/notification/{notification}/read/'),
+    Route('api-task-status-history-list', 'get', '/api/task/{task}/history/'),
+    Route('api-task-status-history-detail', 'get', '/api/task/{task}/history/{change}/'),
+]
+
+
+def uncovered_routes(routes=ROUTES):
+    """
+    Routes of the URLconf no benchmark request goes to
+    """
+    covered = {match_label(resolve(route.path.format(**PLACEHOLDER_IDS))) for route in routes}
+    return [label for label in known_routes(SKIPPED_NAMESPACES)[1:] if label not in covered]
+
+
+def seed(users, tasks, history):
+    """
+    `users` users of `tasks` tasks each, every task with `history` status changes, a report and notifications.
+    Returns the staff user the requests are made as and the ids the routes are formatted with.
+    """
+    seeded = [User.objects.create_user(username=f'benchmark-{i}', password='benchmark', is_staff=i == 0) for i in range(users)]
+    statuses = [status for status, _ in STATUS_CHOICES]
+    rows = [
+        Task(title=f'task {i}', description='benchmark', priority=i + 1, user=user, completed=i % 3 == 0, status=statuses[history % len(statuses)])
+        for user in seeded for i in range(tasks)
+    ]
+    for start in range(0, len(rows), SEED_BATCH_SIZE):
+        Task.objects.bulk_create(rows[start:start + SEED_BATCH_SIZE])
+    task_ids = Task.objects.values_list('id', flat=True).order_by('id')
+    TaskStatusChange.objects.bulk_create(
+        (
+            TaskStatusChange(task_id=task_id, old_status=statuses[i % len(statuses)], new_status=statuses[(i + 1) % len(statuses)])
+            for task_id in task_ids.iterator() for i in range(history)
+        ),
+        batch_size=HISTORY_BATCH_SIZE,
+    )
+    user_ids = [user.id for user in seeded]
+    TaskStats.objects.rebuild(user_ids)
+    TaskStatusRollup.objects.rebuild(user_ids)
+    Notification.objects.bulk_create(Notification(user=user, content=f'report {i}') for user in seeded for i in range(min(tasks, 20)))
+    ReportConfig.objects.create(user=seeded[0])
+    return seeded[0], route_ids(seeded[0])
+
+
+def route_ids(user):
+    """
+    Ids of `user`'s rows the paths are formatted with : a pending task, one of its status changes and a notification
+    """
+    task_id = Task.objects.filter(user=user, completed=False, deleted=False).order_by('priority').values_list('id', flat=True).first() or 0
+    return {
+        'task': task_id,
+        'change': TaskStatusChange.objects.filter(task_id=task_id).values_list('id', flat=True).first() or 0,
+        'notification': Notification.objects.filter(user=user).values_list('id', flat=True).first() or 0,
+    }
+
+
+def consume(response):
+    # Streamed content is consumed chunk by chunk as a client would, joining it would hold the whole body
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def run(client, route, ids):
+    # Writes are rolled back : the next run, and the next route, see the seeded data. The transactions of the views
+    # become savepoints inside it, their SAVEPOINT and RELEASE statements are counted with the queries.
+    task_cache().clear()
+    if route.writes:
+        with rolled_back():
+            response = route.request(client, ids)
+    else:
+        response = route.request(client, ids)
+    return consume(response)
+
+
+def measure_route(client, user, route, ids, repeat=5, memory=True):
+    """
+    {status, queries, sql_ms, ms, peak_kib} of a route, the times are the medians of `repeat` runs made with a
+    cold cache. The peak of the Python allocator is taken in a run of its own, tracing slows the others down.
+    """
+    runs = []
+    for _ in range(repeat):
+        client.force_login(user)
+        response = run(client, route, ids)
+        metrics = response.wsgi_request.metrics
+        runs.append((metrics.queries, metrics.sql_seconds * 1000, metrics.duration * 1000))
+    result = {
+        'status': response.status_code,
+        'queries': max(queries for queries, _, _ in runs),
+        'sql_ms': round(statistics.median(sql_ms for _, sql_ms, _ in runs), 3),
+        'ms': round(statistics.median(ms for _, _, ms in runs), 3),
+    }
+    if memory:
+        client.force_login(user)
+        tracemalloc.start()
+        try:
+            run(client, route, ids)
+            result['peak_kib'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def benchmark_routes(users, tasks, history, repeat=5, memory=True, routes=ROUTES):
+    """
+    Seeds the dataset and measures every route, returns {route name: measures}. The rows are committed : the async
+    views read them from threads of their own. Meant for a throwaway database.
+    """
+    user, ids = seed(users, tasks, history)
+    client = Client(raise_request_exception=False)
+    return {route.name: measure_route(client, user, route, ids, repeat, memory) for route in routes}
+
+
+def load_baseline(path=BASELINE_PATH):
+    with open(path) as baseline:
+        return json.load(baseline)
+
+
+def save_baseline(dataset, results, path=BASELINE_PATH):
+    with open(path, 'w') as baseline:
+        json.dump({'dataset': dataset, 'routes': results}, baseline, indent=2, sort_keys=True)
+        baseline.write('\n')
+
+
+def regressions(baseline, dataset, results, measures=None):
+    """
+    (route, measure, baseline value, value) of every measure over its tolerance. Query counts are compared whatever
+    the dataset, they must not grow with it ; the other measures only against a baseline of the same dataset.
+    """
+    if measures is None:
+        measures = list(TOLERANCES) if baseline['dataset'] == dataset else ['queries']
+    found = []
+    for name, result in results.items():
+        expected = baseline['routes'].get(name)
+        if expected is None:
+            found.append((name, 'missing from the baseline', None, None))
+            continue
+        if result['status'] != expected['status']:
+            found.append((name, 'status', expected['status'], result['status']))
+        for measure in measures:
+            if measure not in result or measure not in expected:
+                continue
+            ratio, slack = TOLERANCES[measure]
+            if result[measure] > expected[measure] * ratio + slack:
+                found.append((name, measure, expected[measure], result[measure]))
+    return found
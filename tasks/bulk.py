@@ -0,0 +1,130 @@
+from django.db import transaction
+
+from tasks.cache import invalidate_task_caches
+from tasks.models import COMPLETED_STATUS, Task, TaskStats, add_counts, live_counts
+from tasks.priority import PriorityLayout
+
+BULK_MAX_OPERATIONS = 20000
+BULK_BATCH_SIZE = 500
+BULK_OPERATIONS = ('create', 'update', 'complete', 'delete')
+
+
+class BulkValidationError(Exception):
+    def __init__(self, results):
+        super().__init__(results)
+        self.results = results
+
+
+def default_priority():
+    return Task._meta.get_field('priority').get_default()
+
+
+def validate_operations(user, operations, serializer_class, context):
+    """
+    Checks every operation of the batch. Returns the operations as (op, task, validated data), the tasks being
+    the ones of `user` targeted by the batch, loaded and locked. Raises BulkValidationError with the errors of
+    every operation when any of them is invalid.
+    """
+    if not isinstance(operations, list):
+        raise BulkValidationError([{'errors': {'non_field_errors': ['Expected a list of operations.']}}])
+    if len(operations) > BULK_MAX_OPERATIONS:
+        raise BulkValidationError([{'errors': {'non_field_errors': [f'At most {BULK_MAX_OPERATIONS} operations per request.']}}])
+    ids = [operation.get('id') for operation in operations if isinstance(operation, dict) and operation.get('op') != 'create']
+    tasks = Task.objects.filter(user = user, deleted = False, id__in = [task_id for task_id in ids if isinstance(task_id, int)]).select_for_update().in_bulk()
+    results, validated, seen = [], [], set()
+    for index, operation in enumerate(operations):
+        errors, task, data = {}, None, {}
+        op = operation.get('op') if isinstance(operation, dict) else None
+        if op not in BULK_OPERATIONS:
+            errors['op'] = [f'Expected one of {", ".join(BULK_OPERATIONS)}.']
+        elif op != 'create':
+            task = tasks.get(operation.get('id'))
+            if task is None:
+                errors['id'] = ['No such task.']
+            elif task.id in seen:
+                errors['id'] = ['A task can only be changed once per batch.']
+            else:
+                seen.add(task.id)
+        if op in ('create', 'update') and not errors:
+            serializer = serializer_class(task, data = operation.get('data', {}), partial = op == 'update', context = context)
+            if serializer.is_valid():
+                data = serializer.validated_data
+            else:
+                errors.update(serializer.errors)
+        results.append({'index': index, 'op': op, 'errors': errors} if errors else {'index': index, 'op': op})
+        validated.append((op, task, data))
+    if any('errors' in result for result in results):
+        raise BulkValidationError(results)
+    return validated, results
+
+
+def apply_operations(user, operations, serializer_class, context):
+    """
+    Applies a batch of create/update/complete/delete operations to the tasks of `user` in one transaction,
+    as if each one had gone through the task API in turn. Priority collisions of the whole batch are resolved
+    in memory, the tasks are then written with bulk_create/bulk_update and their status history in bulk.
+    Returns the result of every operation.
+    """
+    with transaction.atomic():
+        validated, results = validate_operations(user, operations, serializer_class, context)
+        layout = PriorityLayout.for_user(user)
+        created, changed, fields = [], [], set()
+        for (op, task, data), result in zip(validated, results):
+            if op == 'create':
+                task = Task(user = user, **data)
+                key = ('new', len(created))
+                created.append((key, task))
+                if task.completed:
+                    layout.make_room(task.priority)
+                else:
+                    layout.insert(key, task.priority)
+                continue
+            was_active = task.id in layout
+            old_priority = task.priority
+            if op == 'update':
+                for field, value in data.items():
+                    setattr(task, field, value)
+                fields.update(data)
+            elif op == 'complete':
+                task.completed = True
+                task.status = COMPLETED_STATUS
+                fields.update(('completed', 'status'))
+            else:
+                task.deleted = True
+                fields.add('deleted')
+            active = not task.completed and not task.deleted
+            if op == 'update' and 'priority' in data and task.priority != old_priority:
+                layout.remove(task.id)
+                if active:
+                    layout.insert(task.id, task.priority)
+                else:
+                    layout.make_room(task.priority)
+            elif was_active and not active:
+                layout.remove(task.id)
+            elif active and not was_active:
+                layout.place(task.id, task.priority)
+            changed.append(task)
+            result['id'] = task.id
+
+        priorities = layout.priorities()
+        for key, task in created:
+            task.priority = priorities.get(key, task.priority)
+        for task in changed:
+            task.priority = priorities.get(task.id, task.priority)
+        changed_ids = {task.id for task in changed}
+        shifted = [Task(id = task_id, priority = priority) for task_id, priority in layout.moved().items() if task_id not in changed_ids]
+        Task.objects.bulk_update(shifted, ['priority'], batch_size = BULK_BATCH_SIZE)
+        if changed:
+            Task.objects.bulk_update_with_history(changed, sorted(fields | {'priority'}), batch_size = BULK_BATCH_SIZE)
+        if created:
+            tasks = Task.objects.bulk_create([task for _, task in created], batch_size = BULK_BATCH_SIZE)
+            deltas = {}
+            for task in tasks:
+                add_counts(deltas, user.id, live_counts(task.deleted, task.completed))
+            TaskStats.objects.adjust(deltas)
+            created_tasks = iter(tasks)
+            for (op, _, _), result in zip(validated, results):
+                if op == 'create':
+                    result['id'] = next(created_tasks).id
+        invalidate_task_caches([user.id])
+    return results
@@ -0,0 +1,259 @@
+import hashlib
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from .events import publish_on_commit
+from .pagination import KeysetPage
+
+CACHE_HIT = 'hit'
+CACHE_MISS = 'miss'
+
+# Outcomes of the cached reads made by the current request, a list set by the request metrics
+request_cache_outcomes = ContextVar('request_cache_outcomes', default=None)
+
+
+def task_cache():
+    return caches[getattr(settings, 'TASK_CACHE_ALIAS', 'default')]
+
+
+def cache_timeout():
+    return getattr(settings, 'TASK_CACHE_TIMEOUT', 300)
+
+
+def task_cache_shared():
+    """
+    Whether every process reads the same task cache : only then does the generation bumped by a write, served by
+    another worker or made by a Celery job, invalidate what a process cached
+    """
+    return getattr(settings, 'TASK_CACHE_SHARED', False)
+
+
+def generation_key(user_id):
+    return f'tasks:generation:{user_id}'
+
+
+def modified_key(user_id):
+    return f'tasks:modified:{user_id}'
+
+
+def recent_write_key(user_id):
+    return f'tasks:recent-write:{user_id}'
+
+
+def new_generation():
+    # A counter lost to eviction restarts somewhere unrelated, never at a generation whose entries may still be cached
+    return time.time_ns()
+
+
+def task_generation(user_id):
+    """
+    Generation of the tasks of a user : every cached read of them is keyed on it, bumping it invalidates them all
+    """
+    cache = task_cache()
+    key = generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, new_generation(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def task_watermark(user_id):
+    """
+    (generation, modification time) of the tasks of a user, read in one round trip to the cache
+    """
+    cache = task_cache()
+    keys = [generation_key(user_id), modified_key(user_id)]
+    values = cache.get_many(keys)
+    if len(values) < len(keys):
+        cache.add(keys[0], new_generation(), None)
+        cache.add(keys[1], time.time(), None)
+        values = cache.get_many(keys)
+    return values[keys[0]], values[keys[1]]
+
+
+def bump_generations(user_ids):
+    cache = task_cache()
+    for user_id in user_ids:
+        try:
+            cache.incr(generation_key(user_id))
+        except ValueError:
+            cache.add(generation_key(user_id), new_generation(), None)
+    now = time.time()
+    cache.set_many({modified_key(user_id): now for user_id in user_ids}, None)
+
+
+def mark_recent_writes(user_ids):
+    """
+    Keeps the reads of `user_ids` on the primary database for REPLICA_STICKY_SECONDS, while the replica catches up
+    with their writes. Nothing to mark without a DATABASE_REPLICA.
+    """
+    if getattr(settings, 'DATABASE_REPLICA', None) is None:
+        return
+    task_cache().set_many({recent_write_key(user_id): True for user_id in user_ids}, getattr(settings, 'REPLICA_STICKY_SECONDS', 10))
+
+
+def wrote_recently(user_id):
+    return task_cache().get(recent_write_key(user_id)) is not None
+
+
+def invalidate_task_caches(user_ids):
+    """
+    Invalidates the cached reads and the validators of the tasks of `user_ids` and pushes a `tasks` event to their
+    streams, to be called by everything writing Task rows. Inside a transaction the generations are bumped again on
+    commit : a read made before the commit sees the old rows and may cache them under the generation bumped first.
+    The reads of the users stick to the primary from the commit on, not to cache what the replica has not caught up.
+    """
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return
+    bump_generations(user_ids)
+    mark_recent_writes(user_ids)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: (bump_generations(user_ids), mark_recent_writes(user_ids)))
+    publish_on_commit(user_ids, 'tasks')
+
+
+def metric_key(name, outcome):
+    return f'tasks:metrics:{name}:{outcome}'
+
+
+def add_to_counter(key, delta):
+    """
+    Adds `delta` to a counter kept in the task cache without expiry, created on first use
+    """
+    cache = task_cache()
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, None):
+            cache.incr(key, delta)
+
+
+def record_outcome(name, outcome):
+    add_to_counter(metric_key(name, outcome), 1)
+    outcomes = request_cache_outcomes.get()
+    if outcomes is not None:
+        outcomes.append(outcome)
+
+
+def cache_metrics(names):
+    """
+    {name: {'hits': ..., 'misses': ...}} of the cached reads named `names`, shared by every process using the cache
+    """
+    keys = {name: (metric_key(name, CACHE_HIT), metric_key(name, CACHE_MISS)) for name in names}
+    values = task_cache().get_many([key for pair in keys.values() for key in pair])
+    return {
+        name: {'hits': values.get(hit_key, 0), 'misses': values.get(miss_key, 0)}
+        for name, (hit_key, miss_key) in keys.items()
+    }
+
+
+def request_params(request):
+    """
+    What a cached read depends on besides the user : the host its links point to, the path and the query parameters
+    """
+    query = sorted((key, sorted(values)) for key, values in request.GET.lists())
+    return f'{request.get_host()}{request.path}?{query!r}'
+
+
+def cached_read(name, user_id, params, build):
+    """
+    Returns (value, outcome) : the value cached for `name`, `user_id` and `params` at the current generation of
+    the user, else the value returned by `build()`, which is then cached. Outcome is CACHE_HIT, CACHE_MISS or None
+    when caching is disabled, by a TASK_CACHE_TIMEOUT of 0 or a task cache that is not shared.
+    """
+    timeout = cache_timeout()
+    if not timeout or not task_cache_shared():
+        return build(), None
+    cache = task_cache()
+    # The generation is read before building : a write made meanwhile bumps it past the entry cached here
+    digest = hashlib.md5(params.encode()).hexdigest()
+    key = f'tasks:read:{name}:{user_id}:{task_generation(user_id)}:{digest}'
+    value = cache.get(key)
+    if value is not None:
+        record_outcome(name, CACHE_HIT)
+        return value, CACHE_HIT
+    value = build()
+    cache.set(key, value, timeout)
+    record_outcome(name, CACHE_MISS)
+    return value, CACHE_MISS
+
+
+class CachedKeysetPageMixin:
+    """
+    KeysetPaginationMixin ListView whose pages are cached per user until their tasks change. The rows are cached
+    rather than the rendered page, which holds the CSRF token of the request.
+    """
+    cache_name = None
+
+    def get_page(self, paginator, cursor):
+        state, self.cache_outcome = cached_read(
+            self.cache_name, self.request.user.id, request_params(self.request), lambda: paginator.fetch(cursor),
+        )
+        return KeysetPage(*state, paginator=paginator)
+
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        if getattr(self, 'cache_outcome', None):
+            response['X-Cache'] = self.cache_outcome
+        return response
+
+
+class CachedListMixin:
+    """
+    ViewSet whose list action is cached per user until their tasks change
+    """
+    cache_name = None
+
+    def list(self, request, *args, **kwargs):
+        data, outcome = cached_read(
+            self.cache_name, request.user.id, request_params(request), lambda: super(CachedListMixin, self).list(request, *args, **kwargs).data,
+        )
+        response = Response(data)
+        if outcome:
+            response['X-Cache'] = outcome
+        return response
+
+
+class ConditionalReadMixin:
+    """
+    ViewSet whose list and retrieve actions carry an ETag and a Last-Modified taken from the watermark of the
+    tasks of the user. A request whose If-None-Match or If-Modified-Since still matches gets a 304 before any
+    row is loaded or serialized. Without a shared task cache the watermark of a process misses the writes of the
+    others, no validator is sent.
+    """
+    def get_validators(self, request):
+        generation, modified = task_watermark(request.user.id)
+        params = f'{self.basename}:{self.action}:{request_params(request)}:{request.META.get("HTTP_ACCEPT", "")}'
+        etag = quote_etag(hashlib.md5(f'{generation}:{params}'.encode()).hexdigest())
+        # Last-Modified has a resolution of one second : it is only sent once the second of the last change is over,
+        # so a change made later in that second cannot be hidden behind it
+        last_modified = int(modified) if int(modified) < int(time.time()) else None
+        return etag, last_modified
+
+    def conditional_read(self, read, request, *args, **kwargs):
+        if not task_cache_shared():
+            return read(request, *args, **kwargs)
+        etag, last_modified = self.get_validators(request)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = read(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_read(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_read(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,45 @@
+"""
+Database connection hooks : SQLite tuning, and health checks of the connections kept open between requests
+"""
+from django.conf import settings
+from django.db import connections
+
+
+def tune_sqlite(connection, pragmas=None):
+    """
+    Applies the SQLITE_PRAGMAS to a new SQLite connection. They go straight to the driver : they are not queries
+    of the request that opened the connection.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {}) if pragmas is None else pragmas
+    for name, value in pragmas.items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+def persistent(connection):
+    return connection.connection is not None and connection.settings_dict['CONN_MAX_AGE'] != 0 and not connection.in_atomic_block
+
+
+def check_connections():
+    """
+    Closes the kept open connections the database server dropped since their last use, the next query opens a new
+    one rather than failing. Django 4.0 only drops a broken connection once a query failed on it. Costs a round trip
+    per connection kept open, DATABASE_HEALTH_CHECKS turns it off.
+    """
+    if not getattr(settings, 'DATABASE_HEALTH_CHECKS', True):
+        return
+    for connection in connections.all():
+        if persistent(connection) and not connection.is_usable():
+            connection.close()
+
+
+def close_request_connections(sender=None, **kwargs):
+    """
+    request_finished receiver of the ASGI application : closes the connections of the thread that served the request.
+    The sync code of each request runs in a thread of its own that ends with it, a connection kept open there would
+    never be used again.
+    """
+    for connection in connections.all():
+        if persistent(connection):
+            connection.close()
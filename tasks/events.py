@@ -0,0 +1,209 @@
+import asyncio
+import json
+import logging
+import threading
+from http.cookies import SimpleCookie
+from importlib import import_module
+
+import redis
+import redis.asyncio
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import close_old_connections, transaction
+from django.http import HttpRequest
+
+logger = logging.getLogger(__name__)
+
+EVENTS_PATH = '/events/'
+EVENTS_CHANNEL = 'tasks:events'
+# Seconds between two keep-alive comments on an idle stream, proxies close connections that stay silent
+HEARTBEAT_INTERVAL = 15
+# Milliseconds a client waits before reconnecting a dropped stream
+RETRY_INTERVAL = 3000
+
+
+def redis_url():
+    return getattr(settings, 'TASK_EVENTS_REDIS_URL', None)
+
+
+class Subscriber:
+    """
+    Events waiting to be sent on one connection. An event tells the client what to fetch again, so the pending ones
+    are coalesced by type : a slow or idle subscriber holds one event per type however many are published.
+    """
+    __slots__ = ('user_id', 'loop', 'pending', 'ready', 'closed')
+
+    def __init__(self, user_id, loop):
+        self.user_id = user_id
+        self.loop = loop
+        self.pending = {}
+        self.ready = asyncio.Event()
+        self.closed = False
+
+    def push(self, event):
+        self.pending[event['type']] = event
+        self.ready.set()
+
+    def close(self):
+        self.closed = True
+        self.ready.set()
+
+    async def next_events(self, timeout):
+        """
+        Pending events, waiting up to `timeout` seconds for one. An empty list on timeout or once closed.
+        """
+        # A timer rather than wait_for, which would keep one more task alive per idle connection
+        timer = self.loop.call_later(timeout, self.ready.set)
+        await self.ready.wait()
+        timer.cancel()
+        self.ready.clear()
+        events, self.pending = list(self.pending.values()), {}
+        return [] if self.closed else events
+
+
+class EventBroker:
+    """
+    Delivers published events to the subscribers of this process. With TASK_EVENTS_REDIS_URL set, events are
+    published to a Redis channel instead and every process delivers them to its own subscribers, so a write
+    served by any worker reaches the streams held by the others.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+        self.client = None
+        self.listener = None
+
+    def subscribe(self, user_id):
+        loop = asyncio.get_event_loop()
+        subscriber = Subscriber(user_id, loop)
+        with self.lock:
+            self.subscribers.setdefault(user_id, set()).add(subscriber)
+        if redis_url() and (self.listener is None or self.listener.done() or self.listener.get_loop() is not loop):
+            self.listener = loop.create_task(self.listen(redis_url()))
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            subscribers = self.subscribers.get(subscriber.user_id, set())
+            subscribers.discard(subscriber)
+            if not subscribers:
+                self.subscribers.pop(subscriber.user_id, None)
+
+    def subscriber_count(self):
+        with self.lock:
+            return sum(len(subscribers) for subscribers in self.subscribers.values())
+
+    def deliver(self, user_id, event):
+        """
+        Hands `event` to the subscribers of `user_id` in this process, from any thread
+        """
+        with self.lock:
+            subscribers = list(self.subscribers.get(user_id, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.push, event)
+            except RuntimeError:
+                # The loop of the subscriber is closed, its stream is gone
+                self.unsubscribe(subscriber)
+
+    def publish(self, user_id, event):
+        url = redis_url()
+        if not url:
+            self.deliver(user_id, event)
+            return
+        try:
+            if self.client is None:
+                self.client = redis.Redis.from_url(url)
+            self.client.publish(EVENTS_CHANNEL, json.dumps({'user': user_id, 'event': event}))
+        except redis.RedisError:
+            # Events are hints, a write never fails because they could not be sent
+            logger.exception("Could not publish the event of user %s", user_id)
+
+    async def listen(self, url):
+        while True:
+            try:
+                pubsub = redis.asyncio.from_url(url).pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(EVENTS_CHANNEL)
+                async for message in pubsub.listen():
+                    payload = json.loads(message['data'])
+                    self.deliver(payload['user'], payload['event'])
+            except redis.RedisError:
+                logger.exception("Lost the events channel, subscribing again")
+                await asyncio.sleep(1)
+
+
+broker = EventBroker()
+
+
+def publish_on_commit(user_ids, event_type):
+    """
+    Publishes an event of `event_type` to each of `user_ids` once the current transaction commits, so the
+    subscribers fetching what changed read the committed rows
+    """
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if user_ids:
+        transaction.on_commit(lambda: [broker.publish(user_id, {'type': event_type}) for user_id in user_ids])
+
+
+def format_event(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+# A session read needs no other thread's state : streams opening together are authenticated in parallel
+@sync_to_async(thread_sensitive=False)
+def scope_user_id(scope):
+    """
+    Id of the user logged in by the session cookie of an ASGI connection, None when anonymous
+    """
+    cookies = SimpleCookie()
+    for name, value in scope.get('headers', []):
+        if name == b'cookie':
+            cookies.load(value.decode('latin-1'))
+    if settings.SESSION_COOKIE_NAME not in cookies:
+        return None
+    request = HttpRequest()
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore(cookies[settings.SESSION_COOKIE_NAME].value)
+    try:
+        user = get_user(request)
+        return user.id if user.is_authenticated else None
+    finally:
+        close_old_connections()
+
+
+async def watch_disconnect(receive, subscriber):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+    subscriber.close()
+
+
+class EventStream:
+    """
+    ASGI application streaming the events of the logged in user as Server-Sent Events. A connection is a coroutine
+    waiting on its Subscriber : an idle one holds no thread, and a bounded amount of memory.
+    """
+    def __init__(self, broker=broker):
+        self.broker = broker
+
+    async def __call__(self, scope, receive, send):
+        user_id = await scope_user_id(scope)
+        if user_id is None:
+            await send({'type': 'http.response.start', 'status': 403, 'headers': [(b'content-type', b'text/plain')]})
+            await send({'type': 'http.response.body', 'body': b'Authentication required'})
+            return
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')],
+        })
+        subscriber = self.broker.subscribe(user_id)
+        watcher = asyncio.ensure_future(watch_disconnect(receive, subscriber))
+        try:
+            body = f'retry: {RETRY_INTERVAL}\n\n'
+            while not subscriber.closed:
+                await send({'type': 'http.response.body', 'body': body.encode(), 'more_body': True})
+                events = await subscriber.next_events(HEARTBEAT_INTERVAL)
+                body = ''.join(format_event(event) for event in events) or ': ping\n\n'
+        finally:
+            self.broker.unsubscribe(subscriber)
+            watcher.cancel()
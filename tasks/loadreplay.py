@@ -0,0 +1,326 @@
+"""
+Load replay : sends a stream of requests to the app from concurrent workers, in process through the WSGI or the ASGI
+handler or over HTTP to a running server, and reports the throughput, the latency percentiles and the errors per route
+"""
+import asyncio
+import cProfile
+import io
+import itertools
+import json
+import pstats
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+import requests
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.middleware.csrf import CSRF_ALLOWED_CHARS, CSRF_SECRET_LENGTH
+from django.test import Client
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.urls import Resolver404, resolve
+from django.utils.crypto import get_random_string
+
+from tasks.benchmark import PLACEHOLDER_IDS, ROUTES, Route, consume
+from tasks.metrics import UNMATCHED_ROUTE, match_label
+from tasks.management.commands._benchmark import percentile
+
+PERCENTILES = (0.5, 0.95, 0.99)
+
+
+def route_name(method, path):
+    """
+    Name a streamed request is reported under : the route its path resolves to, followed by the method unless a GET
+    """
+    try:
+        # The root pattern is unnamed and empty
+        label = match_label(resolve(urlsplit(path.format(**PLACEHOLDER_IDS)).path)) or '/'
+    except (Resolver404, KeyError, IndexError, ValueError):
+        label = UNMATCHED_ROUTE
+    return label if method == 'get' else f'{label} {method}'
+
+
+def load_stream(path):
+    """
+    Requests of a JSON lines file, one {"method", "path", "data", "json"} object per line, `path` may hold the
+    {task}, {change} and {notification} placeholders. Returns the requests and the number of lines that are not one.
+    """
+    stream = []
+    skipped = 0
+    with open(path) as lines:
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                skipped += 1
+                continue
+            if not isinstance(entry, dict) or not isinstance(entry.get('method'), str) or not isinstance(entry.get('path'), str):
+                skipped += 1
+                continue
+            method = entry['method'].lower()
+            stream.append(Route(route_name(method, entry['path']), method, entry['path'], entry.get('data'), bool(entry.get('json'))))
+    return stream, skipped
+
+
+def save_stream(stream, path):
+    with open(path, 'w') as lines:
+        for route in stream:
+            lines.write(json.dumps({'method': route.method, 'path': route.path, 'data': route.data, 'json': route.as_json}) + '\n')
+
+
+def synthetic_stream(count, writes=False, seed=0):
+    """
+    `count` requests drawn at random from the benchmarked routes, the reads only unless `writes`. Logging out would
+    end the session of the worker, and requests whose data depends on the seeded ids could not be saved, they are
+    left out.
+    """
+    routes = [
+        route for route in ROUTES
+        if (writes or not route.writes) and route.name != 'user-logout' and not callable(route.data)
+    ]
+    return random.Random(seed).choices(routes, k=count)
+
+
+class Replay:
+    """
+    (route name, status, seconds) of every replayed request, the status None when no response came back. With a
+    `rate` the requests are sent on a schedule, and timed from when they were due : a request held up behind slow
+    ones counts the wait, as it would for a client.
+    """
+    def __init__(self, stream, concurrency, rate=None):
+        self.stream = stream
+        self.concurrency = concurrency
+        self.rate = rate
+        self.results = []
+        self.failures = []
+        self.elapsed = None
+
+    def due(self, start, index):
+        return start + index / self.rate if self.rate else time.perf_counter()
+
+    def record(self, route, status, scheduled, error=None):
+        self.results.append((route.name, status, time.perf_counter() - scheduled))
+        if error is not None:
+            self.failures.append(f'{route.name} : {error!r}')
+
+    def run(self, send):
+        """
+        Replays the stream from threads calling `send(route)`, which returns the status of the response
+        """
+        # Shared by the workers : each takes the next request of the stream, next() on a count is atomic
+        positions = itertools.count()
+        start = time.perf_counter()
+
+        def worker():
+            try:
+                for index in positions:
+                    if index >= len(self.stream):
+                        return
+                    scheduled = self.due(start, index)
+                    delay = scheduled - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    try:
+                        self.record(self.stream[index], send(self.stream[index]), scheduled)
+                    except Exception as error:
+                        self.record(self.stream[index], None, scheduled, error)
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            for future in [pool.submit(worker) for _ in range(self.concurrency)]:
+                future.result()
+        self.elapsed = time.perf_counter() - start
+        return self
+
+    def run_async(self, send):
+        """
+        Replays the stream from coroutines awaiting `send(route)`
+        """
+        async def replay():
+            positions = itertools.count()
+            start = time.perf_counter()
+
+            async def worker():
+                for index in positions:
+                    if index >= len(self.stream):
+                        return
+                    scheduled = self.due(start, index)
+                    delay = scheduled - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    try:
+                        self.record(self.stream[index], await send(self.stream[index]), scheduled)
+                    except Exception as error:
+                        self.record(self.stream[index], None, scheduled, error)
+
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+            self.elapsed = time.perf_counter() - start
+
+        asyncio.run(replay())
+        return self
+
+    def summary(self):
+        """
+        {route: {requests, 4xx, errors, p50_ms, p95_ms, p99_ms}}, server errors and failed requests counted as errors
+        """
+        latencies = defaultdict(list)
+        routes = {}
+        for name, status, seconds in self.results:
+            latencies[name].append(seconds * 1000)
+            counts = routes.setdefault(name, {'requests': 0, '4xx': 0, 'errors': 0})
+            counts['requests'] += 1
+            if status is None or status >= 500:
+                counts['errors'] += 1
+            elif status >= 400:
+                counts['4xx'] += 1
+        for name, counts in routes.items():
+            ordered = sorted(latencies[name])
+            for fraction in PERCENTILES:
+                counts[f'p{round(fraction * 100)}_ms'] = round(percentile(ordered, fraction), 3)
+        return dict(sorted(routes.items()))
+
+    def throughput(self):
+        return len(self.results) / self.elapsed if self.elapsed else 0.0
+
+
+class ClientSender:
+    """
+    Sends the requests through the WSGI handler of this process, with a test client per thread logged in as `user`
+    """
+    def __init__(self, user, ids):
+        self.user = user
+        self.ids = ids
+        self.local = threading.local()
+
+    def client(self):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = Client(raise_request_exception=False)
+            client.force_login(self.user)
+        return client
+
+    def __call__(self, route):
+        response = consume(route.request(self.client(), self.ids))
+        # A view that raised is reported with its exception rather than as a bare 500
+        if response.exc_info:
+            raise response.exc_info[1]
+        return response.status_code
+
+
+class AsgiSender:
+    """
+    Sends the requests to the ASGI application of the project, called from the event loop of this process the way a
+    server calls it, with the session cookie of `user`
+    """
+    def __init__(self, user, ids):
+        # Imported when needed : the module builds the Django application as it is imported
+        from task_manager.asgi import application
+
+        client = Client()
+        client.force_login(user)
+        self.application = application
+        self.cookie = '; '.join(f'{name}={morsel.value}' for name, morsel in client.cookies.items()).encode()
+        self.ids = ids
+
+    def scope(self, route, query, content_type, length):
+        path = route.path.format(**self.ids)
+        headers = [(b'host', b'testserver'), (b'cookie', self.cookie), (b'content-length', str(length).encode())]
+        if content_type:
+            headers.append((b'content-type', content_type.encode()))
+        return {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http', 'method': route.method.upper(),
+            'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '', 'headers': headers,
+            'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+        }
+
+    async def __call__(self, route):
+        data = route.payload(self.ids)
+        query, body, content_type = '', b'', None
+        if route.method == 'get':
+            query = urlencode(data or {}, doseq=True)
+        elif route.as_json:
+            body, content_type = json.dumps(data, cls=DjangoJSONEncoder).encode(), 'application/json'
+        else:
+            body, content_type = encode_multipart(BOUNDARY, data or {}), MULTIPART_CONTENT
+        requested = False
+        status = None
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            # Connected until the whole response is sent
+            return await asyncio.Future()
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+
+        await self.application(self.scope(route, query, content_type, len(body)), receive, send)
+        return status
+
+
+class HttpSender:
+    """
+    Sends the requests over HTTP to the server at `base_url`, with the `session_key` session and a CSRF token of its
+    own in the cookie and the header, with a connection per thread kept alive between requests. `host` is sent as the
+    Host header, one of the ALLOWED_HOSTS of the server when it is not reached under that name.
+    """
+    def __init__(self, base_url, session_key, ids, timeout=30, host=None):
+        self.base_url = base_url.rstrip('/')
+        self.ids = ids
+        self.timeout = timeout
+        self.csrf_token = get_random_string(CSRF_SECRET_LENGTH, CSRF_ALLOWED_CHARS)
+        self.headers = {'X-CSRFToken': self.csrf_token, 'Referer': self.base_url + '/'}
+        if host:
+            self.headers['Host'] = host
+        self.cookies = {settings.SESSION_COOKIE_NAME: session_key, settings.CSRF_COOKIE_NAME: self.csrf_token}
+        self.local = threading.local()
+
+    def session(self):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = requests.Session()
+            session.cookies.update(self.cookies)
+            session.headers.update(self.headers)
+        return session
+
+    def __call__(self, route):
+        data = route.payload(self.ids)
+        kwargs = {'params': data} if route.method == 'get' else {'json': data} if route.as_json else {'data': data}
+        response = self.session().request(
+            route.method.upper(), self.base_url + route.path.format(**self.ids), timeout=self.timeout, stream=True, allow_redirects=False, **kwargs,
+        )
+        with response:
+            for _ in response.iter_content(65536):
+                pass
+        return response.status_code
+
+
+def profile_routes(routes, user, ids, runs=20, limit=15):
+    """
+    {route name: the `limit` costliest functions by cumulative time} of `runs` requests to each of the `routes`,
+    sent in process under cProfile
+    """
+    client = Client(raise_request_exception=False)
+    client.force_login(user)
+    reports = {}
+    for route in routes:
+        profile = cProfile.Profile()
+        profile.enable()
+        for _ in range(runs):
+            consume(route.request(client, ids))
+        profile.disable()
+        report = io.StringIO()
+        pstats.Stats(profile, stream=report).sort_stats('cumulative').print_stats(limit)
+        reports[route.name] = report.getvalue()
+    return reports
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import connection, connections, transaction
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+# Offline : nothing leaves the process, whatever the environment configures
+OFFLINE_SETTINGS = {
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    # Every request is served by this process, its local cache is the one they all read
+    'TASK_CACHE_SHARED': True,
+    'TASK_EVENTS_REDIS_URL': None,
+    'REQUEST_SLOW_SECONDS': None,
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """
+    Runs the block inside a transaction that is always rolled back, so benchmarks can seed data
+    against the configured database without leaving anything behind
+    """
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback()
+    except Rollback:
+        pass
+
+
+@contextmanager
+def throwaway_databases(on_disk=False):
+    """
+    Runs the block offline against test databases created for it and destroyed after, for benchmarks that commit
+    what they seed : threads and async views do not see the rows of an open transaction. SQLite test databases are
+    kept in memory unless `on_disk` : concurrent requests lock the tables of a shared in-memory database at once,
+    while a file waits for its lock.
+    """
+    test_names = {}
+    if on_disk:
+        for alias in connections:
+            settings_dict = connections[alias].settings_dict
+            if connections[alias].vendor == 'sqlite':
+                test_names[alias] = settings_dict['TEST']['NAME']
+                settings_dict['TEST']['NAME'] = os.path.join(tempfile.gettempdir(), f'task_manager_{alias}_{os.getpid()}.sqlite3')
+    # setup_test_environment swaps in the locmem email backend
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        with override_settings(**OFFLINE_SETTINGS):
+            yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+        for alias, name in test_names.items():
+            connections[alias].settings_dict['TEST']['NAME'] = name
+
+
+@contextmanager
+def measure():
+    """
+    Collects the wall time in milliseconds and the queries executed by the block
+    """
+    result = {}
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        yield result
+        result['ms'] = (time.perf_counter() - start) * 1000
+    result['queries'] = len(queries)
+
+
+def parse_sizes(value):
+    return [int(size) for size in value.split(',') if size]
+
+
+def login_session(username, password):
+    """
+    Key of a new session logged in as `username`, created with `password` if needed, for load tests to authenticate
+    with a cookie rather than paying a password hash per request
+    """
+    user, _ = User.objects.get_or_create(username=username)
+    user.set_password(password)
+    user.save()
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    return session.session_key
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.archive import archive_tasks
+
+
+class Command(BaseCommand):
+    help = "Moves the deleted and completed tasks left alone for the archival period, with their history, to the archive"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Days without a change before a task is archived, TASK_ARCHIVE_AFTER_DAYS by default')
+        parser.add_argument('--batch-size', type=int, help='Tasks archived per transaction, TASK_ARCHIVE_BATCH_SIZE by default')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        archived = archive_tasks(days=options['days'], batch_size=options['batch_size'])
+        self.stdout.write(f'Archived {archived} tasks')
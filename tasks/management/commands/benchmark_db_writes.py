@@ -0,0 +1,107 @@
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections, transaction
+from django.test.utils import override_settings
+
+from tasks.benchmark import seed
+from tasks.models import STATUS_CHOICES, Task
+
+from ._benchmark import percentile, throwaway_databases
+
+# What SQLite does without SQLITE_PRAGMAS : a rollback journal synced on every commit, and the 5 seconds the
+# driver waits for a lock
+SQLITE_DEFAULTS = {'busy_timeout': 5000, 'journal_mode': 'delete', 'synchronous': 'full'}
+
+
+class Worker(threading.Thread):
+    """
+    Runs `operation` in a loop until `deadline`, recording the latency of each run and the lock errors
+    """
+    def __init__(self, operation, deadline):
+        super().__init__()
+        self.operation = operation
+        self.deadline = deadline
+        self.latencies = []
+        self.errors = 0
+
+    def run(self):
+        try:
+            while time.perf_counter() < self.deadline:
+                start = time.perf_counter()
+                try:
+                    self.operation()
+                except OperationalError:
+                    self.errors += 1
+                else:
+                    self.latencies.append((time.perf_counter() - start) * 1000)
+        finally:
+            connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the write contention of the SQLite database with and without SQLITE_PRAGMAS and "
+        "SQLITE_IMMEDIATE_TRANSACTIONS : threads updating tasks in transactions, as the views and the report job "
+        "do, next to threads reading task lists"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--duration', type=float, default=5, help='Seconds each profile runs')
+        parser.add_argument('--users', type=int, default=4)
+        parser.add_argument('--tasks', type=int, default=200, help='Tasks per user')
+
+    def handle(self, *args, **options):
+        with throwaway_databases(on_disk=True):
+            with override_settings(SQLITE_PRAGMAS=SQLITE_DEFAULTS):
+                seed(options['users'], options['tasks'], 1)
+            task_ids = list(Task.objects.values_list('id', 'user_id'))
+            self.stdout.write(
+                f"{'profile':>8} {'writes/s':>9} {'write p50':>10} {'write p99':>10} {'errors':>7} {'reads/s':>8} {'read p99':>9} {'errors':>7}"
+            )
+            for name, defaults in (('default', {'SQLITE_PRAGMAS': SQLITE_DEFAULTS, 'SQLITE_IMMEDIATE_TRANSACTIONS': False}), ('tuned', {'SQLITE_IMMEDIATE_TRANSACTIONS': True})):
+                connections.close_all()
+                with override_settings(**defaults):
+                    # The journal mode is switched by the first connection, before the others hold the database
+                    connection.ensure_connection()
+                    writers, readers = self.run(task_ids, options)
+                self.report(name, writers, readers, options['duration'])
+            connections.close_all()
+
+    def run(self, task_ids, options):
+        statuses = [status for status, _ in STATUS_CHOICES]
+
+        def write():
+            task_id, _ = random.choice(task_ids)
+            with transaction.atomic():
+                task = Task.objects.select_for_update().get(id=task_id)
+                task.status = random.choice([status for status in statuses if status != task.status])
+                task.save()
+
+        def read():
+            _, user_id = random.choice(task_ids)
+            list(Task.objects.filter(user_id=user_id, deleted=False).order_by('priority')[:50])
+
+        deadline = time.perf_counter() + options['duration']
+        writers = [Worker(write, deadline) for _ in range(options['writers'])]
+        readers = [Worker(read, deadline) for _ in range(options['readers'])]
+        for worker in writers + readers:
+            worker.start()
+        for worker in writers + readers:
+            worker.join()
+        return writers, readers
+
+    def report(self, name, writers, readers, duration):
+        writes = sorted(latency for worker in writers for latency in worker.latencies)
+        reads = sorted(latency for worker in readers for latency in worker.latencies)
+        write_p50 = percentile(writes, 0.5) if writes else float('nan')
+        write_p99 = percentile(writes, 0.99) if writes else float('nan')
+        read_p99 = percentile(reads, 0.99) if reads else float('nan')
+        self.stdout.write(
+            f"{name:>8} {len(writes) / duration:>9.1f} {write_p50:>10.2f} {write_p99:>10.2f} {sum(worker.errors for worker in writers):>7} "
+            f"{len(reads) / duration:>8.1f} {read_p99:>9.2f} {sum(worker.errors for worker in readers):>7}"
+        )
@@ -0,0 +1,46 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from tasks.models import Task
+from tasks.priority import make_room_for_priority
+
+from ._benchmark import measure, parse_sizes, rolled_back
+
+
+def legacy_make_room(user, priority):
+    """
+    The per-priority COUNT loop the create/update views used before the allocation service
+    """
+    if Task.objects.filter(priority=priority, deleted = False, completed = False, user = user).exists():
+        i = 0
+        while(True):
+            updatedRowsCount = Task.objects.filter(priority=priority+i, deleted = False, completed = False, user = user).count()
+            if updatedRowsCount == 0:
+                break
+            i += 1
+        Task.objects.filter(priority__gte=priority, priority__lte=priority+i ,deleted = False, completed = False, user = user).update(priority = F('priority')+1)
+
+
+class Command(BaseCommand):
+    help = "Compares query count and latency of the priority reshuffle against the pending backlog size"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,100,1000,5000', help='Comma separated pending task counts')
+        parser.add_argument('--skip-legacy', action='store_true', help='Only measure the allocation service')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'backlog':>8} {'impl':>8} {'queries':>8} {'ms':>10}")
+        for size in parse_sizes(options['sizes']):
+            implementations = [('service', make_room_for_priority)]
+            if not options['skip_legacy']:
+                implementations.append(('legacy', legacy_make_room))
+            for name, make_room in implementations:
+                with rolled_back():
+                    user = User.objects.create(username=f'benchmark-priority-{size}')
+                    Task.objects.bulk_create(
+                        Task(title=f'task {i}', description='', priority=i, user=user) for i in range(1, size + 1)
+                    )
+                    with measure() as result:
+                        make_room(user, 1)
+                self.stdout.write(f"{size:>8} {name:>8} {result['queries']:>8} {result['ms']:>10.2f}")
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.benchmark import BASELINE_PATH, TOLERANCES, benchmark_routes, load_baseline, regressions, save_baseline, uncovered_routes
+
+from ._benchmark import throwaway_databases
+
+
+class Command(BaseCommand):
+    help = (
+        "Requests every route against a seeded throwaway SQLite database and compares the queries, SQL time, "
+        "wall time and peak memory of each with the committed baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, help='Users seeded, the size of the baseline dataset by default')
+        parser.add_argument('--tasks', type=int, help='Tasks per user')
+        parser.add_argument('--history', type=int, help='Status changes per task')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per route, the times are their medians')
+        parser.add_argument('--baseline', default=str(BASELINE_PATH))
+        parser.add_argument('--update-baseline', action='store_true', help='Writes the results as the new baseline')
+
+    def handle(self, *args, **options):
+        missing = uncovered_routes()
+        if missing:
+            raise CommandError(f"Routes without a benchmark request : {', '.join(missing)}")
+        baseline = None if options['update_baseline'] else load_baseline(options['baseline'])
+        defaults = baseline['dataset'] if baseline else {'users': 3, 'tasks': 50, 'history': 3}
+        dataset = {key: options[key] if options[key] is not None else defaults[key] for key in ('users', 'tasks', 'history')}
+
+        with throwaway_databases():
+            results = benchmark_routes(dataset['users'], dataset['tasks'], dataset['history'], options['repeat'])
+
+        self.stdout.write(f"{'route':<34} {'status':>6} {'queries':>8} {'SQL ms':>8} {'ms':>8} {'peak KiB':>9}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<34} {result['status']:>6} {result['queries']:>8} {result['sql_ms']:>8.2f} {result['ms']:>8.2f} {result['peak_kib']:>9.1f}"
+            )
+        if options['update_baseline']:
+            save_baseline(dataset, results, options['baseline'])
+            self.stdout.write(f"Baseline written to {options['baseline']}")
+            return
+        if baseline['dataset'] != dataset:
+            self.stdout.write(f"Dataset differs from the baseline's {baseline['dataset']} : only the query counts are compared")
+        found = regressions(baseline, dataset, results)
+        for name, measure, expected, value in found:
+            ratio, slack = TOLERANCES.get(measure, (None, None))
+            bound = f' (allowed {expected * ratio + slack:g})' if ratio is not None else ''
+            self.stderr.write(f'{name} : {measure} {expected} -> {value}{bound}')
+        if found:
+            raise CommandError(f'{len(found)} regressions against the baseline')
+        self.stdout.write('No regression against the baseline')
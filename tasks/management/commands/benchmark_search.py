@@ -0,0 +1,52 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from tasks.models import Task
+from tasks.search import SEARCH_ORDERING, search_tasks
+
+from ._benchmark import measure, parse_sizes, rolled_back
+
+SEED_BATCH_SIZE = 5000
+PAGE_SIZE = 20
+WORDS = ('report', 'invoice', 'meeting', 'review', 'deploy', 'backup', 'budget', 'contract', 'hiring', 'travel')
+
+
+def seed_tasks(user, size):
+    for start in range(0, size, SEED_BATCH_SIZE):
+        Task.objects.bulk_create(
+            Task(
+                title=f'{WORDS[i % len(WORDS)]} {i}',
+                description=f'{WORDS[i * 7 % len(WORDS)]} notes for item{i}',
+                priority=i,
+                user=user,
+            )
+            for i in range(start, min(start + SEED_BATCH_SIZE, size))
+        )
+
+
+def legacy_search(user, term):
+    return list(Task.objects.filter(deleted = False, user = user, title__icontains = term).order_by('priority')[:PAGE_SIZE])
+
+
+def indexed_search(user, term):
+    tasks = Task.objects.filter(deleted = False, user = user)
+    return list(search_tasks(tasks, term, user = user).order_by(*SEARCH_ORDERING)[:PAGE_SIZE])
+
+
+class Command(BaseCommand):
+    help = "Compares the latency of the full-text task search against the title LIKE scan as the tasks of a user grow"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,50000', help='Comma separated task counts of the searching user')
+        parser.add_argument('--term', default='item4242', help='Term searched for, the default matches a single task')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'tasks':>8} {'impl':>8} {'matches':>8} {'queries':>8} {'ms':>10}")
+        for size in parse_sizes(options['sizes']):
+            with rolled_back():
+                user = User.objects.create(username=f'benchmark-search-{size}')
+                seed_tasks(user, size)
+                for name, search in (('indexed', indexed_search), ('legacy', legacy_search)):
+                    with measure() as result:
+                        matches = len(search(user, options['term']))
+                    self.stdout.write(f"{size:>8} {name:>8} {matches:>8} {result['queries']:>8} {result['ms']:>10.2f}")
@@ -0,0 +1,54 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from tasks.apiviews import TaskSerializer, TaskStatusSerializer
+from tasks.models import STATUS_CHOICES, Task, TaskStatusChange
+from tasks.projection import ValuesRepresentation
+
+from ._benchmark import parse_sizes, rolled_back
+
+
+def serializer_rows(serializer_class, queryset):
+    return serializer_class(queryset, many=True).data
+
+
+def values_rows(serializer_class, queryset):
+    representation = ValuesRepresentation(serializer_class())
+    return representation.to_representation(representation.rows(queryset))
+
+
+def rows_per_second(serialize, serializer_class, queryset, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = len(serialize(serializer_class, queryset.all()))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return rows / best
+
+
+class Command(BaseCommand):
+    help = "Compares the rows/sec of the ModelSerializer and the values_list() representation of the task API lists"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,1000,10000', help='Comma separated task counts')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per measure, the best one is kept')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'rows':>8} {'serializer':>12} {'serializer/s':>14} {'values/s':>12} {'speedup':>8}")
+        for size in parse_sizes(options['sizes']):
+            with rolled_back():
+                user = User.objects.create(username=f'benchmark-serializers-{size}')
+                tasks = Task.objects.bulk_create(
+                    Task(title=f'task {i}', description='benchmark', priority=i, user=user) for i in range(1, size + 1)
+                )
+                TaskStatusChange.objects.record((task.id, STATUS_CHOICES[0][0], STATUS_CHOICES[1][0]) for task in tasks)
+                for name, serializer_class, queryset in (
+                    ('task', TaskSerializer, Task.objects.filter(user=user).select_related('user').order_by('id')),
+                    ('history', TaskStatusSerializer, TaskStatusChange.objects.filter(task__user=user).order_by('id')),
+                ):
+                    slow = rows_per_second(serializer_rows, serializer_class, queryset, options['repeat'])
+                    fast = rows_per_second(values_rows, serializer_class, queryset, options['repeat'])
+                    self.stdout.write(f"{size:>8} {name:>12} {slow:>14.0f} {fast:>12.0f} {fast / slow:>7.1f}x")
@@ -0,0 +1,60 @@
+import resource
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from tasks.apiviews import TaskListAPI
+from tasks.models import Task
+
+from ._benchmark import parse_sizes, rolled_back
+
+SEED_BATCH_SIZE = 5000
+
+
+def seed_tasks(user, size):
+    for start in range(0, size, SEED_BATCH_SIZE):
+        Task.objects.bulk_create(
+            Task(title=f'task {i}', description='benchmark', priority=i, user=user) for i in range(start, min(start + SEED_BATCH_SIZE, size))
+        )
+
+
+def consume_export(export_format):
+    """
+    Streams the whole /taskapi export, returns the bytes sent, the wall time in milliseconds and the peak Python memory in KiB
+    """
+    request = RequestFactory().get('/taskapi', {'export': export_format})
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = TaskListAPI.as_view()(request)
+    sent = sum(len(chunk) for chunk in response.streaming_content)
+    ms = (time.perf_counter() - start) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return sent, ms, peak / 1024
+
+
+class Command(BaseCommand):
+    help = "Checks that the memory used by the streamed /taskapi export stays flat as the number of tasks grows"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000,1000000', help='Comma separated task counts')
+        parser.add_argument('--format', default='ndjson', choices=('json', 'ndjson'))
+        parser.add_argument('--tolerance', type=float, default=1.5, help='Allowed peak memory ratio between the largest and the smallest size')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'tasks':>8} {'MiB sent':>10} {'ms':>10} {'peak KiB':>10} {'max RSS KiB':>12}")
+        peaks = []
+        for size in parse_sizes(options['sizes']):
+            with rolled_back():
+                user = User.objects.create(username=f'benchmark-taskapi-{size}')
+                seed_tasks(user, size)
+                sent, ms, peak = consume_export(options['format'])
+            peaks.append(peak)
+            # ru_maxrss only grows, it is reported to spot a leak outside of the Python allocator
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.stdout.write(f"{size:>8} {sent / 2 ** 20:>10.1f} {ms:>10.2f} {peak:>10.0f} {rss:>12}")
+        if peaks and max(peaks) > min(peaks) * options['tolerance']:
+            raise CommandError(f"Export memory grows with the number of tasks : peaks of {min(peaks):.0f} to {max(peaks):.0f} KiB")
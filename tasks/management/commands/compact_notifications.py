@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.notifications import RETENTION_POLICIES, compact_notifications
+
+
+class Command(BaseCommand):
+    help = "Summarizes or deletes the notifications older than the retention period"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Retention in days, NOTIFICATION_RETENTION_DAYS by default')
+        parser.add_argument('--policy', choices=RETENTION_POLICIES, help='NOTIFICATION_RETENTION_POLICY by default')
+        parser.add_argument('--batch-size', type=int, help='Notifications compacted per transaction, NOTIFICATION_COMPACTION_BATCH_SIZE by default')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        deleted = compact_notifications(days=options['days'], policy=options['policy'], batch_size=options['batch_size'])
+        self.stdout.write(f'Compacted {deleted} notifications')
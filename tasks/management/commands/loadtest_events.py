@@ -0,0 +1,122 @@
+import asyncio
+import base64
+import json
+import resource
+import statistics
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.events import EVENTS_PATH
+
+from ._benchmark import login_session, percentile
+
+
+def rss_kb(pid):
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return None
+
+
+class Stream:
+    """
+    One idle event stream, recording when each event arrived
+    """
+    def __init__(self):
+        self.arrivals = []
+        self.connected = asyncio.Event()
+        self.failed = None
+
+    async def run(self, host, port, cookie):
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write((
+                f'GET {EVENTS_PATH} HTTP/1.1\r\nHost: {host}\r\nAccept: text/event-stream\r\n'
+                f'Cookie: {settings.SESSION_COOKIE_NAME}={cookie}\r\n\r\n'
+            ).encode())
+            status = await reader.readline()
+            if b' 200 ' not in status:
+                raise ConnectionError(status.decode().strip())
+            self.connected.set()
+            while True:
+                data = await reader.read(4096)
+                if not data:
+                    raise ConnectionError('closed')
+                self.arrivals += [time.perf_counter()] * data.count(b'event: ')
+        except (OSError, ConnectionError) as error:
+            self.failed = error
+            self.connected.set()
+
+
+class Command(BaseCommand):
+    help = "Holds many idle task event streams open against a running ASGI server and measures the delivery of events"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the ASGI server')
+        parser.add_argument('--connections', type=int, default=1000, help='Streams held open')
+        parser.add_argument('--writes', type=int, default=10, help='Tasks created through the API once every stream is open')
+        parser.add_argument('--username', default='loadtest')
+        parser.add_argument('--password', default='loadtest-password')
+        parser.add_argument('--pid', type=int, help='Process id of the server, to report its memory per stream')
+        parser.add_argument('--timeout', type=float, default=10, help='Seconds to wait for the streams and the events')
+
+    def handle(self, *args, **options):
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < options['connections'] + 100:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, options['connections'] + 100), hard))
+        asyncio.run(self.load(options, login_session(options['username'], options['password'])))
+
+    def create_task(self, options, index):
+        request = urllib.request.Request(
+            options['url'].rstrip('/') + '/api/task/',
+            data=json.dumps({'title': f'load test {index}', 'description': 'load test', 'priority': 1}).encode(),
+            headers={
+                'Content-Type': 'application/json',
+                'Authorization': 'Basic ' + base64.b64encode(f"{options['username']}:{options['password']}".encode()).decode(),
+            },
+            method='POST',
+        )
+        urllib.request.urlopen(request, timeout=options['timeout']).close()
+
+    async def load(self, options, cookie):
+        url = urlsplit(options['url'])
+        host, port = url.hostname, url.port or 80
+        rss_before = rss_kb(options['pid']) if options['pid'] else None
+
+        start = time.perf_counter()
+        streams = [Stream() for _ in range(options['connections'])]
+        tasks = [asyncio.ensure_future(stream.run(host, port, cookie)) for stream in streams]
+        await asyncio.wait([asyncio.ensure_future(stream.connected.wait()) for stream in streams], timeout=options['timeout'])
+        connected = [stream for stream in streams if stream.connected.is_set() and stream.failed is None]
+        if not connected:
+            raise CommandError('No stream could be opened')
+        self.stdout.write(f'{len(connected)} streams open in {time.perf_counter() - start:.2f}s, {len(streams) - len(connected)} failed or timed out')
+        if connected and options['pid']:
+            rss_after = rss_kb(options['pid'])
+            self.stdout.write(f'Server memory {rss_before} kB -> {rss_after} kB, {(rss_after - rss_before) / len(connected):.1f} kB per stream')
+
+        loop = asyncio.get_event_loop()
+        for index in range(options['writes']):
+            # Streams get a `tasks` event per write : wait for all of them before the next one so events are not coalesced
+            received = [len(stream.arrivals) for stream in connected]
+            sent = time.perf_counter()
+            await loop.run_in_executor(None, self.create_task, options, index)
+            written = (time.perf_counter() - sent) * 1000
+            deadline = sent + options['timeout']
+            while time.perf_counter() < deadline and any(len(stream.arrivals) == count for stream, count in zip(connected, received)):
+                await asyncio.sleep(0.01)
+            latencies = sorted((stream.arrivals[count] - sent) * 1000 for stream, count in zip(connected, received) if len(stream.arrivals) > count)
+            if not latencies:
+                self.stdout.write(f'write {index} ({written:.0f}ms): no stream got the event')
+                continue
+            self.stdout.write(
+                f'write {index} ({written:.0f}ms, Basic auth included): {len(latencies)}/{len(connected)} streams got the event, '
+                f'p50 {statistics.median(latencies):.1f}ms p99 {percentile(latencies, 0.99):.1f}ms'
+            )
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,138 @@
+import asyncio
+import resource
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.models import Task, TaskStats
+
+from ._benchmark import login_session, parse_sizes, percentile
+
+
+async def read_response(reader):
+    """
+    Reads one HTTP/1.1 response, returns (status, whether the server keeps the connection open)
+    """
+    status = await reader.readline()
+    if not status:
+        raise ConnectionError('closed')
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip().lower()
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if not size:
+                break
+    else:
+        await reader.read()
+        return int(status.split()[1]), False
+    return int(status.split()[1]), headers.get('connection') != 'close'
+
+
+class Client:
+    """
+    One client sending GET requests one after the other until `deadline`, over a kept-alive connection when the
+    server allows it
+    """
+    def __init__(self, url, cookie):
+        split = urlsplit(url)
+        self.host, self.port = split.hostname, split.port or 80
+        self.request = (
+            f'GET {split.path}{"?" + split.query if split.query else ""} HTTP/1.1\r\nHost: {split.netloc}\r\n'
+            f'Accept: application/json\r\nCookie: {settings.SESSION_COOKIE_NAME}={cookie}\r\n\r\n'
+        ).encode()
+        self.latencies = []
+        self.errors = 0
+
+    async def run(self, deadline, timeout):
+        reader = writer = None
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), timeout)
+                writer.write(self.request)
+                status, keep_alive = await asyncio.wait_for(read_response(reader), timeout)
+            except (OSError, ConnectionError, ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                self.errors += 1
+                status, keep_alive = None, False
+            else:
+                if status == 200:
+                    self.latencies.append((time.perf_counter() - start) * 1000)
+                else:
+                    self.errors += 1
+            if not keep_alive and writer is not None:
+                writer.close()
+                reader = writer = None
+        if writer is not None:
+            writer.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the throughput and the latency of task reads against running servers, "
+        "to compare the sync WSGI views with the async ones served under ASGI"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target', action='append', required=True, metavar='NAME=URL',
+            help='Server and endpoint to load, e.g. wsgi=http://127.0.0.1:8001/api/task/ asgi=http://127.0.0.1:8000/api/async/task/',
+        )
+        parser.add_argument('--clients', default='100,1000', help='Comma separated numbers of concurrent clients')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds each run lasts')
+        parser.add_argument('--tasks', type=int, default=100, help='Tasks the load test user has, created if missing')
+        parser.add_argument('--username', default='loadtest')
+        parser.add_argument('--password', default='loadtest-password')
+        parser.add_argument('--timeout', type=float, default=30, help='Seconds before a request counts as an error')
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['target']:
+            name, _, url = target.partition('=')
+            if not url:
+                raise CommandError(f'Expected NAME=URL, got {target}')
+            targets.append((name, url))
+        clients = parse_sizes(options['clients'])
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < max(clients) + 100:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(clients) + 100), hard))
+        cookie = login_session(options['username'], options['password'])
+        self.seed(User.objects.get(username=options['username']), options['tasks'])
+
+        self.stdout.write(f"{'target':>10} {'clients':>8} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for count in clients:
+            for name, url in targets:
+                latencies, errors, elapsed = asyncio.run(self.load(url, cookie, count, options))
+                throughput = len(latencies) / elapsed
+                p50 = statistics.median(latencies) if latencies else float('nan')
+                p99 = percentile(latencies, 0.99) if latencies else float('nan')
+                self.stdout.write(f"{name:>10} {count:>8} {len(latencies):>9} {throughput:>9.1f} {p50:>9.1f} {p99:>9.1f} {errors:>7}")
+
+    def seed(self, user, size):
+        missing = size - Task.objects.filter(user=user, deleted=False).count()
+        if missing > 0:
+            Task.objects.bulk_create(
+                Task(title=f'load test {i}', description='load test', priority=size + i, user=user) for i in range(missing)
+            )
+            TaskStats.objects.rebuild([user.id])
+
+    async def load(self, url, cookie, count, options):
+        clients = [Client(url, cookie) for _ in range(count)]
+        start = time.perf_counter()
+        # Requests in flight at the deadline are waited for, the run lasts until the last one is answered
+        await asyncio.gather(*(client.run(start + options['duration'], options['timeout']) for client in clients))
+        latencies = sorted(latency for client in clients for latency in client.latencies)
+        return latencies, sum(client.errors for client in clients), time.perf_counter() - start
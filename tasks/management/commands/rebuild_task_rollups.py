@@ -0,0 +1,27 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from tasks.models import TaskStatusRollup
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the per-user status rollups from the status history"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Users rebuilt per transaction')
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help='Only rebuild the given user ids')
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids'] or User.objects.order_by('id').values_list('id', flat=True).iterator()
+        batch = []
+        rebuilt = 0
+        for user_id in user_ids:
+            batch.append(user_id)
+            if len(batch) == options['batch_size']:
+                TaskStatusRollup.objects.rebuild(batch)
+                rebuilt += len(batch)
+                batch = []
+        if batch:
+            TaskStatusRollup.objects.rebuild(batch)
+            rebuilt += len(batch)
+        self.stdout.write(f'Rebuilt status rollups of {rebuilt} users')
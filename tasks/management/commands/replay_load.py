@@ -0,0 +1,102 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.benchmark import route_ids, seed
+from tasks.loadreplay import AsgiSender, ClientSender, HttpSender, Replay, load_stream, profile_routes, save_stream, synthetic_stream
+from tasks.models import Task
+
+from ._benchmark import login_session, throwaway_databases
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays a stream of requests from concurrent workers, in process against a seeded throwaway database or over "
+        "HTTP against a running server, and reports the throughput and the latency percentiles and errors per route. "
+        "In process the database is SQLite, which runs one write at a time : replay writes against a server on the "
+        "production database to measure their capacity."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stream', help='JSON lines file of {"method", "path", "data", "json"} requests, a random mix of the routes by default',
+        )
+        parser.add_argument('--requests', type=int, default=1000, help='Requests of the random mix')
+        parser.add_argument('--writes', action='store_true', help='Puts writes in the random mix, reads only by default')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random mix')
+        parser.add_argument('--record', help='Writes the replayed stream to this file, to replay it again or edit it')
+        parser.add_argument('--target', choices=('wsgi', 'asgi'), default='wsgi', help='Handler the requests go through in process')
+        parser.add_argument('--url', help='Base URL of a running server to replay against over HTTP, instead of in process')
+        parser.add_argument('--concurrency', type=int, default=8, help='Requests in flight at once')
+        parser.add_argument('--rate', type=float, help='Requests sent per second, as fast as the workers go by default')
+        parser.add_argument('--users', type=int, default=3, help='Users seeded in process')
+        parser.add_argument('--tasks', type=int, default=50, help='Tasks per user seeded in process')
+        parser.add_argument('--history', type=int, default=3, help='Status changes per task seeded in process')
+        parser.add_argument('--host', help='Host header sent over HTTP, one the server allows when it is not reached under it')
+        parser.add_argument('--username', default='loadtest', help='User the requests are made as over HTTP')
+        parser.add_argument('--password', default='loadtest-password')
+        parser.add_argument('--timeout', type=float, default=30, help='Seconds before a request over HTTP counts as an error')
+        parser.add_argument('--profile', type=int, default=0, metavar='N', help='Profiles the N routes of highest p95 in process')
+
+    def handle(self, *args, **options):
+        if options['stream']:
+            stream, skipped = load_stream(options['stream'])
+            if skipped:
+                self.stderr.write(f"{skipped} lines of {options['stream']} are not requests, they are skipped")
+            if not stream:
+                raise CommandError(f"No request in {options['stream']} : each line is a JSON object with a method and a path")
+        else:
+            stream = synthetic_stream(options['requests'], options['writes'], options['seed'])
+        if options['record']:
+            save_stream(stream, options['record'])
+        if options['url'] and options['profile']:
+            raise CommandError('Profiles are taken in process, --profile goes without --url')
+
+        if options['url']:
+            replay = self.replay_http(stream, options)
+        else:
+            with throwaway_databases(on_disk=True):
+                user, ids = seed(options['users'], options['tasks'], options['history'])
+                if options['target'] == 'asgi':
+                    replay = Replay(stream, options['concurrency'], options['rate']).run_async(AsgiSender(user, ids))
+                else:
+                    replay = Replay(stream, options['concurrency'], options['rate']).run(ClientSender(user, ids))
+                summary = self.report(replay)
+                if options['profile']:
+                    self.profile(stream, summary, user, ids, options['profile'])
+            return
+        self.report(replay)
+
+    def replay_http(self, stream, options):
+        session_key = login_session(options['username'], options['password'])
+        user = User.objects.get(username=options['username'])
+        if not Task.objects.filter(user=user, deleted=False, completed=False).exists():
+            Task.objects.create(title='load replay', description='load replay', user=user)
+        sender = HttpSender(options['url'], session_key, route_ids(user), options['timeout'], options['host'])
+        return Replay(stream, options['concurrency'], options['rate']).run(sender)
+
+    def report(self, replay):
+        summary = replay.summary()
+        self.stdout.write(f"{'route':<34} {'requests':>8} {'4xx':>5} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for name, route in summary.items():
+            self.stdout.write(
+                f"{name:<34} {route['requests']:>8} {route['4xx']:>5} {route['errors']:>6} "
+                f"{route['p50_ms']:>9.2f} {route['p95_ms']:>9.2f} {route['p99_ms']:>9.2f}"
+            )
+        requests = max(len(replay.results), 1)
+        self.stdout.write(
+            f"{len(replay.results)} requests in {replay.elapsed:.2f} s : {replay.throughput():.1f} req/s, "
+            f"{sum(route['errors'] for route in summary.values()) / requests:.1%} errors, "
+            f"{sum(route['4xx'] for route in summary.values()) / requests:.1%} 4xx"
+        )
+        for failure in replay.failures[:5]:
+            self.stderr.write(failure)
+        return summary
+
+    def profile(self, stream, summary, user, ids, count):
+        slowest = sorted(summary, key=lambda name: summary[name]['p95_ms'], reverse=True)[:count]
+        routes = {}
+        for route in stream:
+            if route.name in slowest:
+                routes.setdefault(route.name, route)
+        for name, report in profile_routes([routes[name] for name in slowest], user, ids).items():
+            self.stdout.write(f'\nProfile of {name}\n{report}')
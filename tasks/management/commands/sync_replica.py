@@ -0,0 +1,41 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def copy_database(source, target):
+    """
+    Copies the SQLite database of the `source` connection over the one of `target`, a page at a time through the
+    backup API of the driver : a consistent snapshot, taken while the source is written to
+    """
+    source.ensure_connection()
+    target.ensure_connection()
+    source.connection.backup(target.connection)
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies the primary SQLite database to the SQLite replica of SQLITE_REPLICA_NAME, standing in for replication "
+        "to try the replica reads locally. Run it once before serving, the replica has no tables until then. With "
+        "--interval it copies again every that many seconds, the replica lags behind by up to as much."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='Seconds between copies, a single copy by default')
+
+    def handle(self, *args, **options):
+        alias = getattr(settings, 'DATABASE_REPLICA', None)
+        if alias is None:
+            raise CommandError('No replica : SQLITE_REPLICA_NAME names the file of the SQLite replica')
+        primary, replica = connections[DEFAULT_DB_ALIAS], connections[alias]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError('Only SQLite databases are copied, the server of a Postgres replica keeps it in sync')
+        while True:
+            start = time.perf_counter()
+            copy_database(primary, replica)
+            self.stdout.write(f"Copied {primary.settings_dict['NAME']} to {replica.settings_dict['NAME']} in {time.perf_counter() - start:.2f} s")
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from tasks.apiviews import TaskViewSet
+from tasks.cache import cache_metrics
+from tasks.views import GenericAllTaskView, GenericTaskCompleteListView, GenericTaskView
+
+CACHED_READS = [view.cache_name for view in (GenericTaskView, GenericAllTaskView, GenericTaskCompleteListView, TaskViewSet)] + ['task-stats']
+
+
+class Command(BaseCommand):
+    help = "Shows the hits and misses of the cached task lists"
+
+    def handle(self, *args, **options):
+        for name, metrics in cache_metrics(CACHED_READS).items():
+            total = metrics['hits'] + metrics['misses']
+            ratio = metrics['hits'] / total if total else 0
+            self.stdout.write(f"{name:<16} hits {metrics['hits']:>8}  misses {metrics['misses']:>8}  hit ratio {ratio:.1%}")
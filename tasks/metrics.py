@@ -0,0 +1,281 @@
+import bisect
+import heapq
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.urls import URLResolver, get_resolver
+from django.utils.crypto import constant_time_compare
+
+from .cache import CACHE_HIT, CACHE_MISS, add_to_counter, request_cache_outcomes, task_cache, task_cache_shared
+
+logger = logging.getLogger('tasks.requests')
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Route of the requests no URL pattern matched
+UNMATCHED_ROUTE = 'unmatched'
+STATUS_CLASSES = ('1xx', '2xx', '3xx', '4xx', '5xx')
+
+# name : (help, upper bounds of the buckets, unit of the sum kept in the cache, which only adds integers)
+HISTOGRAMS = {
+    'tasks_request_duration_seconds': ('Wall time of the requests', (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10), 1e-6),
+    'tasks_request_sql_seconds': ('Time spent running SQL per request', (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5), 1e-6),
+    'tasks_request_queries': ('SQL queries per request', (0, 1, 2, 3, 5, 10, 20, 50, 100), 1),
+    'tasks_response_size_bytes': ('Size of the responses, streamed ones left out', (256, 1024, 4096, 16384, 65536, 262144, 1048576), 1),
+}
+# name : (help, label, label values)
+COUNTERS = {
+    'tasks_requests_total': ('Requests answered, per status class', 'status', STATUS_CLASSES),
+    'tasks_request_cache_reads_total': ('Cached reads made by the requests, per outcome', 'outcome', (CACHE_HIT, CACHE_MISS)),
+}
+
+# Measures of the request being served, read by the query wrapper of every connection
+current_request = ContextVar('current_request', default=None)
+
+
+def slow_request_seconds():
+    return getattr(settings, 'REQUEST_SLOW_SECONDS', 1.0)
+
+
+class RequestMetrics:
+    """
+    Measures of one request, filled by the query wrapper and the cached reads while it runs. Only the slowest
+    statements are kept, for the slow request log.
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.duration = None
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.cache_outcomes = []
+        self.statements = []
+        self.statement_limit = getattr(settings, 'REQUEST_SLOW_STATEMENTS', 10) if slow_request_seconds() is not None else 0
+        self.tokens = None
+
+    def begin(self):
+        self.tokens = current_request.set(self), request_cache_outcomes.set(self.cache_outcomes)
+        return self
+
+    def end(self):
+        self.duration = time.perf_counter() - self.start
+        current_request.reset(self.tokens[0])
+        request_cache_outcomes.reset(self.tokens[1])
+
+    def add_query(self, sql, seconds):
+        self.queries += 1
+        self.sql_seconds += seconds
+        if not self.statement_limit:
+            return
+        # A min-heap of (seconds, position, sql) : the fastest of the kept statements is the one pushed out
+        if len(self.statements) < self.statement_limit:
+            heapq.heappush(self.statements, (seconds, self.queries, sql))
+        else:
+            heapq.heappushpop(self.statements, (seconds, self.queries, sql))
+
+    def slowest_statements(self):
+        return [(seconds, sql) for seconds, _, sql in sorted(self.statements, reverse=True)]
+
+
+def measure_query(execute, sql, params, many, context):
+    """
+    Execute wrapper installed on every connection : times the queries made on behalf of a measured request,
+    in whichever thread they run
+    """
+    metrics = current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(sql, time.perf_counter() - start)
+
+
+def match_label(match):
+    """
+    Route a request is counted under : the name of the URL pattern it matched, else the pattern itself
+    """
+    if match is None:
+        return UNMATCHED_ROUTE
+    return match.url_name or match.route
+
+
+def route_label(request):
+    return match_label(getattr(request, 'resolver_match', None))
+
+
+def series_key(name, route, part):
+    return f'tasks:requests:{name}:{route}:{part}'
+
+
+class RequestMetricsStore:
+    """
+    Observations of this process not yet added to the counters shared in the task cache. They are added every
+    REQUEST_METRICS_FLUSH_SECONDS rather than per request, a flush costs one cache write per series that changed.
+    A timer flushes them at the end of the window when no later request does : those of a process gone quiet are
+    published too.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = defaultdict(int)
+        self.flushed_at = time.monotonic()
+        self.timer = None
+
+    def observe(self, route, metrics, status_code, size):
+        """
+        Counts a finished request, returns whether a flush is due
+        """
+        observations = (
+            ('tasks_request_duration_seconds', metrics.duration),
+            ('tasks_request_sql_seconds', metrics.sql_seconds),
+            ('tasks_request_queries', metrics.queries),
+            ('tasks_response_size_bytes', size),
+        )
+        with self.lock:
+            for name, value in observations:
+                if value is None:
+                    continue
+                _, bounds, unit = HISTOGRAMS[name]
+                self.pending[series_key(name, route, bisect.bisect_left(bounds, value))] += 1
+                self.pending[series_key(name, route, 'sum')] += round(value / unit)
+            self.pending[series_key('tasks_requests_total', route, f'{status_code // 100}xx')] += 1
+            for outcome in metrics.cache_outcomes:
+                self.pending[series_key('tasks_request_cache_reads_total', route, outcome)] += 1
+            remaining = getattr(settings, 'REQUEST_METRICS_FLUSH_SECONDS', 10) - (time.monotonic() - self.flushed_at)
+            if remaining > 0 and self.timer is None:
+                self.timer = threading.Timer(remaining, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+            return remaining <= 0
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, defaultdict(int)
+            self.flushed_at = time.monotonic()
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        for key, delta in pending.items():
+            add_to_counter(key, delta)
+
+
+store = RequestMetricsStore()
+
+
+def server_timing(metrics):
+    """
+    Server-Timing header value of a measured request, shown next to the request in the browser tools
+    """
+    timings = [
+        f'total;dur={metrics.duration * 1000:.1f}',
+        f'db;dur={metrics.sql_seconds * 1000:.1f};desc="{metrics.queries} queries"',
+    ]
+    if metrics.cache_outcomes:
+        hits = metrics.cache_outcomes.count(CACHE_HIT)
+        timings.append(f'cache;desc="{hits} hits, {len(metrics.cache_outcomes) - hits} misses"')
+    return ', '.join(timings)
+
+
+def log_slow_request(request, route, metrics):
+    threshold = slow_request_seconds()
+    if threshold is None or metrics.duration < threshold:
+        return
+    logger.warning(
+        'Slow request %s %s (%s) : %.1f ms, %d queries in %.1f ms%s',
+        request.method, request.get_full_path(), route, metrics.duration * 1000, metrics.queries, metrics.sql_seconds * 1000,
+        ''.join(f'\n  {seconds * 1000:.1f} ms : {sql}' for seconds, sql in metrics.slowest_statements()),
+    )
+
+
+def finish_request(request, response, metrics):
+    """
+    Reports a measured request : Server-Timing header, slow request log and per route counters. Returns whether
+    the store is due for a flush.
+    """
+    route = route_label(request)
+    if getattr(settings, 'REQUEST_SERVER_TIMING', True):
+        response['Server-Timing'] = server_timing(metrics)
+    log_slow_request(request, route, metrics)
+    # The length of a streamed response is only known once it is sent, after the request is measured
+    size = None if response.streaming else len(response.content)
+    return store.observe(route, metrics, response.status_code, size)
+
+
+def known_routes(exclude_namespaces=()):
+    """
+    Labels of every route of the URLconf, the ones requests can be counted under, less the routes included under
+    `exclude_namespaces`
+    """
+    routes = [UNMATCHED_ROUTE]
+
+    def walk(patterns, prefix):
+        for pattern in patterns:
+            route = str(pattern.pattern)
+            # Joined the way ResolverMatch.route joins them
+            if prefix and route.startswith('^'):
+                route = route[1:]
+            if isinstance(pattern, URLResolver):
+                if pattern.namespace not in exclude_namespaces:
+                    walk(pattern.url_patterns, prefix + route)
+            else:
+                routes.append(pattern.name or prefix + route)
+
+    walk(get_resolver().url_patterns, '')
+    return list(dict.fromkeys(routes))
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    return repr(round(value, 6)) if isinstance(value, float) else str(value)
+
+
+def render_metrics():
+    """
+    Every route's histograms and counters, shared by all processes, in the Prometheus text format. Routes that
+    served no request are left out. Without a shared cache they are those of this process only, which is said in a
+    comment.
+    """
+    routes = known_routes()
+    keys = [series_key(name, route, index) for name, (_, bounds, _) in HISTOGRAMS.items() for route in routes for index in range(len(bounds) + 1)]
+    keys += [series_key(name, route, 'sum') for name in HISTOGRAMS for route in routes]
+    keys += [series_key(name, route, value) for name, (_, _, values) in COUNTERS.items() for route in routes for value in values]
+    values = task_cache().get_many(keys)
+
+    lines = [] if task_cache_shared() else ['# Counters of the process serving this scrape only : TASK_CACHE_SHARED is off']
+    for name, (help_text, bounds, unit) in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for route in routes:
+            counts = [values.get(series_key(name, route, index), 0) for index in range(len(bounds) + 1)]
+            if not any(counts):
+                continue
+            label = f'route="{escape_label(route)}"'
+            total = 0
+            for bound, count in zip(bounds + ('+Inf',), counts):
+                total += count
+                lines.append(f'{name}_bucket{{{label},le="{bound}"}} {total}')
+            lines.append(f'{name}_sum{{{label}}} {format_value(values.get(series_key(name, route, "sum"), 0) * unit)}')
+            lines.append(f'{name}_count{{{label}}} {total}')
+    for name, (help_text, label_name, label_values) in COUNTERS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for route in routes:
+            for value in label_values:
+                count = values.get(series_key(name, route, value), 0)
+                if count:
+                    lines.append(f'{name}{{route="{escape_label(route)}",{label_name}="{value}"}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def scrape_allowed(request):
+    """
+    /metrics is served to a scraper sending the METRICS_TOKEN bearer token, or without a token set to staff users
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        return constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}')
+    return request.user.is_staff
@@ -1,10 +1,39 @@
+import asyncio
 from datetime import datetime
 
-class CustomMiddleware(object):
-    def __init__(self, get_response):
-        self.get_response = get_response
+from asgiref.sync import sync_to_async
+from django.utils.deprecation import MiddlewareMixin
 
+from .metrics import RequestMetrics, finish_request, store
+
+
+class CustomMiddleware(MiddlewareMixin):
+    """
+    Stamps `request.current_time` and measures the request for tasks.metrics : wall time, SQL queries and their
+    time, cached reads and response size, left in `request.metrics`. First in MIDDLEWARE, so the time of the other
+    middlewares is counted.
+    """
+    # MiddlewareMixin serves sync and async requests alike : under ASGI an async view is not pushed to a thread by it
     def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        request.current_time = datetime.now()
+        metrics = request.metrics = RequestMetrics().begin()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end()
+        if finish_request(request, response, metrics):
+            store.flush()
+        return response
+
+    async def __acall__(self, request):
         request.current_time = datetime.now()
-        response = self.get_response(request)
-        return response
\ No newline at end of file
+        metrics = request.metrics = RequestMetrics().begin()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end()
+        if finish_request(request, response, metrics):
+            await sync_to_async(store.flush)()
+        return response
@@ -0,0 +1,35 @@
+# Generated by Django 4.0.3 on 2026-10-17 15:54
+
+import datetime
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def populate_next_send_at(apps, schema_editor):
+    ReportConfig = apps.get_model('tasks', 'ReportConfig')
+    today = timezone.now().date()
+    configs = list(ReportConfig.objects.all())
+    for config in configs:
+        if config.last_sent_time is None:
+            day = today
+        else:
+            day = config.last_sent_time.astimezone(datetime.timezone.utc).date() + datetime.timedelta(days=1)
+        config.next_send_at = datetime.datetime.combine(day, config.time, tzinfo=datetime.timezone.utc)
+    ReportConfig.objects.bulk_update(configs, ['next_send_at'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0018_task_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportconfig',
+            name='next_send_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(populate_next_send_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.0.3 on 2026-10-17 15:58
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_task_stats(apps, schema_editor):
+    Task = apps.get_model('tasks', 'Task')
+    TaskStats = apps.get_model('tasks', 'TaskStats')
+    counts = Task.objects.filter(deleted=False).exclude(user=None).order_by().values_list('user_id').annotate(
+        total=models.Count('id'), completed_total=models.Count('id', filter=models.Q(completed=True))
+    )
+    TaskStats.objects.bulk_create(
+        [TaskStats(user_id=user_id, all_count=total, completed_count=completed) for user_id, total, completed in counts],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('tasks', '0020_reportdelivery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('all_count', models.IntegerField(default=0)),
+                ('completed_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_task_stats, migrations.RunPython.noop),
+    ]
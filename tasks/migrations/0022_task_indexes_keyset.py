@@ -0,0 +1,37 @@
+# Generated by Django 4.0.3 on 2026-10-17 17:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0021_taskstats'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_user_pending_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_user_completed_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_user_live_idx',
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('completed', False), ('deleted', False)), fields=['user', 'priority', 'id'], name='task_user_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('completed', True), ('deleted', False)), fields=['user', 'priority', 'id'], name='task_user_completed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['user', 'completed', 'priority', 'id'], name='task_user_live_idx'),
+        ),
+    ]
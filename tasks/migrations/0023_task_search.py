@@ -0,0 +1,91 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import tasks.models
+
+# Contentless FTS5 table : it only holds the index. The owner column holds a `u<user_id>` token so a search is
+# the intersection of the user's posting list with the terms', whatever the number of tasks of other users.
+SQLITE_FORWARDS = [
+    """
+    CREATE VIRTUAL TABLE tasks_task_fts USING fts5(
+        title, description, owner, content='', prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    # Title matches weigh more than description matches, the owner column only restricts the search to a user
+    "INSERT INTO tasks_task_fts(tasks_task_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0, 0.0)')",
+    """
+    CREATE TRIGGER tasks_task_fts_insert AFTER INSERT ON tasks_task BEGIN
+        INSERT INTO tasks_task_fts(rowid, title, description, owner)
+        VALUES (new.id, new.title, new.description, 'u' || coalesce(new.user_id, 0));
+    END
+    """,
+    """
+    CREATE TRIGGER tasks_task_fts_delete AFTER DELETE ON tasks_task BEGIN
+        INSERT INTO tasks_task_fts(tasks_task_fts, rowid, title, description, owner)
+        VALUES ('delete', old.id, old.title, old.description, 'u' || coalesce(old.user_id, 0));
+    END
+    """,
+    """
+    CREATE TRIGGER tasks_task_fts_update AFTER UPDATE OF title, description, user_id ON tasks_task BEGIN
+        INSERT INTO tasks_task_fts(tasks_task_fts, rowid, title, description, owner)
+        VALUES ('delete', old.id, old.title, old.description, 'u' || coalesce(old.user_id, 0));
+        INSERT INTO tasks_task_fts(rowid, title, description, owner)
+        VALUES (new.id, new.title, new.description, 'u' || coalesce(new.user_id, 0));
+    END
+    """,
+    """
+    INSERT INTO tasks_task_fts(rowid, title, description, owner)
+    SELECT id, title, description, 'u' || coalesce(user_id, 0) FROM tasks_task
+    """,
+]
+
+SQLITE_BACKWARDS = [
+    "DROP TRIGGER IF EXISTS tasks_task_fts_update",
+    "DROP TRIGGER IF EXISTS tasks_task_fts_delete",
+    "DROP TRIGGER IF EXISTS tasks_task_fts_insert",
+    "DROP TABLE IF EXISTS tasks_task_fts",
+]
+
+# The expression must stay identical to the one tasks.search queries for the index to be used
+POSTGRESQL_FORWARDS = [
+    """
+    CREATE INDEX task_search_idx ON tasks_task
+    USING gin (to_tsvector('simple', title || ' ' || description))
+    """,
+]
+
+POSTGRESQL_BACKWARDS = [
+    "DROP INDEX IF EXISTS task_search_idx",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0022_task_indexes_keyset'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskSearchIndex',
+            fields=[
+                ('task', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='tasks.task')),
+                ('document', tasks.models.SearchDocumentField(db_column='tasks_task_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'tasks_task_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(
+            run({'sqlite': SQLITE_FORWARDS, 'postgresql': POSTGRESQL_FORWARDS}),
+            run({'sqlite': SQLITE_BACKWARDS, 'postgresql': POSTGRESQL_BACKWARDS}),
+        ),
+    ]
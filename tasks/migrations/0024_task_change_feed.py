@@ -0,0 +1,65 @@
+# Generated by Django 4.0.3 on 2026-10-17 17:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Adding a column makes SQLite rebuild tasks_task, which drops the triggers keeping the search index of
+# 0023_task_search in sync : they are created again after the rebuild, in both directions.
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_task_fts_insert AFTER INSERT ON tasks_task BEGIN
+        INSERT INTO tasks_task_fts(rowid, title, description, owner)
+        VALUES (new.id, new.title, new.description, 'u' || coalesce(new.user_id, 0));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_task_fts_delete AFTER DELETE ON tasks_task BEGIN
+        INSERT INTO tasks_task_fts(tasks_task_fts, rowid, title, description, owner)
+        VALUES ('delete', old.id, old.title, old.description, 'u' || coalesce(old.user_id, 0));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_task_fts_update AFTER UPDATE OF title, description, user_id ON tasks_task BEGIN
+        INSERT INTO tasks_task_fts(tasks_task_fts, rowid, title, description, owner)
+        VALUES ('delete', old.id, old.title, old.description, 'u' || coalesce(old.user_id, 0));
+        INSERT INTO tasks_task_fts(rowid, title, description, owner)
+        VALUES (new.id, new.title, new.description, 'u' || coalesce(new.user_id, 0));
+    END
+    """,
+]
+
+
+def restore_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in SQLITE_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('tasks', '0023_task_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskChangeCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('last_change', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.AddField(
+            model_name='task',
+            name='change_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['user', 'change_seq', 'id'], name='task_user_change_idx'),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.0.3 on 2026-10-17 18:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from collections import defaultdict
+from datetime import timedelta, timezone
+
+
+def populate_task_status_rollups(apps, schema_editor):
+    Task = apps.get_model('tasks', 'Task')
+    TaskStatusChange = apps.get_model('tasks', 'TaskStatusChange')
+    TaskStatusRollup = apps.get_model('tasks', 'TaskStatusRollup')
+    entered = dict(Task.objects.exclude(user=None).values_list('id', 'created_date'))
+    deltas = defaultdict(lambda: [0, 0, 0.0])
+    changes = TaskStatusChange.objects.exclude(task__user=None).order_by('task_id', 'timestamp', 'id').values_list(
+        'task_id', 'task__user_id', 'old_status', 'new_status', 'timestamp'
+    )
+    for task_id, user_id, old_status, new_status, timestamp in changes.iterator():
+        seconds = max((timestamp - entered[task_id]).total_seconds(), 0)
+        day = timestamp.astimezone(timezone.utc).date()
+        for period, start in (('day', day), ('week', day - timedelta(days=day.weekday()))):
+            deltas[(user_id, period, start, new_status)][0] += 1
+            deltas[(user_id, period, start, old_status)][1] += 1
+            deltas[(user_id, period, start, old_status)][2] += seconds
+        entered[task_id] = timestamp
+    TaskStatusRollup.objects.bulk_create(
+        [
+            TaskStatusRollup(user_id=user_id, period=period, start=start, status=status, entered=entered_count, exited=exited, seconds_in_status=seconds)
+            for (user_id, period, start, status), (entered_count, exited, seconds) in deltas.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tasks', '0025_notification_inbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskStatusRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'day'), ('week', 'week')], max_length=4)),
+                ('start', models.DateField()),
+                ('status', models.CharField(choices=[('PENDING', 'PENDING'), ('IN_PROGRESS', 'IN_PROGRESS'), ('COMPLETED', 'COMPLETED'), ('CANCELLED', 'CANCELLED')], max_length=100)),
+                ('entered', models.PositiveIntegerField(default=0)),
+                ('exited', models.PositiveIntegerField(default=0)),
+                ('seconds_in_status', models.FloatField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='taskstatuschange',
+            index=models.Index(fields=['task', 'timestamp'], name='status_change_task_time_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='taskstatusrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'period', 'start', 'status'), name='task_rollup_bucket_unique'),
+        ),
+        migrations.RunPython(populate_task_status_rollups, migrations.RunPython.noop),
+    ]
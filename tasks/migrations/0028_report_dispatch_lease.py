@@ -0,0 +1,23 @@
+# Generated by Django 4.0.3 on 2026-10-17 19:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0027_task_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportconfig',
+            name='dispatched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='reportdelivery',
+            name='day',
+            field=models.DateField(db_index=True),
+        ),
+    ]
@@ -0,0 +1,78 @@
+from django.db import migrations
+
+# Task.change_seq is stamped by the database, in the statement writing the task : the per-user counter is taken and
+# the row stamped without a round trip of their own. The update trigger lists every column but change_seq, so that
+# stamping the row does not fire it again. A migration making SQLite rebuild tasks_task drops these triggers along
+# with the search ones, it has to create them again.
+SQLITE_FORWARDS = [
+    """
+    CREATE TRIGGER tasks_task_change_insert AFTER INSERT ON tasks_task WHEN new.user_id IS NOT NULL BEGIN
+        INSERT OR IGNORE INTO tasks_taskchangecounter(user_id, last_change) VALUES (new.user_id, 0);
+        UPDATE tasks_taskchangecounter SET last_change = last_change + 1 WHERE user_id = new.user_id;
+        UPDATE tasks_task SET change_seq = (SELECT last_change FROM tasks_taskchangecounter WHERE user_id = new.user_id)
+        WHERE id = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER tasks_task_change_update
+    AFTER UPDATE OF title, description, completed, created_date, deleted, user_id, priority, status ON tasks_task
+    WHEN new.user_id IS NOT NULL BEGIN
+        INSERT OR IGNORE INTO tasks_taskchangecounter(user_id, last_change) VALUES (new.user_id, 0);
+        UPDATE tasks_taskchangecounter SET last_change = last_change + 1 WHERE user_id = new.user_id;
+        UPDATE tasks_task SET change_seq = (SELECT last_change FROM tasks_taskchangecounter WHERE user_id = new.user_id)
+        WHERE id = new.id;
+    END
+    """,
+]
+
+SQLITE_BACKWARDS = [
+    "DROP TRIGGER IF EXISTS tasks_task_change_update",
+    "DROP TRIGGER IF EXISTS tasks_task_change_insert",
+]
+
+# The upsert locks the counter of the user until the writing transaction ends
+POSTGRESQL_FORWARDS = [
+    """
+    CREATE FUNCTION tasks_task_change_seq() RETURNS trigger AS $$
+    BEGIN
+        IF NEW.user_id IS NOT NULL THEN
+            INSERT INTO tasks_taskchangecounter AS counter (user_id, last_change) VALUES (NEW.user_id, 1)
+            ON CONFLICT (user_id) DO UPDATE SET last_change = counter.last_change + 1
+            RETURNING last_change INTO NEW.change_seq;
+        END IF;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER tasks_task_change_seq
+    BEFORE INSERT OR UPDATE OF title, description, completed, created_date, deleted, user_id, priority, status ON tasks_task
+    FOR EACH ROW EXECUTE FUNCTION tasks_task_change_seq()
+    """,
+]
+
+POSTGRESQL_BACKWARDS = [
+    "DROP TRIGGER IF EXISTS tasks_task_change_seq ON tasks_task",
+    "DROP FUNCTION IF EXISTS tasks_task_change_seq()",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0028_report_dispatch_lease'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_FORWARDS, 'postgresql': POSTGRESQL_FORWARDS}),
+            run({'sqlite': SQLITE_BACKWARDS, 'postgresql': POSTGRESQL_BACKWARDS}),
+        ),
+    ]
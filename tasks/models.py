@@ -1,9 +1,14 @@
 import datetime
+from collections import defaultdict
 from sqlite3 import Timestamp
 import sys
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+from django.db.models import DEFERRED
 
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .cache import invalidate_task_caches
 
 STATUS_CHOICES = (
     ("PENDING", "PENDING"),
@@ -11,6 +16,104 @@ STATUS_CHOICES = (
     ("COMPLETED", "COMPLETED"),
     ("CANCELLED", "CANCELLED"),
 )
+# Status a task is moved to when it is completed, the changes into it are the completions of the analytics
+COMPLETED_STATUS = "COMPLETED"
+
+HISTORY_BATCH_SIZE = 500
+# Rollup buckets updated per UPDATE statement
+ROLLUP_BATCH_SIZE = 100
+
+ROLLUP_PERIODS = (
+    ("day", "day"),
+    ("week", "week"),
+)
+
+def live_counts(deleted, completed):
+    """
+    What a task counts for in TaskStats : (all, completed) tasks exclude the deleted ones
+    """
+    if deleted:
+        return 0, 0
+    return 1, int(completed)
+
+
+class TaskQuerySet(models.QuerySet):
+    def update_status(self, status):
+        """
+        Queryset counterpart of setting `status` and saving each task, the status history is recorded
+        for every task whose status actually changes. Returns the number of tasks updated.
+        """
+        updated = 0
+        with transaction.atomic():
+            changed = list(self.exclude(status=status).select_for_update().values_list('id', 'status', 'user_id'))
+            for start in range(0, len(changed), HISTORY_BATCH_SIZE):
+                batch = changed[start:start + HISTORY_BATCH_SIZE]
+                updated += Task.objects.filter(id__in=[task_id for task_id, _, _ in batch]).update(status=status)
+                TaskStatusChange.objects.record((task_id, old_status, status) for task_id, old_status, _ in batch)
+            invalidate_task_caches(user_id for _, _, user_id in changed)
+        return updated
+
+    def bulk_update_with_history(self, objs, fields, batch_size=None):
+        """
+        `bulk_update` that also records the status history and adjusts the task counters of the given tasks
+        """
+        objs = list(objs)
+        with transaction.atomic():
+            if 'status' in fields:
+                TaskStatusChange.objects.record(
+                    (task.id, task.get_old_status(), task.status) for task in objs if task.status_changed()
+                )
+            deltas = {}
+            for task in objs:
+                if task.user_id is not None:
+                    add_counts(deltas, task.user_id, task.counts_delta(fields=fields))
+            updated = self.bulk_update(objs, fields, batch_size=batch_size)
+            TaskStats.objects.adjust(deltas)
+            invalidate_task_caches(task.user_id for task in objs)
+        for task in objs:
+            task.snapshot(fields)
+        return updated
+
+    def soft_delete(self):
+        """
+        Queryset counterpart of deleting tasks from the views : flags them deleted and adjusts the task counters
+        """
+        with transaction.atomic():
+            live = self.filter(deleted=False)
+            deltas = {user_id: (-total, -completed) for user_id, total, completed in live.user_counts()}
+            updated = live.update(deleted=True)
+            TaskStats.objects.adjust(deltas)
+            invalidate_task_caches(deltas)
+        return updated
+
+    def mark_completed(self):
+        """
+        Queryset counterpart of completing tasks from the views : flags them completed, moves them to the COMPLETED
+        status with their history recorded, and adjusts the task counters
+        """
+        with transaction.atomic():
+            pending = self.filter(completed=False)
+            deltas = {user_id: (0, total) for user_id, total, _ in pending.filter(deleted=False).user_counts()}
+            changed = list(pending.exclude(status=COMPLETED_STATUS).select_for_update().values_list('id', 'status'))
+            updated = pending.update(completed=True, status=COMPLETED_STATUS)
+            TaskStatusChange.objects.record((task_id, old_status, COMPLETED_STATUS) for task_id, old_status in changed)
+            TaskStats.objects.adjust(deltas)
+            invalidate_task_caches(deltas)
+        return updated
+
+    def user_counts(self):
+        """
+        (user_id, tasks, completed tasks) for every user owning tasks of this queryset
+        """
+        return self.exclude(user=None).order_by().values_list('user_id').annotate(
+            total=models.Count('id'), completed_total=models.Count('id', filter=models.Q(completed=True))
+        )
+
+
+def add_counts(deltas, user_id, delta):
+    total, completed = deltas.get(user_id, (0, 0))
+    deltas[user_id] = (total + delta[0], completed + delta[1])
+
 
 class Task(models.Model):
     title = models.CharField(max_length=100)
@@ -21,43 +124,494 @@ class Task(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank= True)
     priority = models.PositiveIntegerField(default=1)
     status = models.CharField(max_length=100, choices= STATUS_CHOICES, default=STATUS_CHOICES[0][0])
+    # Sequence number of the last change of the task among the changes of its user, read by the change feed. The
+    # triggers of 0029_task_change_seq_triggers stamp it on every insert and update, in the statement writing the row.
+    change_seq = models.BigIntegerField(default=0)
 
-    __old_status = None
+    objects = TaskQuerySet.as_manager()
+
+    # Fields whose saved value is kept in memory, so saves can tell what changed without reading the row back
+    TRACKED_FIELDS = ('status', 'completed', 'deleted')
+
+    __old_values = None
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.__old_status = self.status
+        self.snapshot()
+
+    def snapshot(self, fields=None):
+        # Deferred fields are not in __dict__, reading them here would cost a query for every loaded row
+        if self.__old_values is None:
+            self.__old_values = {}
+        for field in self.TRACKED_FIELDS:
+            if fields is None or field in fields:
+                self.__old_values[field] = self.__dict__.get(field, DEFERRED)
+
+    def get_old_value(self, field):
+        """
+        Value of a tracked field as it was when the task was loaded or last saved
+        """
+        if self.__old_values[field] is DEFERRED:
+            self.__old_values[field] = Task.objects.filter(pk=self.pk).values_list(field, flat=True).first()
+        return self.__old_values[field]
+
+    def get_old_status(self):
+        return self.get_old_value('status')
+
+    def has_changed(self, field):
+        if self._state.adding or field not in self.__dict__:
+            return False
+        return self.get_old_value(field) != getattr(self, field)
+
+    def status_changed(self):
+        return self.has_changed('status')
 
-    # def save(self, force_insert = False, force_update = False,  *args, **kwargs):
-    #     if self.status != self.__old_status:
-    #         TaskStatusChange(old_status=self.__old_status, new_status=self.status, task=self).save()
-    #     super().save(force_insert, force_update, *args, **kwargs)
-    #     self.__old_status = self.status
+    def counts_delta(self, created=False, fields=None):
+        """
+        (all, completed) change the last save of this task makes to the TaskStats counters of its user
+        """
+        if not created and not any(self.has_changed(field) for field in ('completed', 'deleted') if fields is None or field in fields):
+            return 0, 0
+        new = live_counts(self.deleted, self.completed)
+        if created:
+            return new
+        old = live_counts(self.get_old_value('deleted'), self.get_old_value('completed'))
+        return new[0] - old[0], new[1] - old[1]
 
     def __str__(self):
         return self.title
 
+    class Meta:
+        # Boolean filters compile to `NOT deleted` / `completed` which SQLite cannot match against an index
+        # column, so the per-user listings are served by partial indexes whose condition matches the filter.
+        # They end with the id tiebreaker of the keyset pagination, so a page is a single index range scan.
+        indexes = [
+            models.Index(fields=['user', 'priority', 'id'], condition=models.Q(deleted=False, completed=False), name='task_user_pending_idx'),
+            models.Index(fields=['user', 'priority', 'id'], condition=models.Q(deleted=False, completed=True), name='task_user_completed_idx'),
+            models.Index(fields=['user', 'completed', 'priority', 'id'], condition=models.Q(deleted=False), name='task_user_live_idx'),
+            models.Index(fields=['user', 'status'], condition=models.Q(deleted=False), name='task_user_live_status_idx'),
+            models.Index(fields=['user', 'change_seq', 'id'], name='task_user_change_idx'),
+        ]
+
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class SearchDocumentField(models.TextField):
+    """
+    Hidden column named after an FTS5 table, matching it searches every column of the table
+    """
+
+SearchDocumentField.register_lookup(Match)
+
+
+class TaskSearchIndex(models.Model):
+    """
+    Row of the SQLite FTS5 table indexing the title and the description of a task, written by the triggers of
+    migration 0023. `rank` is only set for rows matched by a `document__match` filter.
+    """
+    task = models.OneToOneField(Task, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid', related_name='search_index')
+    document = SearchDocumentField(db_column='tasks_task_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'tasks_task_fts'
+
+
+class TaskStatsManager(models.Manager):
+    def adjust(self, deltas, rebuild_missing=True):
+        """
+        Applies a {user_id: (all, completed)} change to the counters, a user without counters yet gets them rebuilt.
+        A change made before the rows are written leaves them missing : a rebuild would count the rows as they were.
+        """
+        missing = []
+        for user_id, (total, completed) in deltas.items():
+            if not total and not completed:
+                continue
+            if not self.filter(user_id=user_id).update(all_count=models.F('all_count') + total, completed_count=models.F('completed_count') + completed):
+                missing.append(user_id)
+        if missing and rebuild_missing:
+            self.rebuild(missing)
+
+    def rebuild(self, user_ids):
+        """
+        Recomputes the counters of `user_ids` from the Task table. The tasks are counted in the transaction writing
+        the counters, on the primary : not on a replica lagging behind, even under `replica_reads`.
+        """
+        counts = {user_id: (0, 0) for user_id in user_ids}
+        with transaction.atomic():
+            for user_id, total, completed in Task.objects.filter(user_id__in=user_ids, deleted=False).user_counts():
+                counts[user_id] = (total, completed)
+            self.filter(user_id__in=user_ids).delete()
+            self.bulk_create(
+                [TaskStats(user_id=user_id, all_count=total, completed_count=completed) for user_id, (total, completed) in counts.items()],
+                ignore_conflicts=True,
+            )
+            invalidate_task_caches(user_ids)
+
+    def for_user(self, user):
+        stats = self.filter(user=user).first()
+        if stats is None:
+            self.rebuild([user.id])
+            # Written to the primary, a replica may not have them yet
+            stats = self.using(DEFAULT_DB_ALIAS).get(user=user)
+        return stats
+
+
+class TaskStats(models.Model):
+    """
+    Denormalized task counters of a user, maintained by every Task write path and rebuilt by `manage.py rebuild_task_stats`
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+    all_count = models.IntegerField(default=0)
+    completed_count = models.IntegerField(default=0)
+
+    objects = TaskStatsManager()
+
+    def __str__(self):
+        return f'{self.user} : {self.completed_count} of {self.all_count}'
+
+
+class TaskChangeCounter(models.Model):
+    """
+    Last change sequence number given to the tasks of a user, taken by the triggers stamping Task.change_seq. The row
+    stays locked until the writing transaction ends : the changes of a user commit in sequence order, a client having
+    read up to a number never misses a change committed later with a smaller one.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+    last_change = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.user} : {self.last_change}'
+
+
+class TaskStatusChangeManager(models.Manager):
+    def record(self, changes):
+        """
+        Writes the history rows for an iterable of (task_id, old_status, new_status) in bulk, and adds them to the rollups
+        """
+        changes = list(changes)
+        with transaction.atomic(savepoint=False):
+            # Before the rows are written : the time a task entered its old status is the time of its last change
+            TaskStatusRollup.objects.add_changes(changes, timezone.now())
+            return self.bulk_create(
+                [TaskStatusChange(task_id=task_id, old_status=old_status, new_status=new_status) for task_id, old_status, new_status in changes],
+                batch_size=HISTORY_BATCH_SIZE,
+            )
+
+
 class TaskStatusChange(models.Model):
     old_status = models.CharField(max_length=100, choices = STATUS_CHOICES)
     new_status = models.CharField(max_length=100, choices=STATUS_CHOICES)
     timestamp = models.DateTimeField(auto_now=True)
     task = models.ForeignKey(Task, on_delete=models.CASCADE)
 
+    objects = TaskStatusChangeManager()
+
+    class Meta:
+        indexes = [
+            # The history of a task in time order, and the time of its last change
+            models.Index(fields=['task', 'timestamp'], name='status_change_task_time_idx'),
+        ]
+
     def __str__(self):
         return f'Task {self.task.id} : {self.old_status} -> {self.new_status}'
 
+def bucket_starts(day):
+    """
+    (period, start) of the rollup buckets `day` falls in, weeks start on Monday
+    """
+    return (('day', day), ('week', day - datetime.timedelta(days=day.weekday())))
+
+
+def add_status_change(deltas, user_id, old_status, new_status, entered_at, changed_at):
+    """
+    Adds a status change to {(user_id, period, start, status): [entered, exited, seconds]} rollup deltas : the new
+    status is entered, the old one is left after the time since `entered_at`
+    """
+    seconds = max((changed_at - entered_at).total_seconds(), 0)
+    for period, start in bucket_starts(changed_at.astimezone(datetime.timezone.utc).date()):
+        deltas[(user_id, period, start, new_status)][0] += 1
+        exited = deltas[(user_id, period, start, old_status)]
+        exited[1] += 1
+        exited[2] += seconds
+
+
+def rollup_deltas():
+    return defaultdict(lambda: [0, 0, 0.0])
+
+
+class TaskStatusRollupManager(models.Manager):
+    def add_changes(self, changes, now):
+        """
+        Adds the (task_id, old_status, new_status) changes made at `now` to the rollups of the users of the tasks
+        """
+        if not changes:
+            return
+        tasks = Task.objects.filter(id__in=[task_id for task_id, _, _ in changes]).order_by().annotate(
+            entered_at=models.Max('taskstatuschange__timestamp')
+        ).values_list('id', 'user_id', 'created_date', 'entered_at')
+        entered = {task_id: (user_id, entered_at or created_date) for task_id, user_id, created_date, entered_at in tasks}
+        deltas = rollup_deltas()
+        for task_id, old_status, new_status in changes:
+            user_id, entered_at = entered.get(task_id, (None, None))
+            if user_id is not None:
+                add_status_change(deltas, user_id, old_status, new_status, entered_at, now)
+        keys = list(deltas)
+        for start in range(0, len(keys), ROLLUP_BATCH_SIZE):
+            self.add({key: deltas[key] for key in keys[start:start + ROLLUP_BATCH_SIZE]})
+
+    def bucket_ids(self, keys):
+        rows = self.filter(
+            user_id__in={key[0] for key in keys}, start__in={key[2] for key in keys}, status__in={key[3] for key in keys}
+        ).values_list('id', 'user_id', 'period', 'start', 'status')
+        return {(user_id, period, start, status): rollup_id for rollup_id, user_id, period, start, status in rows if (user_id, period, start, status) in keys}
+
+    def add(self, deltas):
+        """
+        Adds {(user_id, period, start, status): (entered, exited, seconds)} to the rollups in one UPDATE, the missing
+        buckets are created first
+        """
+        with transaction.atomic(savepoint=False):
+            ids = self.bucket_ids(deltas)
+            if len(ids) < len(deltas):
+                self.bulk_create([
+                    TaskStatusRollup(user_id=user_id, period=period, start=start, status=status)
+                    for user_id, period, start, status in deltas.keys() - ids.keys()
+                ], ignore_conflicts=True)
+                ids = self.bucket_ids(deltas)
+
+            def increment(field, index, output_field):
+                whens = [models.When(id=ids[key], then=models.Value(delta[index])) for key, delta in deltas.items() if delta[index]]
+                return models.F(field) + models.Case(*whens, default=models.Value(0), output_field=output_field)
+
+            self.filter(id__in=ids.values()).update(
+                entered=increment('entered', 0, models.IntegerField()),
+                exited=increment('exited', 1, models.IntegerField()),
+                seconds_in_status=increment('seconds_in_status', 2, models.FloatField()),
+            )
+
+    def rebuild(self, user_ids):
+        """
+        Recomputes the rollups of `user_ids` from the status history, the archived one included : archiving a task
+        keeps its changes in the rollups
+        """
+        with transaction.atomic():
+            self.filter(user_id__in=user_ids).delete()
+            entered = dict(Task.objects.filter(user_id__in=user_ids).values_list('id', 'created_date'))
+            entered.update(ArchivedTask.objects.filter(user_id__in=user_ids).values_list('id', 'created_date'))
+            deltas = rollup_deltas()
+            # A task is either live or archived, its history is all in one of the tables
+            for history in (TaskStatusChange, ArchivedTaskStatusChange):
+                changes = history.objects.filter(task__user_id__in=user_ids).order_by('task_id', 'timestamp', 'id').values_list(
+                    'task_id', 'task__user_id', 'old_status', 'new_status', 'timestamp'
+                )
+                for task_id, user_id, old_status, new_status, timestamp in changes.iterator():
+                    add_status_change(deltas, user_id, old_status, new_status, entered[task_id], timestamp)
+                    entered[task_id] = timestamp
+            self.bulk_create([
+                TaskStatusRollup(user_id=user_id, period=period, start=start, status=status, entered=entered_count, exited=exited, seconds_in_status=seconds)
+                for (user_id, period, start, status), (entered_count, exited, seconds) in deltas.items()
+            ], batch_size=HISTORY_BATCH_SIZE)
+
+
+class TaskStatusRollup(models.Model):
+    """
+    Status changes of the tasks of a user over a day or a week, per status : the changes into the status, the changes
+    out of it and the seconds spent in it before them. Maintained by `TaskStatusChange.objects.record` and rebuilt by
+    `manage.py rebuild_task_rollups`, analytics read them instead of the history.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    period = models.CharField(max_length=4, choices=ROLLUP_PERIODS)
+    start = models.DateField()
+    status = models.CharField(max_length=100, choices=STATUS_CHOICES)
+    entered = models.PositiveIntegerField(default=0)
+    exited = models.PositiveIntegerField(default=0)
+    seconds_in_status = models.FloatField(default=0)
+
+    objects = TaskStatusRollupManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'period', 'start', 'status'], name='task_rollup_bucket_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} : {self.status} in the {self.period} of {self.start}'
+
+
+class ArchivedTask(models.Model):
+    """
+    Deleted or completed task moved out of the Task table by `manage.py archive_tasks`, with the id it had there :
+    ids are never reused, the detail page and the history endpoints read through to the archive with the same id.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=100)
+    description = models.TextField()
+    completed = models.BooleanField(default=False)
+    created_date = models.DateTimeField()
+    deleted = models.BooleanField(default=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank= True)
+    priority = models.PositiveIntegerField(default=1)
+    status = models.CharField(max_length=100, choices= STATUS_CHOICES, default=STATUS_CHOICES[0][0])
+    change_seq = models.BigIntegerField(default=0)
+    archived_at = models.DateTimeField()
+
+    def __str__(self):
+        return self.title
+
+
+class ArchivedTaskStatusChange(models.Model):
+    """
+    Status history of an archived task, moved with it and keeping its ids
+    """
+    id = models.BigIntegerField(primary_key=True)
+    old_status = models.CharField(max_length=100, choices = STATUS_CHOICES)
+    new_status = models.CharField(max_length=100, choices=STATUS_CHOICES)
+    timestamp = models.DateTimeField()
+    task = models.ForeignKey(ArchivedTask, on_delete=models.CASCADE)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['task', 'timestamp'], name='archived_change_task_time_idx'),
+        ]
+
+    def __str__(self):
+        return f'Task {self.task_id} : {self.old_status} -> {self.new_status}'
+
+
 class ReportConfig(models.Model):
     time = models.TimeField(default=datetime.time(22, 00))
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True)
     last_sent_time = models.DateTimeField(null=True, blank=True)
+    next_send_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    # When a shard covering the config was last queued, until the report is sent and the config rescheduled
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+
+    def compute_next_send_at(self):
+        """
+        Reports go out daily at `time` (UTC) : the first one is due today, the next ones the day after the last sent report
+        """
+        if self.last_sent_time is None:
+            day = timezone.now().date()
+        else:
+            day = self.last_sent_time.astimezone(datetime.timezone.utc).date() + datetime.timedelta(days=1)
+        return datetime.datetime.combine(day, self.time, tzinfo=datetime.timezone.utc)
+
+    def save(self, *args, **kwargs):
+        self.next_send_at = self.compute_next_send_at()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'next_send_at'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f'{self.user} : {self.time}'
 
 
+class ReportDelivery(models.Model):
+    """
+    Idempotency record of the report of a user for a day. A worker claims the delivery before sending the
+    report and marks it sent afterwards, so retried or concurrent shards never send the same report twice.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    day = models.DateField(db_index=True)
+    claim_token = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='report_delivery_user_day_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} : {self.day}'
+
+
 class Notification(models.Model):
     timestamp = models.DateTimeField(auto_now=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
     content = models.CharField(max_length=1024)
+    # Notifications this one stands for, more than one once older ones were compacted into it
+    count = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            # The inbox of a user is paged by id, newest first
+            models.Index(fields=['user', 'id'], name='notification_user_id_idx'),
+            # Retention looks the old notifications up by time
+            models.Index(fields=['timestamp', 'id'], name='notification_time_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} at {self.timestamp}'
+
+
+class NotificationReadStateManager(models.Manager):
+    def for_user(self, user):
+        """
+        Read state of `user`, an unsaved one with nothing read when the user never read a notification
+        """
+        return self.filter(user=user).first() or NotificationReadState(user=user)
+
+    def locked(self, user):
+        """
+        Read state of `user`, created if missing and locked until the transaction of the caller ends
+        """
+        self.get_or_create(user=user)
+        return self.select_for_update().get(user=user)
+
+
+class NotificationReadState(models.Model):
+    """
+    Notifications read by a user : every one up to `read_through` and the ones of `read_ids` above it. Reading the
+    notifications in order only moves the watermark, the list holds the ones read out of order.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+    read_through = models.BigIntegerField(default=0)
+    read_ids = models.JSONField(default=list)
+
+    objects = NotificationReadStateManager()
+
+    def is_read(self, notification_id):
+        return notification_id <= self.read_through or notification_id in self.read_ids
+
+    def unread(self, notifications):
+        return notifications.filter(id__gt=self.read_through).exclude(id__in=self.read_ids)
+
+    def mark_read(self, notification_ids):
+        self.read_ids = sorted(set(self.read_ids) | {notification_id for notification_id in notification_ids if notification_id > self.read_through})
+        self.compact()
+        self.save()
+
+    def mark_read_through(self, notification_id):
+        self.read_through = max(self.read_through, notification_id)
+        self.compact()
+        self.save()
+
+    def compact(self):
+        """
+        Moves the watermark past the notifications read in order, and drops the read ids below it or of deleted notifications
+        """
+        read = {notification_id for notification_id in self.read_ids if notification_id > self.read_through}
+        if not read:
+            self.read_ids = []
+            return
+        remaining = list(
+            Notification.objects.filter(user_id=self.user_id, id__gt=self.read_through, id__lte=max(read)).order_by('id').values_list('id', flat=True)
+        )
+        for notification_id in remaining:
+            if notification_id not in read:
+                break
+            self.read_through = notification_id
+        else:
+            self.read_through = max(read)
+        self.read_ids = sorted(notification_id for notification_id in read.intersection(remaining) if notification_id > self.read_through)
 
     def __str__(self):
-        return f'{self.user} at {self.timestamp}'
\ No newline at end of file
+        return f'{self.user} : read through {self.read_through}'
\ No newline at end of file
@@ -0,0 +1,78 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from tasks.models import Notification
+
+RETENTION_POLICIES = ('summarize', 'delete')
+
+
+def retention_policy():
+    """
+    (days, policy, batch size) of the notification retention, from the NOTIFICATION_RETENTION_* settings
+    """
+    return (
+        getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90),
+        getattr(settings, 'NOTIFICATION_RETENTION_POLICY', 'summarize'),
+        getattr(settings, 'NOTIFICATION_COMPACTION_BATCH_SIZE', 1000),
+    )
+
+
+def summary_content(count, until):
+    return f'{count} notifications up to {until:%Y-%m-%d} were compacted into this one'
+
+
+def compact_batch(old, rows, policy):
+    """
+    Applies `policy` to the (id, user_id) `rows` of the `old` notifications in one transaction. Summarizing merges
+    them into the newest old notification of their user, which keeps its id and time and counts the merged ones.
+    Returns the number of notifications deleted.
+    """
+    with transaction.atomic():
+        merged = [notification_id for notification_id, _ in rows]
+        if policy == 'summarize':
+            user_ids = {user_id for _, user_id in rows if user_id is not None}
+            targets = dict(old.filter(user_id__in = user_ids).order_by().values_list('user_id').annotate(Max('id')))
+            merged = [notification_id for notification_id, user_id in rows if notification_id != targets.get(user_id)]
+            merged_into = defaultdict(int)
+            counts = dict(Notification.objects.filter(id__in = merged).values_list('id', 'count'))
+            for notification_id, user_id in rows:
+                if notification_id in counts and user_id in targets:
+                    merged_into[targets[user_id]] += counts[notification_id]
+            summaries = list(Notification.objects.filter(id__in = merged_into).only('id', 'timestamp', 'count'))
+            for summary in summaries:
+                summary.count += merged_into[summary.id]
+                summary.content = summary_content(summary.count, summary.timestamp)
+            # bulk_update leaves the auto_now timestamp alone : the summary stays where it was in the inbox
+            Notification.objects.bulk_update(summaries, ['count', 'content'])
+        deleted, _ = Notification.objects.filter(id__in = merged).delete()
+    return deleted
+
+
+def compact_notifications(now=None, days=None, policy=None, batch_size=None):
+    """
+    Summarizes or deletes the notifications older than the retention period, in batches of `batch_size` rows each
+    committed on its own : a run holds the locks of one batch at a time and never locks the table, the reports
+    keep adding notifications meanwhile. Returns the number of notifications deleted.
+    """
+    default_days, default_policy, default_batch_size = retention_policy()
+    days = default_days if days is None else days
+    policy = policy or default_policy
+    batch_size = batch_size or default_batch_size
+    if policy not in RETENTION_POLICIES:
+        raise ValueError(f'Unknown notification retention policy {policy}, expected one of {", ".join(RETENTION_POLICIES)}')
+    old = Notification.objects.filter(timestamp__lt = (now or timezone.now()) - timedelta(days = days))
+    last_id = old.aggregate(Max('id'))['id__max']
+    deleted = 0
+    position = 0
+    while last_id is not None:
+        rows = list(old.filter(id__gt = position, id__lte = last_id).order_by('id').values_list('id', 'user_id')[:batch_size])
+        if not rows:
+            break
+        position = rows[-1][0]
+        deleted += compact_batch(old, rows, policy)
+    return deleted
@@ -0,0 +1,229 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.http import Http404
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def keyset_ordering(view):
+    """
+    Ordering a view pages its rows by, `get_keyset_ordering()` lets it depend on the request
+    """
+    if hasattr(view, 'get_keyset_ordering'):
+        return view.get_keyset_ordering()
+    return getattr(view, 'keyset_ordering', ('id',))
+
+
+def keyset_fields(ordering):
+    """
+    Names of the fields of an ordering, without the '-' of the descending ones
+    """
+    return [field.lstrip('-') for field in ordering]
+
+
+def reverse_field(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def encode_cursor(values, reverse=False):
+    """
+    Opaque cursor of a position in the ordering : the ordering key values and the direction to read in
+    """
+    payload = json.dumps({'v': list(values), 'r': reverse}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """
+    Returns the (values, reverse) of a cursor made by `encode_cursor` for an ordering of `size` fields
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        values, reverse = payload['v'], payload['r']
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor(cursor)
+    # Task orderings are made of integer and boolean fields, and of the float rank of search results
+    if not isinstance(values, list) or len(values) != size or not all(isinstance(value, (int, float)) for value in values):
+        raise InvalidCursor(cursor)
+    return values, bool(reverse)
+
+
+class KeysetPage:
+    def __init__(self, object_list, values, reverse, has_more, paginator):
+        self.object_list = object_list
+        self.paginator = paginator
+        # An empty page keeps its cursor values, so it can still link back to where it was reached from
+        self.first_values = paginator.key(object_list[0]) if object_list else values
+        self.last_values = paginator.key(object_list[-1]) if object_list else values
+        if reverse:
+            self._has_next, self._has_previous = True, has_more
+        else:
+            self._has_next, self._has_previous = has_more, values is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if not self.has_next():
+            return None
+        return encode_cursor(self.last_values)
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous():
+            return None
+        return encode_cursor(self.first_values, reverse=True)
+
+
+class KeysetPaginator:
+    """
+    Pages through `queryset` by seeking past the ordering key of the last row shown instead of OFFSET, so a deep
+    page costs the same index range scan as the first one. `ordering` are fields, descending when prefixed with
+    '-', the last one unique.
+    No exact COUNT is run : `count` is an optional callable returning an estimate of the number of rows, or None.
+    """
+    def __init__(self, queryset, ordering, per_page, count=None):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self._count = count
+
+    @property
+    def count(self):
+        if self._count is None:
+            return None
+        return self._count()
+
+    def key(self, obj):
+        return [getattr(obj, field) for field in keyset_fields(self.ordering)]
+
+    def seek(self, values, reverse=False):
+        """
+        Rows after (or before when `reverse`) `values` in the ordering : a > x OR (a = x AND (b > y OR (b = y AND ...)))
+        """
+        condition = None
+        for field, value in reversed(list(zip(self.ordering, values))):
+            name = field.lstrip('-')
+            lookup = 'lt' if reverse != field.startswith('-') else 'gt'
+            bound = Q(**{f'{name}__{lookup}': value})
+            condition = bound if condition is None else bound | (Q(**{name: value}) & condition)
+        return condition
+
+    def page(self, cursor=None):
+        return KeysetPage(*self.fetch(cursor), paginator=self)
+
+    def fetch(self, cursor=None):
+        """
+        (object_list, values, reverse, has_more) of the page at `cursor`, everything a KeysetPage is built from
+        """
+        values, reverse = None, False
+        tasks = self.queryset
+        if cursor:
+            values, reverse = decode_cursor(cursor, len(self.ordering))
+            tasks = tasks.filter(self.seek(values, reverse))
+        tasks = tasks.order_by(*[reverse_field(field) if reverse else field for field in self.ordering])
+        # One extra row tells whether there is a page beyond this one
+        object_list = list(tasks[:self.per_page + 1])
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if reverse:
+            object_list.reverse()
+        return object_list, values, reverse, has_more
+
+
+class KeysetPaginationMixin:
+    """
+    ListView pagination through KeysetPaginator, the page is picked by the `cursor` query parameter
+    """
+    keyset_ordering = ('priority', 'id')
+
+    def estimate_count(self):
+        return None
+
+    def get_page(self, paginator, cursor):
+        return paginator.page(cursor)
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, keyset_ordering(self), page_size, count=self.estimate_count)
+        try:
+            page = self.get_page(paginator, self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404("Invalid cursor")
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+
+class KeysetPagination(BasePagination):
+    """
+    DRF counterpart of KeysetPaginationMixin, the ordering and the count estimate come from the view
+    """
+    cursor_query_param = 'cursor'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        paginator = KeysetPaginator(
+            queryset,
+            keyset_ordering(view),
+            self.get_page_size(request),
+            count=getattr(view, 'estimate_count', None),
+        )
+        try:
+            self.page = paginator.page(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise NotFound("Invalid cursor")
+        return self.page.object_list
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_link(self.page.next_cursor)),
+            ('previous', self.get_link(self.page.previous_cursor)),
+            ('count', self.page.paginator.count),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'count': {'type': 'integer', 'nullable': True},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,170 @@
+from bisect import bisect_right
+
+from django.db import transaction
+from django.db.models import Exists, F, Min, OuterRef, Q
+
+from tasks.cache import invalidate_task_caches
+from tasks.models import Task
+
+
+def active_tasks(user, exclude_pk=None):
+    """
+    Tasks that take part in the priority ordering of a user : not deleted and not completed
+    """
+    tasks = Task.objects.filter(deleted = False, completed = False, user = user)
+    if exclude_pk is not None:
+        tasks = tasks.exclude(pk = exclude_pk)
+    return tasks
+
+
+def find_collision_run(user, priority, exclude_pk=None):
+    """
+    Returns the last priority of the contiguous run of occupied priorities starting at `priority`,
+    or None when `priority` is free. Runs as a single query : the run ends at the smallest occupied
+    priority >= `priority` whose successor is not occupied.
+    """
+    tasks = active_tasks(user, exclude_pk)
+    successor = tasks.filter(priority = OuterRef('priority') + 1)
+    bounds = tasks.filter(priority__gte = priority).aggregate(
+        start = Min('priority'),
+        end = Min('priority', filter = ~Q(Exists(successor))),
+    )
+    if bounds['start'] != priority:
+        return None
+    return bounds['end']
+
+
+def make_room_for_priority(user, priority, exclude_pk=None):
+    """
+    Frees `priority` for a task of `user` by shifting the colliding run of tasks down by one.
+    `exclude_pk` is the task being moved, its current slot is considered vacated.
+    Returns the number of tasks shifted.
+    """
+    with transaction.atomic():
+        run_end = find_collision_run(user, priority, exclude_pk)
+        if run_end is None:
+            return 0
+        invalidate_task_caches([user.id])
+        return active_tasks(user, exclude_pk).filter(priority__gte = priority, priority__lte = run_end).update(priority = F('priority') + 1)
+
+
+class PriorityLayout:
+    """
+    In-memory priority ordering of the active tasks of a user, resolving the collisions of a whole batch of
+    moves with the same rule as `make_room_for_priority`. Occupied priorities are kept as runs of contiguous
+    slots, a slot holds the keys of the tasks at that priority and is empty once its tasks left it. Shifting
+    a run is then a list insertion instead of an update of every task of the run.
+    """
+    def __init__(self, slots=()):
+        self.starts = []
+        self.runs = []
+        self.slot_of = {}
+        self.holes = 0
+        self.original = {}
+        for priority, key in slots:
+            self.original[key] = priority
+            self.place(key, priority)
+
+    @classmethod
+    def for_user(cls, user):
+        return cls(active_tasks(user).order_by('priority', 'id').values_list('priority', 'id'))
+
+    def __contains__(self, key):
+        return key in self.slot_of
+
+    def run_index(self, priority):
+        """
+        Index of the run holding `priority`, None when `priority` is past every run or in a gap between two
+        """
+        index = bisect_right(self.starts, priority) - 1
+        if index >= 0 and priority < self.starts[index] + len(self.runs[index]):
+            return index
+        return None
+
+    def new_slot(self, key, priority):
+        slot = [key]
+        index = bisect_right(self.starts, priority)
+        if index > 0 and self.starts[index - 1] + len(self.runs[index - 1]) == priority:
+            index -= 1
+            self.runs[index].append(slot)
+        else:
+            self.starts.insert(index, priority)
+            self.runs.insert(index, [slot])
+        self.merge_next(index)
+        return slot
+
+    def merge_next(self, index):
+        if index + 1 < len(self.runs) and self.starts[index] + len(self.runs[index]) == self.starts[index + 1]:
+            self.runs[index].extend(self.runs.pop(index + 1))
+            del self.starts[index + 1]
+
+    def place(self, key, priority):
+        """
+        Puts a task at `priority` without moving the others, like saving it without making room
+        """
+        index = self.run_index(priority)
+        if index is None:
+            self.slot_of[key] = self.new_slot(key, priority)
+            return
+        slot = self.runs[index][priority - self.starts[index]]
+        if not slot:
+            self.holes -= 1
+        slot.append(key)
+        self.slot_of[key] = slot
+
+    def insert(self, key, priority):
+        """
+        Puts a task at `priority`, shifting the colliding run down by one up to its first free slot
+        """
+        index = self.run_index(priority)
+        if index is None:
+            self.slot_of[key] = self.new_slot(key, priority)
+            return
+        run = self.runs[index]
+        offset = priority - self.starts[index]
+        slot = [key]
+        self.slot_of[key] = slot
+        if not run[offset]:
+            run[offset] = slot
+            self.holes -= 1
+            return
+        hole = next((i for i in range(offset + 1, len(run)) if not run[i]), None) if self.holes else None
+        if hole is not None:
+            del run[hole]
+            self.holes -= 1
+            run.insert(offset, slot)
+        else:
+            run.insert(offset, slot)
+            self.merge_next(index)
+
+    def make_room(self, priority):
+        """
+        Frees `priority` like `make_room_for_priority`, for a task that does not stay in the ordering
+        """
+        self.insert(None, priority)
+        self.remove(None)
+
+    def remove(self, key):
+        slot = self.slot_of.pop(key, None)
+        if slot is None:
+            return
+        slot.remove(key)
+        if not slot:
+            self.holes += 1
+
+    def priorities(self):
+        """
+        {key: priority} of every task in the ordering
+        """
+        priorities = {}
+        for start, run in zip(self.starts, self.runs):
+            for offset, slot in enumerate(run):
+                for key in slot:
+                    priorities[key] = start + offset
+        return priorities
+
+    def moved(self):
+        """
+        {key: priority} of the tasks of the original ordering whose priority changed
+        """
+        return {key: priority for key, priority in self.priorities().items() if key in self.original and self.original[key] != priority}
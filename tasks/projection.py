@@ -0,0 +1,162 @@
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+from .pagination import keyset_fields, keyset_ordering
+
+FIELDS_QUERY_PARAM = 'fields'
+
+
+def requested_fields(request):
+    """
+    Field names of the `?fields=` sparse fieldset of a read request, None when every field is wanted
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    value = request.GET.get(FIELDS_QUERY_PARAM)
+    if not value:
+        return None
+    return [name for name in value.split(',') if name]
+
+
+class SparseFieldsMixin:
+    """
+    ModelSerializer whose output is limited to the `?fields=` of the request found in its context
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = requested_fields(self.context.get('request'))
+        if fields is None:
+            return
+        unknown = set(fields) - set(self.fields)
+        if unknown:
+            raise ValidationError({FIELDS_QUERY_PARAM: f'Unknown fields : {", ".join(sorted(unknown))}'})
+        for name in set(self.fields) - set(fields):
+            self.fields.pop(name)
+
+
+def serializer_columns(serializer):
+    """
+    (columns, relations) read by a ModelSerializer : the `.only()` and `.select_related()` arguments that load what it
+    outputs and nothing else. None when a field does not map to a column, the rows are then loaded whole.
+    """
+    model = serializer.Meta.model
+    columns, relations = [], []
+    for field in serializer.fields.values():
+        if field.source == '*' or '.' in field.source or isinstance(field, ListSerializer):
+            return None
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        if model_field.many_to_many or model_field.one_to_many:
+            return None
+        if isinstance(field, BaseSerializer):
+            nested = serializer_columns(field)
+            if nested is None:
+                return None
+            nested_columns, nested_relations = nested
+            relations.append(field.source)
+            relations += [f'{field.source}__{relation}' for relation in nested_relations]
+            columns += [f'{field.source}__{column}' for column in nested_columns]
+        else:
+            columns.append(field.source)
+    return columns, relations
+
+
+def is_column(model, name):
+    try:
+        return model._meta.get_field(name).concrete
+    except FieldDoesNotExist:
+        return False
+
+
+class ProjectedQuerysetMixin:
+    """
+    GenericAPIView whose reads load the serializer's columns only, with its nested relations joined in the same query
+    """
+    def project(self, queryset):
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        projection = serializer_columns(self.get_serializer_class()(context = {'request': self.request}))
+        if projection is None:
+            return queryset
+        columns, relations = projection
+        # Keyset pagination reads the ordering key of the rows, deferring it would cost a query per row
+        columns += [field for field in keyset_fields(keyset_ordering(self)) if is_column(queryset.model, field)]
+        return queryset.select_related(*relations).only(*columns)
+
+
+class ValuesRepresentation:
+    """
+    Output of a ModelSerializer built straight from `.values_list()` rows, without instantiating models. The fields
+    are compiled once into (name, column index, converter) steps, each converter is the `to_representation` of the
+    serializer field so the output is the same as the serializer's.
+    """
+    def __init__(self, serializer, extra_columns=()):
+        self.columns = []
+        self.build = self.compile(serializer, '')
+        for column in extra_columns:
+            self.column_index(column)
+
+    @classmethod
+    def for_serializer(cls, serializer, extra_columns=()):
+        if serializer_columns(serializer) is None:
+            return None
+        return cls(serializer, extra_columns)
+
+    def column_index(self, column):
+        if column not in self.columns:
+            self.columns.append(column)
+        return self.columns.index(column)
+
+    def compile(self, serializer, prefix):
+        steps = []
+        for field in serializer.fields.values():
+            if field.write_only:
+                continue
+            # A nested serializer reads the foreign key column to tell a missing related row, which is output as None
+            index = self.column_index(prefix + field.source)
+            if isinstance(field, BaseSerializer):
+                steps.append((field.field_name, index, self.compile(field, f'{prefix}{field.source}__'), True))
+            else:
+                steps.append((field.field_name, index, field.to_representation, False))
+
+        def build(row):
+            representation = {}
+            for name, index, convert, nested in steps:
+                value = row[index]
+                if value is None:
+                    representation[name] = None
+                else:
+                    representation[name] = convert(row) if nested else convert(value)
+            return representation
+        return build
+
+    def rows(self, queryset):
+        return queryset.values_list(*self.columns, named=True)
+
+    def to_representation(self, rows):
+        build = self.build
+        return [build(row) for row in rows]
+
+
+class ValuesListMixin:
+    """
+    GenericAPIView whose list action serializes `.values_list()` rows through ValuesRepresentation,
+    unless the FAST_LIST_SERIALIZERS setting is off or the serializer reads something else than columns
+    """
+    def list(self, request, *args, **kwargs):
+        representation = None
+        if getattr(settings, 'FAST_LIST_SERIALIZERS', True):
+            representation = ValuesRepresentation.for_serializer(self.get_serializer(), keyset_fields(keyset_ordering(self)))
+        if representation is None:
+            return super().list(request, *args, **kwargs)
+        rows = representation.rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(representation.to_representation(page))
+        return Response(representation.to_representation(rows))
@@ -0,0 +1,92 @@
+"""
+Read replica : the list, detail and history reads and the report aggregation go to the DATABASE_REPLICA alias,
+everything else to the primary
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .cache import task_cache_shared, wrote_recently
+
+# Apps whose rows the replica serves, the sessions and users stay on the primary with the rest of the writes
+REPLICA_APPS = ('tasks',)
+READ_METHODS = ('GET', 'HEAD')
+
+# Alias the reads made under `replica_reads` go to, None outside of it
+read_alias = ContextVar('read_alias', default=None)
+
+
+def replica_alias():
+    """
+    Alias of the replica, None without one. The recent writes of the users must be seen by every worker, a worker
+    missing those made through another would send the user to a replica that does not have them yet.
+    """
+    alias = getattr(settings, 'DATABASE_REPLICA', None)
+    if alias is not None and not task_cache_shared():
+        raise ImproperlyConfigured('DATABASE_REPLICA needs a shared task cache, TASK_CACHE_SHARED is off')
+    return alias
+
+
+@contextmanager
+def replica_reads(user_id=None):
+    """
+    Sends the reads of the tasks made in the block to the replica, unless `user_id` wrote in the last
+    REPLICA_STICKY_SECONDS : their own writes may not have reached it yet. Yields the alias read from.
+    """
+    alias = replica_alias()
+    if alias is None or (user_id is not None and wrote_recently(user_id)):
+        yield DEFAULT_DB_ALIAS
+        return
+    token = read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Routes the reads made under `replica_reads` to the replica, and every write to the primary. A read inside a
+    transaction stays on the primary, next to the rows the transaction wrote or locked.
+    """
+    def db_for_read(self, model, **hints):
+        alias = read_alias.get()
+        if alias is None:
+            return None
+        if model._meta.app_label not in REPLICA_APPS or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # Rows read from the replica are saved to the primary, rather than to the database they came from
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the rows of the primary
+        return True
+
+
+class ReplicaReadMixin:
+    """
+    View whose GET and HEAD requests, to the `replica_actions` of a ViewSet, read the replica unless the user wrote
+    in the last REPLICA_STICKY_SECONDS. The response is rendered in the view, its template reads the replica too.
+    """
+    replica_actions = ('list', 'retrieve')
+
+    def reads_replica(self, request):
+        if request.method not in READ_METHODS:
+            return False
+        action_map = getattr(self, 'action_map', None)
+        return action_map is None or action_map.get(request.method.lower()) in self.replica_actions
+
+    def dispatch(self, request, *args, **kwargs):
+        if replica_alias() is None or not self.reads_replica(request):
+            return super().dispatch(request, *args, **kwargs)
+        with replica_reads(request.user.id):
+            response = super().dispatch(request, *args, **kwargs)
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+        return response
@@ -0,0 +1,198 @@
+import logging
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from tasks.events import publish_on_commit
+from tasks.models import Notification, ReportConfig, ReportDelivery, Task
+from tasks.replicas import replica_reads
+
+logger = logging.getLogger(__name__)
+
+REPORT_BATCH_SIZE = 500
+REPORT_SHARD_SIZE = 2000
+# A claimed delivery that is neither sent nor released after this long belongs to a crashed worker
+REPORT_CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+def due_report_configs(now, first_user_id=None, last_user_id=None):
+    configs = ReportConfig.objects.filter(next_send_at__lte = now, user__isnull = False)
+    if first_user_id is not None:
+        configs = configs.filter(user_id__gte = first_user_id)
+    if last_user_id is not None:
+        configs = configs.filter(user_id__lte = last_user_id)
+    return configs
+
+
+def report_shards(now, shard_size=REPORT_SHARD_SIZE):
+    """
+    Leases the due configs no shard was queued for in the last REPORT_CLAIM_TIMEOUT, and splits their users into
+    (first_user_id, last_user_id) ranges of at most `shard_size` users. A config stays leased until its report is
+    sent : the ticks that follow do not queue it again while its shard is in flight.
+    """
+    due_report_configs(now).filter(Q(dispatched_at__isnull = True) | Q(dispatched_at__lt = now - REPORT_CLAIM_TIMEOUT)).update(dispatched_at = now)
+    shards = []
+    user_ids = []
+    for user_id in due_report_configs(now).filter(dispatched_at = now).order_by('user_id').values_list('user_id', flat=True).iterator():
+        user_ids.append(user_id)
+        if len(user_ids) == shard_size:
+            shards.append((user_ids[0], user_ids[-1]))
+            user_ids = []
+    if user_ids:
+        shards.append((user_ids[0], user_ids[-1]))
+    return shards
+
+
+def task_status_summary(user_ids):
+    """
+    Status counts of the live tasks of every user in `user_ids`, as one grouped query
+    """
+    return Task.objects.filter(user_id__in = user_ids, deleted = False).values_list('user_id', 'status').annotate(total=Count('id')).order_by('user_id', 'status')
+
+
+def report_content(user, summary):
+    email_content = f'Hi {user.username}\nPlease find the below task summary :\n'
+    for status, total in summary:
+        email_content += f"{status} : {total}\n"
+    return email_content
+
+
+def delivery_filter(configs):
+    """
+    Matches the deliveries of `configs`, keyed on the user and the day the report is scheduled for
+    """
+    users_by_day = defaultdict(list)
+    for config in configs:
+        users_by_day[config.next_send_at.date()].append(config.user_id)
+    return reduce(or_, (Q(day = day, user_id__in = user_ids) for day, user_ids in users_by_day.items()))
+
+
+def claim_deliveries(configs, token):
+    """
+    Claims the unsent deliveries of `configs` for `token`. Returns the configs this worker must send and
+    the configs whose report was already sent by an earlier attempt, keyed by user id with the sent time.
+    """
+    ReportDelivery.objects.bulk_create(
+        [ReportDelivery(user_id = config.user_id, day = config.next_send_at.date()) for config in configs],
+        ignore_conflicts = True,
+    )
+    deliveries = ReportDelivery.objects.filter(delivery_filter(configs))
+    claimed_at = timezone.now()
+    deliveries.filter(sent_at__isnull = True).filter(Q(claimed_at__isnull = True) | Q(claimed_at__lt = claimed_at - REPORT_CLAIM_TIMEOUT)).update(
+        claim_token = token, claimed_at = claimed_at
+    )
+    claimed = set()
+    already_sent = {}
+    for user_id, claim_token, sent_at in deliveries.values_list('user_id', 'claim_token', 'sent_at'):
+        if sent_at is not None:
+            already_sent[user_id] = sent_at
+        elif claim_token == token:
+            claimed.add(user_id)
+    return [config for config in configs if config.user_id in claimed], already_sent
+
+
+def send_report_batch(configs, now, token):
+    """
+    Sends the claimed reports of `configs` over a single mail connection. Returns the configs actually
+    sent; when sending fails part way, the reports sent so far are recorded before the error propagates.
+    """
+    if not configs:
+        return []
+    summaries = defaultdict(list)
+    # The aggregation is kept off the primary, a report may miss the changes of the last seconds
+    with replica_reads():
+        for user_id, status, total in task_status_summary([config.user_id for config in configs]):
+            summaries[user_id].append((status, total))
+
+    sent = []
+    try:
+        with get_connection() as connection:
+            for config in configs:
+                email_content = report_content(config.user, summaries[config.user_id])
+                connection.send_messages([EmailMessage("Task Summary", email_content, "tasks@taskmanager.com", [config.user.email])])
+                sent.append((config, email_content))
+    finally:
+        record_sent_reports(sent, now, token)
+        if len(sent) < len(configs):
+            # Let a retry pick up the unsent reports right away instead of waiting for the claim to expire
+            ReportDelivery.objects.filter(claim_token = token, sent_at__isnull = True).update(claim_token = '', claimed_at = None)
+    return [config for config, _ in sent]
+
+
+def record_sent_reports(sent, now, token):
+    if not sent:
+        return
+    # Committed on its own : once a mail is out, no later failure may make its report look unsent
+    ReportDelivery.objects.filter(claim_token = token, user_id__in = [config.user_id for config, _ in sent]).update(sent_at = timezone.now())
+    with transaction.atomic():
+        Notification.objects.bulk_create([Notification(user_id = config.user_id, content = email_content) for config, email_content in sent])
+        publish_on_commit([config.user_id for config, _ in sent], 'notifications')
+        for config, _ in sent:
+            config.last_sent_time = now
+        reschedule([config for config, _ in sent])
+
+
+def reschedule(configs):
+    """
+    Moves `configs` to their next report, from the `last_sent_time` set on them, and releases their lease
+    """
+    for config in configs:
+        config.next_send_at = config.compute_next_send_at()
+        config.dispatched_at = None
+    ReportConfig.objects.bulk_update(configs, ['last_sent_time', 'next_send_at', 'dispatched_at'])
+
+
+def send_due_reports(now, first_user_id=None, last_user_id=None, batch_size=REPORT_BATCH_SIZE):
+    """
+    Sends every report due at `now` for the users in the given id range, a batch of configs at a time.
+    Each report is claimed through its ReportDelivery first, so running the same range twice, concurrently
+    or as a retry, does not send a report again. Only a worker dying between handing a mail to the server
+    and recording it leaves a report to be sent again once its claim expires.
+    """
+    mail_sent_to = []
+    last_id = 0
+    token = uuid.uuid4().hex
+    while True:
+        with transaction.atomic():
+            configs = list(
+                due_report_configs(now, first_user_id, last_user_id).filter(id__gt = last_id)
+                .select_for_update(skip_locked = True, of = ('self',)).select_related('user').order_by('id')[:batch_size]
+            )
+            if not configs:
+                break
+            last_id = configs[-1].id
+            claimed, already_sent = claim_deliveries(configs, token)
+            # Reports sent by an attempt that died before rescheduling its configs
+            stale = [config for config in configs if config.user_id in already_sent]
+            for config in stale:
+                config.last_sent_time = already_sent[config.user_id]
+            if stale:
+                reschedule(stale)
+        sent = send_report_batch(claimed, now, token)
+        mail_sent_to += [config.user.email for config in sent]
+        logger.info("Completed task summary email for %s users", len(sent))
+    return mail_sent_to
+
+
+def purge_report_deliveries(now=None, days=None, batch_size=None):
+    """
+    Deletes the deliveries of the reports scheduled more than REPORT_DELIVERY_RETENTION_DAYS ago, `batch_size` rows
+    per query : their configs have long moved on to later days. Returns the number of deliveries deleted.
+    """
+    days = getattr(settings, 'REPORT_DELIVERY_RETENTION_DAYS', 7) if days is None else days
+    batch_size = batch_size or getattr(settings, 'REPORT_DELIVERY_PURGE_BATCH_SIZE', 1000)
+    old = ReportDelivery.objects.filter(day__lt = (now or timezone.now()).date() - timedelta(days = days))
+    deleted = 0
+    while True:
+        ids = list(old.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += ReportDelivery.objects.filter(id__in = ids).delete()[0]
@@ -0,0 +1,49 @@
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+# Keyset ordering of search results : best rank first, the rank is lower for better matches on every backend
+SEARCH_ORDERING = ('search_rank', 'id')
+
+POSTGRESQL_DOCUMENT = "to_tsvector('simple', tasks_task.title || ' ' || tasks_task.description)"
+
+
+def search_terms(term):
+    return re.findall(r'\w+', term or '')
+
+
+def sqlite_match(terms, user):
+    """
+    FTS5 query matching every term as a word prefix in the title or the description of the tasks of `user`
+    """
+    match = '{title description} : (%s)' % ' '.join(f'"{term}"*' for term in terms)
+    if user is not None:
+        match = f'owner : u{user.id} AND {match}'
+    return match
+
+
+def search_tasks(queryset, term, user=None):
+    """
+    Tasks of `queryset` whose title or description contain every word of `term` as a word prefix, annotated with
+    their `search_rank`. Passing the `user` the queryset is restricted to lets the index do that restriction too.
+    """
+    terms = search_terms(term)
+    if not terms:
+        return queryset.annotate(search_rank = Value(0.0, output_field = FloatField())).none()
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        # Joined to the FTS5 table, the rank is computed once per match by the full-text query itself
+        return queryset.filter(search_index__document__match = sqlite_match(terms, user)).annotate(search_rank = F('search_index__rank'))
+    if vendor == 'postgresql':
+        query = ' & '.join(f'{term}:*' for term in terms)
+        return queryset.filter(
+            RawSQL(f"{POSTGRESQL_DOCUMENT} @@ to_tsquery('simple', %s)", (query,), output_field = BooleanField())
+        ).annotate(
+            search_rank = RawSQL(f"-ts_rank({POSTGRESQL_DOCUMENT}, to_tsquery('simple', %s))", (query,), output_field = FloatField())
+        )
+    # No full-text index on this backend : every term is looked for as a substring, unranked
+    for word in terms:
+        queryset = queryset.filter(Q(title__icontains = word) | Q(description__icontains = word))
+    return queryset.annotate(search_rank = Value(0.0, output_field = FloatField()))
@@ -1,12 +1,66 @@
-from django.db.models.signals import pre_save, post_save
+from celery.signals import task_prerun
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_delete, pre_save, post_save
+from django.contrib.auth.models import User
 from django.dispatch import receiver
-from .models import Task, TaskStatusChange
+from .cache import invalidate_task_caches
+from .connections import check_connections, tune_sqlite
+from .events import publish_on_commit
+from .metrics import measure_query
+from .models import Notification, Task, TaskStats, TaskStatusChange, live_counts
 
 @receiver(pre_save, sender=Task)
-def task_status_change(sender, instance, *args, **kwargs):
-    # print(f'sender : {sender} \n instance : {instance} \n args : {args} \n kwargs : {kwargs} ')
-    task = Task.objects.filter(id=instance.id).first()
-    if task != None:
-        oldStatus = task.status
-        if oldStatus != instance.status:
-            TaskStatusChange(old_status=oldStatus, new_status=instance.status, task=instance).save()
\ No newline at end of file
+def task_status_snapshot(sender, instance, *args, **kwargs):
+    # Only tasks loaded with deferred fields need their old values read before they are overwritten
+    for field in Task.TRACKED_FIELDS:
+        instance.has_changed(field)
+
+@receiver(post_save, sender=Task)
+def task_status_change(sender, instance, created, update_fields=None, *args, **kwargs):
+    # The old values come from the snapshot taken when the task was loaded, saving costs no extra read
+    if not created and (update_fields is None or 'status' in update_fields) and instance.status_changed():
+        TaskStatusChange.objects.record([(instance.id, instance.get_old_status(), instance.status)])
+    if instance.user_id is not None:
+        TaskStats.objects.adjust({instance.user_id: instance.counts_delta(created, update_fields)})
+        invalidate_task_caches([instance.user_id])
+    instance.snapshot(update_fields)
+
+@receiver(post_save, sender=User)
+def user_task_caches(sender, instance, created, update_fields=None, *args, **kwargs):
+    # Task payloads embed the names of their user, and a new user may reuse the id of a deleted one whose cached
+    # reads must not be served. Logging in only saves last_login.
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        invalidate_task_caches([instance.id])
+
+@receiver(pre_delete, sender=Task)
+def task_delete_stats(sender, instance, *args, **kwargs):
+    if instance.user_id is not None:
+        total, completed = live_counts(instance.deleted, instance.completed)
+        # Counters missing are rebuilt when next read, once the task is gone
+        TaskStats.objects.adjust({instance.user_id: (-total, -completed)}, rebuild_missing=False)
+        invalidate_task_caches([instance.user_id])
+
+@receiver(post_save, sender=Notification)
+def notification_event(sender, instance, created, *args, **kwargs):
+    if created:
+        publish_on_commit([instance.user_id], 'notifications')
+
+@receiver(connection_created)
+def connection_request_metrics(sender, connection, *args, **kwargs):
+    # Installed once per connection, also on the connections of the async read threads
+    if measure_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(measure_query)
+
+@receiver(connection_created)
+def connection_tuning(sender, connection, *args, **kwargs):
+    tune_sqlite(connection)
+
+@receiver(request_started)
+def request_connection_health_check(sender, *args, **kwargs):
+    check_connections()
+
+@task_prerun.connect
+def task_connection_health_check(*args, **kwargs):
+    # Celery workers keep their connections between tasks as web workers do between requests
+    check_connections()
@@ -0,0 +1,74 @@
+"""
+Streamed responses under ASGI : Django 4.0 iterates a StreamingHttpResponse in the event loop, where the database
+cannot be read. An AsyncStreamingHttpResponse is awaited part by part by StreamingASGIHandler instead.
+"""
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.http.response import StreamingHttpResponse
+
+
+async def iterate_in_thread(iterable):
+    """
+    Yields the items of the sync `iterable`, each one produced by `sync_to_async` : in the thread of the request
+    under ASGI, where the database can be read, one query at a time rather than the whole iterable at once
+    """
+    iterator = iter(iterable)
+    next_item = sync_to_async(next)
+    done = object()
+    while True:
+        item = await next_item(iterator, done)
+        if item is done:
+            return
+        yield item
+
+
+class AsyncStreamingHttpResponse(StreamingHttpResponse):
+    """
+    Streamed response whose content is an async iterator, sent by StreamingASGIHandler. Only ASGI serves it.
+    """
+    is_async = True
+
+    @property
+    def streaming_content(self):
+        return self.aiter_bytes()
+
+    @streaming_content.setter
+    def streaming_content(self, value):
+        self._set_streaming_content(value)
+
+    def _set_streaming_content(self, value):
+        self._iterator = value.__aiter__()
+
+    async def aiter_bytes(self):
+        async for part in self._iterator:
+            yield self.make_bytes(part)
+
+    def __iter__(self):
+        raise TypeError('An AsyncStreamingHttpResponse is only sent by StreamingASGIHandler')
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """
+    ASGIHandler sending an AsyncStreamingHttpResponse as its parts are awaited, the others the way Django does.
+    Its requests have `async_streaming` set, the views return an AsyncStreamingHttpResponse only then.
+    """
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.async_streaming = True
+        return request, error_response
+
+    async def send_response(self, response, send):
+        if not getattr(response, 'is_async', False):
+            return await super().send_response(response, send)
+        headers = [
+            (header.encode('ascii'), value.encode('latin1')) for header, value in response.items()
+        ] + [
+            (b'Set-Cookie', cookie.output(header='').encode('ascii').strip()) for cookie in response.cookies.values()
+        ]
+        await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+        async for part in response.streaming_content:
+            for chunk, _ in self.chunk_bytes(part):
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
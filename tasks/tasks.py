@@ -1,14 +1,16 @@
 from datetime import timedelta, datetime
 import time
 
+from celery import group
 from celery.decorators import periodic_task
-from tasks.models import ReportConfig
-from tasks.models import Task, Notification
+from tasks.archive import archive_tasks
+from tasks.models import Task
+from tasks.notifications import compact_notifications
+from tasks.reports import purge_report_deliveries, report_shards, send_due_reports
 from django.contrib.auth.models import User
 from django.core.mail import send_mail
-from django.db.models import Count
-from django.db import transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 from task_manager.celery import app
 
@@ -21,22 +23,42 @@ def send_email_reminder():
         send_mail("Pending Tasks from Task Manager", email_content, "tasks@taskmanager.com", [user.email])
         print(f'Completed email processing for user : {user.id}')
 
+@app.task(bind=True, max_retries=5, default_retry_delay=10)
+def send_report_shard(self, first_user_id, last_user_id, now):
+    try:
+        return send_due_reports(parse_datetime(now), first_user_id, last_user_id)
+    except Exception as exc:
+        raise self.retry(exc=exc)
+
 @periodic_task(run_every=timedelta(seconds=1))
 def send_task_summary():
-    currentTime = timezone.now()
-    mail_sent_to = []
-
-    for email_config in ReportConfig.objects.select_for_update().all():
-        with transaction.atomic():
-            if (email_config.last_sent_time == None or currentTime > email_config.last_sent_time + timedelta(days=1)) and currentTime.time() > email_config.time:
-                qs = Task.objects.filter(user = email_config.user, deleted = False).values('status').annotate(total=Count('id')).order_by('status')
-                email_content = f'Hi {email_config.user.username}\nPlease find the below task summary :\n'
-                for task_summary in qs:
-                    email_content += f"{task_summary.get('status')} : {task_summary.get('total')}\n"
-                send_mail("Task Summary", email_content, "tasks@taskmanager.com", [email_config.user.email])
-                mail_sent_to.append(email_config.user.email)
-                Notification(user=email_config.user, content = email_content).save()
-                email_config.last_sent_time = currentTime
-                email_config.save(update_fields=['last_sent_time'])
-                print(f'Completed task summary email for user : {email_config.user.username} for today with content : {email_content}')
-    return mail_sent_to
+    """
+    Fans the due reports out to one send_report_shard subtask per range of user ids, the reports whose shard is
+    still in flight are left out
+    """
+    now = timezone.now()
+    shards = report_shards(now)
+    if shards:
+        group(send_report_shard.s(first_user_id, last_user_id, now.isoformat()) for first_user_id, last_user_id in shards).apply_async()
+    return shards
+
+@periodic_task(run_every=timedelta(days=1))
+def purge_old_report_deliveries():
+    """
+    Deletes the idempotency records of the reports of past days
+    """
+    return purge_report_deliveries()
+
+@periodic_task(run_every=timedelta(days=1))
+def compact_old_notifications():
+    """
+    Applies the notification retention policy, one short transaction per batch
+    """
+    return compact_notifications()
+
+@periodic_task(run_every=timedelta(days=1))
+def archive_old_tasks():
+    """
+    Moves the old deleted and completed tasks to the archive, one short transaction per batch
+    """
+    return archive_tasks()
@@ -1,8 +1,22 @@
+import datetime
+import json
+import time
+from unittest import mock
+
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
-from tasks.models import STATUS_CHOICES, Task
+from task_manager.asgi import application
+from tasks.apiviews import TaskSerializer, TaskStatusSerializer
+from tasks.cache import modified_key, task_cache
+from tasks.models import STATUS_CHOICES, Notification, Task, TaskStats, TaskStatusChange, TaskStatusRollup
+from tasks.projection import ValuesRepresentation
 
 
 class TaskViewSetTest(APITestCase):
@@ -20,6 +34,90 @@ class TaskViewSetTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         
 
+class TaskListAPITest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
+        self.other_user = User.objects.create_user(username="clark_kent", email="clark@kent.org", password="i_am_superman")
+        for priority in range(1, 6):
+            Task.objects.create(title=f'abcdefg{priority}', description='test', priority=priority, status = STATUS_CHOICES[0][0] , user=self.user)
+            Task.objects.create(title=f'hijklmn{priority}', description='test', priority=priority, status = STATUS_CHOICES[0][0] , user=self.other_user)
+        Task.objects.create(title='deleted', description='test', priority=9, user=self.user, deleted=True)
+
+    def test_task_list_api_is_paginated(self):
+        response = self.client.get('/taskapi', {'page_size': 4})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 4)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_task_list_api_ndjson_export(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/taskapi', {'export': 'ndjson'})
+            rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(rows[0]['user']['username'], 'bruce_wayne')
+
+    def test_task_list_api_json_export(self):
+        response = self.client.get('/taskapi', {'export': 'json'})
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([task['id'] for task in data['tasks']], list(Task.objects.filter(deleted=False).order_by('id').values_list('id', flat=True)))
+
+    def test_task_list_api_export_in_chunks(self):
+        # A query per chunk, the last one short
+        with mock.patch('tasks.apiviews.EXPORT_CHUNK_SIZE', 3), self.assertNumQueries(4):
+            response = self.client.get('/taskapi', {'export': 'ndjson'})
+            rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], list(Task.objects.filter(deleted=False).order_by('id').values_list('id', flat=True)))
+
+
+    def test_task_list_api_unknown_export(self):
+        response = self.client.get('/taskapi', {'export': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TaskExportASGITest(TransactionTestCase):
+    """
+    Exports served by the ASGI application of the project, called the way a server calls it : the chunks are read
+    in the thread of the request, not in the event loop sending them
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
+        for number in range(7):
+            Task.objects.create(title=f'task {number}', description='test', user=self.user)
+        self.client.force_login(self.user)
+
+    async def export(self, export_format):
+        cookie = '; '.join(f'{name}={morsel.value}' for name, morsel in self.client.cookies.items()).encode()
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http', 'method': 'GET',
+            'path': '/taskapi', 'raw_path': b'/taskapi', 'query_string': f'export={export_format}'.encode(), 'root_path': '',
+            'headers': [(b'host', b'testserver'), (b'cookie', cookie)], 'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+        }
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        await application(scope, receive, send)
+        return messages
+
+    async def test_export_is_sent_a_chunk_at_a_time(self):
+        with mock.patch('tasks.apiviews.EXPORT_CHUNK_SIZE', 3):
+            start, *parts, end = await self.export('ndjson')
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'Content-Type', b'application/x-ndjson'), start['headers'])
+        self.assertEqual([len(part['body'].splitlines()) for part in parts], [3, 3, 1])
+        self.assertEqual(end, {'type': 'http.response.body'})
+
+    async def test_json_export(self):
+        start, *parts, end = await self.export('json')
+        data = json.loads(b''.join(part['body'] for part in parts))
+        self.assertEqual(len(data['tasks']), 7)
+
+
 class TaskStatusHistoryViewSetTest(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
@@ -39,4 +137,474 @@ class TaskStatusHistoryViewSetTest(APITestCase):
         task.save()
         response = self.client.get(reverse('api-task-status-history-list', kwargs = {'task_pk':self.task_one.id}), follow=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        
\ No newline at end of file
+        
+class TaskViewSetPriorityTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
+        self.task_one = Task.objects.create(title='abcdefg1', description='test', priority=1, status = STATUS_CHOICES[0][0] , user=self.user)
+        self.task_two = Task.objects.create(title='abcdefg2', description='test', priority=2, status = STATUS_CHOICES[0][0] , user=self.user)
+
+    def test_api_task_create_priority_cascade_POST(self):
+        self.client.login(username="bruce_wayne", password="i_am_batman")
+        response = self.client.post(reverse('api-task-list'), {'title':'abcdefg0', 'description':'test', 'priority':1, 'status':STATUS_CHOICES[0][0]})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Task.objects.get(id=response.data['id']).priority, 1)
+        self.assertEqual(Task.objects.get(id=self.task_one.id).priority, 2)
+        self.assertEqual(Task.objects.get(id=self.task_two.id).priority, 3)
+
+    def test_api_task_update_priority_cascade_PATCH(self):
+        self.client.login(username="bruce_wayne", password="i_am_batman")
+        response = self.client.patch(reverse('api-task-detail', kwargs={'pk':self.task_two.id}), {'priority':1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Task.objects.get(id=self.task_one.id).priority, 2)
+        self.assertEqual(Task.objects.get(id=self.task_two.id).priority, 1)
+
+
+class TaskProjectionTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
+        for priority in range(1, 31):
+            task = Task.objects.create(title=f'abcdefg{priority}', description='test', priority=priority, status = STATUS_CHOICES[0][0] , user=self.user)
+            task.status = STATUS_CHOICES[1][0]
+            task.save()
+        self.client.login(username="bruce_wayne", password="i_am_batman")
+
+    def task_sql(self, path, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, params)
+            body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body, [query['sql'] for query in queries if 'FROM "tasks_task"' in query['sql']]
+
+    def test_task_list_query_count_does_not_depend_on_page_size(self):
+        # Session, user, task counters and the page itself
+        for page_size in (2, 10, 30):
+            with self.assertNumQueries(4):
+                response = self.client.get(reverse('api-task-list'), {'page_size': page_size})
+            self.assertEqual(len(response.data['results']), page_size)
+
+    def test_task_list_joins_user(self):
+        response, _, task_queries = self.task_sql(reverse('api-task-list'), {})
+        self.assertEqual(response.data['results'][0]['user']['username'], 'bruce_wayne')
+        self.assertEqual(len(task_queries), 1)
+        self.assertIn('INNER JOIN "auth_user"', task_queries[0])
+        self.assertIn('"tasks_task"."description"', task_queries[0])
+
+    def test_sparse_fieldset_prunes_columns_and_output(self):
+        response, _, task_queries = self.task_sql(reverse('api-task-list'), {'fields': 'id,title'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title'})
+        self.assertNotIn('description', task_queries[0])
+        self.assertNotIn('auth_user', task_queries[0])
+
+    def test_sparse_fieldset_on_detail(self):
+        task = Task.objects.filter(user=self.user).first()
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('api-task-detail', kwargs={'pk': task.id}), {'fields': 'title,user'})
+        self.assertEqual(response.data, {'title': task.title, 'user': {'first_name': '', 'last_name': '', 'username': 'bruce_wayne'}})
+
+    def test_sparse_fieldset_unknown_field(self):
+        response = self.client.get(reverse('api-task-list'), {'fields': 'title,password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sparse_fieldset_on_export(self):
+        _, body, task_queries = self.task_sql('/taskapi', {'export': 'ndjson', 'fields': 'id,status'})
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(set(rows[0]), {'id', 'status'})
+        self.assertEqual(len(task_queries), 1)
+        self.assertNotIn('description', task_queries[0])
+
+    def test_history_query_count_does_not_depend_on_history_size(self):
+        task = Task.objects.filter(user=self.user).first()
+        url = reverse('api-task-status-history-list', kwargs = {'task_pk': task.id})
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data), 1)
+        task.status = STATUS_CHOICES[2][0]
+        task.save()
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'fields': 'new_status'})
+        self.assertEqual(response.data, [{'new_status': STATUS_CHOICES[1][0]}, {'new_status': STATUS_CHOICES[2][0]}])
+
+
+class ValuesRepresentationTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman", first_name="Bruce")
+        for priority, (status_choice, _) in enumerate(STATUS_CHOICES, start=1):
+            task = Task.objects.create(title=f'abcdefg{priority}', description='tëst\n"quoted"', priority=priority, user=self.user, completed = priority % 2 == 0)
+            task.status = status_choice
+            task.save()
+        Task.objects.create(title='orphan', description='', priority=7)
+        self.client.login(username="bruce_wayne", password="i_am_batman")
+
+    def assertSameJSON(self, serializer_class, queryset):
+        expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        representation = ValuesRepresentation(serializer_class())
+        self.assertEqual(JSONRenderer().render(representation.to_representation(representation.rows(queryset))), expected)
+
+    def test_task_representation_matches_serializer(self):
+        self.assertSameJSON(TaskSerializer, Task.objects.order_by('id'))
+
+    def test_history_representation_matches_serializer(self):
+        self.assertSameJSON(TaskStatusSerializer, TaskStatusChange.objects.order_by('id'))
+
+    def test_api_responses_match_serializer(self):
+        task = Task.objects.filter(user=self.user).first()
+        for path, params in (
+            (reverse('api-task-list'), {}),
+            (reverse('api-task-list'), {'page_size': 2, 'fields': 'id,user,status'}),
+            (reverse('api-task-list'), {'completed': 'true'}),
+            (reverse('api-task-status-history-list', kwargs = {'task_pk': task.id}), {}),
+        ):
+            fast = self.client.get(path, params)
+            with override_settings(FAST_LIST_SERIALIZERS=False):
+                slow = self.client.get(path, params)
+            self.assertEqual(fast.status_code, status.HTTP_200_OK)
+            self.assertEqual(fast.content, slow.content)
+
+    def test_api_pages_from_values_rows(self):
+        response = self.client.get(reverse('api-task-list'), {'page_size': 2})
+        response = self.client.get(response.data['next'])
+        self.assertEqual([task['title'] for task in response.data['results']], ['abcdefg2', 'abcdefg4'])
+
+
+class TaskBulkTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
+        self.task_one = Task.objects.create(title='abcdefg1', description='test', priority=1, status = STATUS_CHOICES[0][0] , user=self.user)
+        self.task_two = Task.objects.create(title='abcdefg2', description='test', priority=2, status = STATUS_CHOICES[0][0] , user=self.user)
+        self.client.login(username="bruce_wayne", password="i_am_batman")
+
+    def bulk(self, operations):
+        return self.client.post(reverse('api-task-bulk'), operations, format='json')
+
+    def create(self, title, priority):
+        return {'op': 'create', 'data': {'title': title, 'description': 'test', 'priority': priority, 'status': STATUS_CHOICES[0][0]}}
+
+    def test_bulk_unauthenticated_POST(self):
+        self.client.logout()
+        response = self.bulk([self.create('abcdefg3', 1)])
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_bulk_create_matches_sequential_priority_cascade(self):
+        response = self.bulk([self.create('abcdefg3', 1), self.create('abcdefg4', 1), self.create('abcdefg5', 3)])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [result['id'] for result in response.data['results']]
+        priorities = dict(Task.objects.values_list('id', 'priority'))
+        # abcdefg3 pushes one and two to 2, 3 ; abcdefg4 pushes everything up again ; abcdefg5 lands on 3
+        self.assertEqual([priorities[task_id] for task_id in ids], [2, 1, 3])
+        self.assertEqual(priorities[self.task_one.id], 4)
+        self.assertEqual(priorities[self.task_two.id], 5)
+
+    def test_bulk_update_complete_delete(self):
+        response = self.bulk([
+            {'op': 'update', 'id': self.task_two.id, 'data': {'priority': 1, 'status': STATUS_CHOICES[1][0]}},
+            {'op': 'complete', 'id': self.task_one.id},
+            self.create('abcdefg3', 2),
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([result['op'] for result in response.data['results']], ['update', 'complete', 'create'])
+        task_one, task_two = Task.objects.get(id=self.task_one.id), Task.objects.get(id=self.task_two.id)
+        self.assertTrue(task_one.completed)
+        self.assertEqual(task_two.priority, 1)
+        self.assertEqual(Task.objects.get(id=response.data['results'][2]['id']).priority, 2)
+        self.assertEqual(TaskStatusChange.objects.filter(task=task_two).count(), 1)
+        stats = TaskStats.objects.for_user(self.user)
+        self.assertEqual((stats.all_count, stats.completed_count), (3, 1))
+
+        response = self.bulk([{'op': 'delete', 'id': self.task_two.id}])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(Task.objects.get(id=self.task_two.id).deleted)
+        stats = TaskStats.objects.for_user(self.user)
+        self.assertEqual((stats.all_count, stats.completed_count), (2, 1))
+
+    def test_bulk_invalid_operation_applies_nothing(self):
+        other = User.objects.create_user(username="clark_kent", email="clark@kent.org", password="i_am_superman")
+        other_task = Task.objects.create(title='abcdefg9', description='test', priority=1, status = STATUS_CHOICES[0][0] , user=other)
+        response = self.bulk([
+            self.create('abcdefg3', 1),
+            {'op': 'update', 'id': self.task_one.id, 'data': {'priority': 'high'}},
+            {'op': 'delete', 'id': other_task.id},
+            {'op': 'archive', 'id': self.task_two.id},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        results = response.data['results']
+        self.assertNotIn('errors', results[0])
+        self.assertIn('priority', results[1]['errors'])
+        self.assertIn('id', results[2]['errors'])
+        self.assertIn('op', results[3]['errors'])
+        self.assertEqual(Task.objects.count(), 3)
+        self.assertEqual(Task.objects.get(id=self.task_one.id).priority, 1)
+        self.assertFalse(Task.objects.get(id=other_task.id).deleted)
+
+    def test_bulk_rejects_a_task_changed_twice(self):
+        response = self.bulk([{'op': 'complete', 'id': self.task_one.id}, {'op': 'delete', 'id': self.task_one.id}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('id', response.data['results'][1]['errors'])
+
+    def test_bulk_query_count_does_not_depend_on_batch_size(self):
+        def queries(size):
+            operations = [self.create(f'bulk{index}', 1) for index in range(size)]
+            operations += [{'op': 'update', 'id': self.task_one.id, 'data': {'status': STATUS_CHOICES[1][0]}}]
+            with CaptureQueriesContext(connection) as context:
+                response = self.bulk(operations)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.task_one.refresh_from_db()
+            Task.objects.filter(id=self.task_one.id).update(status=STATUS_CHOICES[0][0])
+            return len(context.captured_queries)
+        # The first batch creates the status rollup buckets of the day
+        queries(5)
+        self.assertEqual(queries(5), queries(50))
+
+
+@override_settings(TASK_CACHE_SHARED=True)
+class TaskConditionalReadTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
+        self.task_one = Task.objects.create(title='abcdefg1', description='test', priority=1, status = STATUS_CHOICES[0][0] , user=self.user)
+        self.client.login(username="bruce_wayne", password="i_am_batman")
+
+    def test_unchanged_list_is_not_modified(self):
+        etag = self.client.get(reverse('api-task-list'))['ETag']
+        # Only the session and the user are read
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('api-task-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_write_changes_the_etag(self):
+        etag = self.client.get(reverse('api-task-detail', kwargs={'pk': self.task_one.id}))['ETag']
+        self.client.patch(reverse('api-task-detail', kwargs={'pk': self.task_one.id}), {'title': 'abcdefg9'})
+        response = self.client.get(reverse('api-task-detail', kwargs={'pk': self.task_one.id}), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['title'], 'abcdefg9')
+
+    def test_etag_depends_on_the_query(self):
+        etag = self.client.get(reverse('api-task-list'))['ETag']
+        response = self.client.get(reverse('api-task-list'), {'completed': 'true'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_history_status_change_changes_the_etag(self):
+        url = reverse('api-task-status-history-list', kwargs = {'task_pk': self.task_one.id})
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        Task.objects.filter(id=self.task_one.id).update_status(STATUS_CHOICES[1][0])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+
+    @override_settings(TASK_CACHE_SHARED=False)
+    def test_no_validators_without_a_shared_cache(self):
+        response = self.client.get(reverse('api-task-list'))
+        self.assertFalse(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertEqual(self.client.get(reverse('api-task-list'), HTTP_IF_NONE_MATCH='*').status_code, status.HTTP_200_OK)
+
+    def test_if_modified_since(self):
+        task_cache().set(modified_key(self.user.id), time.time() - 10, None)
+        last_modified = self.client.get(reverse('api-task-list'))['Last-Modified']
+        response = self.client.get(reverse('api-task-list'), HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        Task.objects.filter(id=self.task_one.id).mark_completed()
+        response = self.client.get(reverse('api-task-list'), HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # The change happened in the current second, Last-Modified is held back until it is over
+        self.assertFalse(response.has_header('Last-Modified'))
+
+
+class TaskChangesTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
+        self.task_gone = Task.objects.create(title='abcdefg3', description='test', priority=3, status = STATUS_CHOICES[0][0] , user=self.user, deleted=True)
+        self.task_one = Task.objects.create(title='abcdefg1', description='test', priority=1, status = STATUS_CHOICES[0][0] , user=self.user)
+        self.task_two = Task.objects.create(title='abcdefg2', description='test', priority=2, status = STATUS_CHOICES[0][0] , user=self.user)
+        self.client.login(username="bruce_wayne", password="i_am_batman")
+
+    def changes(self, **params):
+        response = self.client.get(reverse('api-task-changes'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_first_sync_returns_the_live_tasks(self):
+        data = self.changes()
+        self.assertEqual([task['id'] for task in data['changes']], [self.task_one.id, self.task_two.id])
+        self.assertFalse(data['has_more'])
+        self.assertEqual(self.changes(since=data['since'])['changes'], [])
+
+    def test_changes_since_cursor(self):
+        since = self.changes()['since']
+        self.client.patch(reverse('api-task-detail', kwargs={'pk': self.task_two.id}), {'title': 'abcdefg9'})
+        self.client.delete(reverse('api-task-detail', kwargs={'pk': self.task_one.id}))
+        response = self.client.post(reverse('api-task-list'), {'title': 'abcdefg4', 'description': 'test', 'priority': 2})
+        data = self.changes(since=since)
+        # The new task pushed task two down to 3, its latest change is reported once and in order
+        self.assertEqual([task['id'] for task in data['changes']], [self.task_one.id, self.task_two.id, response.data['id']])
+        self.assertTrue(data['changes'][0]['deleted'])
+        self.assertEqual((data['changes'][1]['title'], data['changes'][1]['priority']), ('abcdefg9', 3))
+        self.assertTrue(Task.objects.filter(id=self.task_one.id).exists())
+
+    def test_queryset_writes_are_reported(self):
+        since = self.changes()['since']
+        Task.objects.filter(id=self.task_one.id).update_status(STATUS_CHOICES[1][0])
+        Task.objects.filter(id=self.task_two.id).mark_completed()
+        data = self.changes(since=since)
+        self.assertEqual([(task['id'], task['status'], task['completed']) for task in data['changes']], [
+            (self.task_one.id, STATUS_CHOICES[1][0], False),
+            (self.task_two.id, STATUS_CHOICES[2][0], True),
+        ])
+
+    def test_changes_are_paged(self):
+        data = self.changes(page_size=1)
+        self.assertEqual([task['id'] for task in data['changes']], [self.task_one.id])
+        self.assertTrue(data['has_more'])
+        data = self.changes(since=data['since'], page_size=1)
+        self.assertEqual([task['id'] for task in data['changes']], [self.task_two.id])
+
+    def test_other_users_changes_are_not_reported(self):
+        other = User.objects.create_user(username="clark_kent", email="clark@kent.org", password="i_am_superman")
+        since = self.changes()['since']
+        Task.objects.create(title='abcdefg5', description='test', priority=1, status = STATUS_CHOICES[0][0] , user=other)
+        self.assertEqual(self.changes(since=since)['changes'], [])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('api-task-changes'), {'since': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class NotificationViewSetTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
+        self.other = User.objects.create_user(username="clark_kent", email="clark@kent.org", password="i_am_superman")
+        self.ids = [Notification.objects.create(user=self.user, content=f'report {i}').id for i in range(3)]
+        Notification.objects.create(user=self.other, content='report')
+        self.client.login(username="bruce_wayne", password="i_am_batman")
+
+    def test_unauthenticated(self):
+        self.client.logout()
+        response = self.client.get(reverse('api-notification-list'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_list_newest_first(self):
+        response = self.client.get(reverse('api-notification-list'), {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([notification['id'] for notification in response.data['results']], self.ids[:0:-1])
+        self.assertFalse(any(notification['read'] for notification in response.data['results']))
+        response = self.client.get(response.data['next'])
+        self.assertEqual([notification['id'] for notification in response.data['results']], [self.ids[0]])
+
+    def test_read(self):
+        response = self.client.post(reverse('api-notification-read', kwargs={'pk': self.ids[1]}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['read'])
+        response = self.client.get(reverse('api-notification-list'), {'unread': 'true'})
+        self.assertEqual([notification['id'] for notification in response.data['results']], [self.ids[2], self.ids[0]])
+        self.assertEqual(self.client.get(reverse('api-notification-unread-count')).data, {'unread': 2})
+
+    def test_read_all(self):
+        response = self.client.post(reverse('api-notification-read-all'), {'up_to': self.ids[1]}, format='json')
+        self.assertEqual(response.data, {'unread': 1})
+        response = self.client.post(reverse('api-notification-read-all'))
+        self.assertEqual(response.data, {'unread': 0})
+        self.assertTrue(all(notification['read'] for notification in self.client.get(reverse('api-notification-list')).data['results']))
+
+    def test_read_all_invalid(self):
+        response = self.client.post(reverse('api-notification-read-all'), {'up_to': 'all'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_notifications(self):
+        other_id = Notification.objects.get(user=self.other).id
+        response = self.client.post(reverse('api-notification-read', kwargs={'pk': other_id}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(len(self.client.get(reverse('api-notification-list')).data['results']), 3)
+
+    def test_list_queries(self):
+        # Session, user, read state and the page
+        with self.assertNumQueries(4):
+            self.client.get(reverse('api-notification-list'), {'unread': 'true'})
+
+
+class TaskAnalyticsTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
+        self.tasks = [Task.objects.create(title=f'abcdefg{i}', description='test', priority=i, user=self.user) for i in range(3)]
+        Task.objects.filter(user=self.user).update_status(STATUS_CHOICES[1][0])
+        TaskStatusChange.objects.update(timestamp=timezone.now() - datetime.timedelta(hours=2))
+        Task.objects.filter(id__in=[task.id for task in self.tasks[:2]]).update_status(STATUS_CHOICES[2][0])
+        self.client.login(username="bruce_wayne", password="i_am_batman")
+
+    def analytics(self, **params):
+        response = self.client.get(reverse('api-task-analytics'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_daily(self):
+        data = self.analytics()
+        self.assertEqual(len(data['buckets']), 30)
+        self.assertEqual(data['until'], timezone.now().date())
+        self.assertEqual(data['completed'], 2)
+        self.assertEqual([bucket['completed'] for bucket in data['buckets']], [0] * 29 + [2])
+        self.assertAlmostEqual(data['average_in_progress_seconds'], 7200, delta=60)
+        self.assertGreater(data['throughput_trend'], 0)
+        self.assertEqual(data['buckets'][-1]['entered'], {STATUS_CHOICES[1][0]: 3, STATUS_CHOICES[2][0]: 2})
+
+    def test_weekly(self):
+        today = timezone.now().date()
+        since = today - datetime.timedelta(days=20)
+        data = self.analytics(period='week', since=str(since))
+        weeks = (today - datetime.timedelta(days=today.weekday()) - (since - datetime.timedelta(days=since.weekday()))).days // 7 + 1
+        self.assertEqual(len(data['buckets']), weeks)
+        self.assertEqual(data['buckets'][-1]['completed'], 2)
+        self.assertTrue(all(bucket['start'].weekday() == 0 for bucket in data['buckets']))
+
+    def test_reads_rollups_only(self):
+        # Session, user and the rollups, however long the history is
+        with self.assertNumQueries(3):
+            self.analytics()
+        TaskStatusChange.objects.all().delete()
+        self.assertEqual(self.analytics()['completed'], 2)
+
+    def test_other_users_are_not_counted(self):
+        other = User.objects.create_user(username="clark_kent", password="i_am_superman")
+        self.client.login(username="clark_kent", password="i_am_superman")
+        self.assertEqual(self.analytics()['completed'], 0)
+        self.assertTrue(TaskStatusRollup.objects.filter(user=self.user).exists())
+        self.assertFalse(TaskStatusRollup.objects.filter(user=other).exists())
+
+    def test_tasks_completed_from_the_views_are_counted(self):
+        # Completing a task moves it to the COMPLETED status, as a change into it would
+        response = self.client.post(reverse('complete-task', kwargs={'pk': self.tasks[2].id}))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Task.objects.get(id=self.tasks[2].id).status, STATUS_CHOICES[2][0])
+        created = Task.objects.create(title='completed in bulk', description='test', user=self.user)
+        self.client.post(reverse('api-task-bulk'), [{'op': 'complete', 'id': created.id}], format='json')
+        Task.objects.create(title='completed by the queryset', description='test', user=self.user)
+        Task.objects.filter(user=self.user, completed=False).mark_completed()
+        data = self.analytics()
+        self.assertEqual(data['completed'], 5)
+        self.assertEqual(data['buckets'][-1]['entered'][STATUS_CHOICES[2][0]], 5)
+
+    def test_tasks_completed_by_an_update_are_counted(self):
+        response = self.client.patch(reverse('api-task-detail', args=[self.tasks[2].id]), {'completed': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], STATUS_CHOICES[2][0])
+        self.assertEqual(self.analytics()['completed'], 3)
+        # A status given along is kept
+        task = Task.objects.create(title='cancelled', description='test', user=self.user)
+        self.client.patch(reverse('api-task-detail', args=[task.id]), {'completed': True, 'status': STATUS_CHOICES[3][0]}, format='json')
+        self.assertEqual(Task.objects.get(id=task.id).status, STATUS_CHOICES[3][0])
+        self.assertEqual(self.analytics()['completed'], 3)
+
+    def test_invalid_parameters(self):
+        for params in ({'period': 'year'}, {'since': 'yesterday'}, {'since': '2026-02-30'}, {'since': '2026-10-10', 'until': '2026-10-01'}, {'since': '2000-01-01'}):
+            response = self.client.get(reverse('api-task-analytics'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_history_timestamp_filter(self):
+        url = reverse('api-task-status-history-list', kwargs={'task_pk': self.tasks[0].id})
+        day = datetime.date(2026, 10, 5)
+        first, second = TaskStatusChange.objects.filter(task=self.tasks[0]).order_by('id')
+        TaskStatusChange.objects.filter(id=first.id).update(timestamp=datetime.datetime(2026, 10, 4, 23, 59, tzinfo=datetime.timezone.utc))
+        TaskStatusChange.objects.filter(id=second.id).update(timestamp=datetime.datetime(2026, 10, 5, 0, 0, tzinfo=datetime.timezone.utc))
+        self.assertEqual([change['new_status'] for change in self.client.get(url, {'timestamp': str(day)}).data], [STATUS_CHOICES[2][0]])
+        self.assertEqual(len(self.client.get(url, {'timestamp': str(day + datetime.timedelta(days=1))}).data), 0)
+
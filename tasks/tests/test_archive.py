@@ -0,0 +1,110 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+
+from tasks.archive import archive_tasks
+from tasks.models import STATUS_CHOICES, ArchivedTask, ArchivedTaskStatusChange, Task, TaskStats, TaskStatusChange, TaskStatusRollup
+
+
+class ArchiveTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
+        self.completed = self.old_task('completed', completed=True, status=STATUS_CHOICES[0][0])
+        self.completed.status = STATUS_CHOICES[2][0]
+        self.completed.save()
+        self.deleted = self.old_task('deleted', deleted=True)
+        self.pending = self.old_task('pending')
+        self.recent = Task.objects.create(title='recent', description='test', completed=True, user=self.user)
+        self.changed = self.old_task('changed', completed=True)
+        self.changed.status = STATUS_CHOICES[1][0]
+        self.changed.save()
+        TaskStatusChange.objects.exclude(task=self.changed).update(timestamp=timezone.now() - timedelta(days=200))
+        Task.objects.filter(title__in=['completed', 'deleted', 'pending', 'changed']).update(created_date=timezone.now() - timedelta(days=300))
+        self.client.login(username="bruce_wayne", password="i_am_batman")
+
+    def old_task(self, title, **fields):
+        return Task.objects.create(title=title, description='test', user=self.user, **fields)
+
+
+class ArchiveTasksTest(ArchiveTestCase):
+    def test_moves_old_deleted_and_completed_tasks_with_their_history(self):
+        history = list(TaskStatusChange.objects.filter(task=self.completed).values_list('id', 'old_status', 'new_status', 'timestamp'))
+        self.assertEqual(archive_tasks(days=180), 2)
+        self.assertEqual(set(ArchivedTask.objects.values_list('id', flat=True)), {self.completed.id, self.deleted.id})
+        self.assertEqual(set(Task.objects.values_list('id', flat=True)), {self.pending.id, self.recent.id, self.changed.id})
+        self.assertEqual(list(ArchivedTaskStatusChange.objects.filter(task=self.completed.id).values_list('id', 'old_status', 'new_status', 'timestamp')), history)
+        self.assertFalse(TaskStatusChange.objects.filter(task_id=self.completed.id).exists())
+        archived = ArchivedTask.objects.get(id=self.completed.id)
+        self.assertEqual((archived.title, archived.user, archived.status, archived.completed), ('completed', self.user, STATUS_CHOICES[2][0], True))
+
+    def test_counters_match_a_rebuild(self):
+        archive_tasks(days=180)
+        stats = TaskStats.objects.get(user=self.user)
+        TaskStats.objects.rebuild([self.user.id])
+        rebuilt = TaskStats.objects.get(user=self.user)
+        self.assertEqual((stats.all_count, stats.completed_count), (rebuilt.all_count, rebuilt.completed_count))
+        self.assertEqual((stats.all_count, stats.completed_count), (3, 2))
+
+    def test_rollups_match_a_rebuild(self):
+        TaskStatusRollup.objects.rebuild([self.user.id])
+        rollups = set(TaskStatusRollup.objects.values_list('period', 'start', 'status', 'entered', 'exited', 'seconds_in_status'))
+        archive_tasks(days=180)
+        TaskStatusRollup.objects.rebuild([self.user.id])
+        self.assertEqual(set(TaskStatusRollup.objects.values_list('period', 'start', 'status', 'entered', 'exited', 'seconds_in_status')), rollups)
+        self.assertTrue(TaskStatusRollup.objects.filter(status=STATUS_CHOICES[2][0], start=(timezone.now() - timedelta(days=200)).date()).exists())
+
+    def test_batches_and_reruns(self):
+        self.assertEqual(archive_tasks(days=180, batch_size=1), 2)
+        self.assertEqual(archive_tasks(days=180, batch_size=1), 0)
+        self.assertEqual(ArchivedTask.objects.count(), 2)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('archive_tasks', '--days', '180', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'Archived 2 tasks')
+
+
+class ArchiveReadThroughTest(ArchiveTestCase):
+    def setUp(self):
+        super().setUp()
+        archive_tasks(days=180)
+
+    def test_detail_page_of_an_archived_task(self):
+        response = self.client.get(reverse('detail-task', kwargs={'pk': self.completed.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, 'completed')
+
+    def test_detail_page_of_an_archived_deleted_task(self):
+        response = self.client.get(reverse('detail-task', kwargs={'pk': self.deleted.id}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_history_of_an_archived_task(self):
+        url = reverse('api-task-status-history-list', kwargs={'task_pk': self.completed.id})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(change['old_status'], change['new_status']) for change in response.json()], [(STATUS_CHOICES[0][0], STATUS_CHOICES[2][0])])
+        change_id = ArchivedTaskStatusChange.objects.get(task=self.completed.id).id
+        response = self.client.get(reverse('api-task-status-history-detail', kwargs={'task_pk': self.completed.id, 'pk': change_id}))
+        self.assertEqual(response.json()['new_status'], STATUS_CHOICES[2][0])
+
+    def test_history_of_a_live_task_does_not_read_the_archive(self):
+        url = reverse('api-task-status-history-list', kwargs={'task_pk': self.changed.id})
+        # Session, user and the history
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(len(response.json()), 1)
+
+    def test_history_of_an_archived_task_of_another_user(self):
+        User.objects.create_user(username="clark_kent", password="i_am_superman")
+        self.client.login(username="clark_kent", password="i_am_superman")
+        url = reverse('api-task-status-history-list', kwargs={'task_pk': self.completed.id})
+        self.assertEqual(self.client.get(url).json(), [])
+        change_id = ArchivedTaskStatusChange.objects.get(task=self.completed.id).id
+        response = self.client.get(reverse('api-task-status-history-detail', kwargs={'task_pk': self.completed.id, 'pk': change_id}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
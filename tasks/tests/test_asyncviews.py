@@ -0,0 +1,60 @@
+from django.contrib.auth.models import User
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from tasks.models import STATUS_CHOICES, Task
+
+
+# The async views read from pool threads, with connections of their own : the rows have to be committed
+class AsyncTaskViewsTest(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
+        self.task_one = Task.objects.create(title='abcdefg1', description='test', priority=1, status = STATUS_CHOICES[0][0], user=self.user)
+        self.task_two = Task.objects.create(title='abcdefg2', description='test', priority=2, status = STATUS_CHOICES[0][0], user=self.user)
+        self.client = APIClient()
+        self.client.login(username="bruce_wayne", password="i_am_batman")
+
+    def test_list_matches_the_sync_list(self):
+        response = self.client.get(reverse('async-task-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'], self.client.get(reverse('api-task-list')).json()['results'])
+
+    def test_detail(self):
+        response = self.client.get(reverse('async-task-detail', kwargs={'pk': self.task_two.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['title'], 'abcdefg2')
+
+    def test_history_list(self):
+        Task.objects.filter(id=self.task_one.id).update_status(STATUS_CHOICES[1][0])
+        response = self.client.get(reverse('async-task-status-history-list', kwargs={'task_pk': self.task_one.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([change['new_status'] for change in response.json()], [STATUS_CHOICES[1][0]])
+
+    @override_settings(TASK_CACHE_SHARED=True)
+    def test_conditional_read(self):
+        etag = self.client.get(reverse('async-task-list'))['ETag']
+        response = self.client.get(reverse('async-task-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_unauthenticated(self):
+        self.client.logout()
+        response = self.client.get(reverse('async-task-list'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_other_users_task(self):
+        other = User.objects.create_user(username="clark_kent", password="i_am_superman")
+        task = Task.objects.create(title='abcdefg3', description='test', priority=1, user=other)
+        response = self.client.get(reverse('async-task-detail', kwargs={'pk': task.id}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_writes_are_not_allowed(self):
+        response = self.client.post(reverse('async-task-list'), {'title': 'abcdefg4', 'description': 'test'})
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    async def test_served_by_the_asgi_handler(self):
+        self.async_client.cookies = self.client.cookies
+        response = await self.async_client.get(reverse('async-task-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([task['id'] for task in response.json()['results']], [self.task_one.id, self.task_two.id])
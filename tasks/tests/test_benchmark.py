@@ -0,0 +1,19 @@
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
+
+from tasks.benchmark import benchmark_routes, load_baseline, regressions, uncovered_routes
+
+
+@override_settings(TASK_EVENTS_REDIS_URL=None, REQUEST_SLOW_SECONDS=None)
+class RouteBenchmarkTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_every_route_is_benchmarked(self):
+        self.assertEqual(uncovered_routes(), [])
+
+    def test_no_query_count_regression(self):
+        dataset = {'users': 2, 'tasks': 10, 'history': 2}
+        results = benchmark_routes(repeat=1, memory=False, **dataset)
+        self.assertEqual([name for name, result in results.items() if result['status'] >= 500], [])
+        self.assertEqual(regressions(load_baseline(), dataset, results), [])
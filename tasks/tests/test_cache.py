@@ -0,0 +1,92 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from tasks.cache import cache_metrics, task_generation
+from tasks.models import STATUS_CHOICES, Task
+
+
+# One process : its local cache is shared by every request
+@override_settings(TASK_CACHE_SHARED=True)
+class TaskCacheTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
+        self.task_one = Task.objects.create(title='abcdefg1', description='test', priority=1, status = STATUS_CHOICES[0][0] , user=self.user)
+        self.client.login(username="bruce_wayne", password="i_am_batman")
+
+    def test_list_is_served_from_cache_until_a_task_changes(self):
+        self.assertEqual(self.client.get(reverse('tasks-view'))['X-Cache'], 'miss')
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('tasks-view'))
+        self.assertEqual(response['X-Cache'], 'hit')
+        self.assertContains(response, 'abcdefg1')
+
+        Task.objects.filter(id=self.task_one.id).mark_completed()
+        response = self.client.get(reverse('tasks-view'))
+        self.assertEqual(response['X-Cache'], 'miss')
+        self.assertNotContains(response, 'abcdefg1')
+        self.assertContains(self.client.get(reverse('complete-list')), 'abcdefg1')
+
+    def test_query_parameters_and_users_are_cached_apart(self):
+        Task.objects.create(title='zzzzzzz2', description='test', priority=2, status = STATUS_CHOICES[0][0] , user=self.user)
+        self.client.get(reverse('tasks-view'))
+        response = self.client.get(reverse('tasks-view'), {'search': 'zzzzzzz2'})
+        self.assertEqual(response['X-Cache'], 'miss')
+        self.assertNotContains(response, 'abcdefg1')
+
+        User.objects.create_user(username="clark_kent", email="clark@kent.org", password="i_am_superman")
+        self.client.login(username="clark_kent", password="i_am_superman")
+        response = self.client.get(reverse('tasks-view'))
+        self.assertEqual(response['X-Cache'], 'miss')
+        self.assertNotContains(response, 'abcdefg1')
+
+    def test_api_writes_invalidate_the_api_list(self):
+        self.assertEqual(self.client.get(reverse('api-task-list'))['X-Cache'], 'miss')
+        self.assertEqual(self.client.get(reverse('api-task-list'))['X-Cache'], 'hit')
+
+        self.client.patch(reverse('api-task-detail', kwargs={'pk': self.task_one.id}), {'title': 'abcdefg9'}, content_type='application/json')
+        response = self.client.get(reverse('api-task-list'))
+        self.assertEqual(response['X-Cache'], 'miss')
+        self.assertEqual(response.json()['results'][0]['title'], 'abcdefg9')
+
+        self.client.post(reverse('api-task-bulk'), [{'op': 'complete', 'id': self.task_one.id}], content_type='application/json')
+        response = self.client.get(reverse('api-task-list'), {'completed': 'false'})
+        self.assertEqual(response.json()['results'], [])
+
+    def test_queryset_writes_bump_the_generation(self):
+        generation = task_generation(self.user.id)
+        Task.objects.filter(user=self.user).update_status(STATUS_CHOICES[1][0])
+        self.assertGreater(task_generation(self.user.id), generation)
+
+    def test_generation_is_bumped_again_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            generation = task_generation(self.user.id)
+            Task.objects.filter(id=self.task_one.id).soft_delete()
+            self.assertEqual(task_generation(self.user.id), generation + 1)
+        self.assertEqual(task_generation(self.user.id), generation + 2)
+
+    def test_metrics(self):
+        before = cache_metrics(['all-tasks'])['all-tasks']
+        self.client.get(reverse('all-tasks-view'))
+        self.client.get(reverse('all-tasks-view'))
+        after = cache_metrics(['all-tasks'])['all-tasks']
+        self.assertEqual((after['hits'] - before['hits'], after['misses'] - before['misses']), (1, 1))
+        out = StringIO()
+        call_command('task_cache_stats', stdout=out)
+        self.assertIn('all-tasks', out.getvalue())
+
+    @override_settings(TASK_CACHE_TIMEOUT=0)
+    def test_cache_can_be_disabled(self):
+        self.client.get(reverse('tasks-view'))
+        response = self.client.get(reverse('tasks-view'))
+        self.assertFalse(response.has_header('X-Cache'))
+
+    @override_settings(TASK_CACHE_SHARED=False)
+    def test_cache_of_each_process_is_not_used(self):
+        self.client.get(reverse('tasks-view'))
+        self.client.get(reverse('api-task-list'))
+        self.assertFalse(self.client.get(reverse('tasks-view')).has_header('X-Cache'))
+        self.assertFalse(self.client.get(reverse('api-task-list')).has_header('X-Cache'))
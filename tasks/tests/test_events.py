@@ -0,0 +1,97 @@
+import asyncio
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import TestCase, TransactionTestCase
+
+from tasks.events import EVENTS_PATH, EventBroker, EventStream, Subscriber, broker
+from tasks.models import STATUS_CHOICES, Notification, Task
+
+
+class SubscriberTest(TestCase):
+    def test_pending_events_are_coalesced_by_type(self):
+        async def scenario():
+            subscriber = Subscriber(1, asyncio.get_event_loop())
+            for _ in range(10000):
+                subscriber.push({'type': 'tasks'})
+            subscriber.push({'type': 'notifications'})
+            self.assertEqual(len(subscriber.pending), 2)
+            return await subscriber.next_events(1)
+        self.assertEqual(async_to_sync(scenario)(), [{'type': 'tasks'}, {'type': 'notifications'}])
+
+
+class PublishTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
+
+    def test_task_write_publishes_once_committed(self):
+        with mock.patch.object(broker, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                Task.objects.create(title='abcdefg1', description='test', priority=1, status = STATUS_CHOICES[0][0] , user=self.user)
+                publish.assert_not_called()
+        publish.assert_called_with(self.user.id, {'type': 'tasks'})
+
+    def test_notification_publishes(self):
+        with mock.patch.object(broker, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                Notification.objects.create(user=self.user, content='report')
+        publish.assert_called_once_with(self.user.id, {'type': 'notifications'})
+
+
+# The session is read from another thread, it must be committed
+class EventStreamTest(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
+
+    def scope(self, cookie=None):
+        headers = [(b'cookie', f'{settings.SESSION_COOKIE_NAME}={cookie}'.encode())] if cookie else []
+        return {'type': 'http', 'method': 'GET', 'path': EVENTS_PATH, 'headers': headers}
+
+    def stream(self, scope, broker, publish=()):
+        """
+        Runs the stream until the `publish` events went out, returns the messages sent
+        """
+        async def scenario():
+            messages, disconnected, received = [], asyncio.Event(), asyncio.Event()
+
+            async def receive():
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                messages.append(message)
+                if b'event: ' in message.get('body', b''):
+                    received.set()
+
+            async def client():
+                if publish:
+                    while not broker.subscriber_count():
+                        await asyncio.sleep(0.01)
+                    for event in publish:
+                        broker.publish(self.user.id, event)
+                    await asyncio.wait_for(received.wait(), 5)
+                disconnected.set()
+
+            driver = asyncio.ensure_future(client())
+            await EventStream(broker)(scope, receive, send)
+            await driver
+            return messages
+        return async_to_sync(scenario)()
+
+    def test_anonymous_stream_is_forbidden(self):
+        messages = self.stream(self.scope(), EventBroker())
+        self.assertEqual(messages[0]['status'], 403)
+
+    def test_stream_sends_published_events(self):
+        self.client.login(username="bruce_wayne", password="i_am_batman")
+        event_broker = EventBroker()
+        messages = self.stream(self.scope(self.client.cookies[settings.SESSION_COOKIE_NAME].value), event_broker, [{'type': 'tasks'}])
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), messages[0]['headers'])
+        body = b''.join(message.get('body', b'') for message in messages[1:])
+        self.assertIn(b'retry: ', body)
+        self.assertIn(b'event: tasks\ndata: {"type": "tasks"}\n\n', body)
+        # The subscriber is gone once the client disconnected
+        self.assertEqual(event_broker.subscriber_count(), 0)
@@ -0,0 +1,57 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from rest_framework.request import Request
+from rest_framework.views import APIView
+
+from tasks.apiviews import TaskViewSet
+from tasks.models import STATUS_CHOICES, Task
+from tasks.pagination import KeysetPaginator
+from tasks.reports import task_status_summary
+from tasks.views import GenericAllTaskView, GenericTaskCompleteListView, GenericTaskView
+
+
+class TaskIndexUsageTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
+        self.task_one = Task.objects.create(title='abcdefg1', description='test', priority=1, status = STATUS_CHOICES[0][0] , user=self.user)
+        self.task_two = Task.objects.create(title='abcdefg2', description='test', priority=2, status = STATUS_CHOICES[0][0] , user=self.user, completed = True)
+
+    def view_queryset(self, view_class, **initkwargs):
+        request = self.factory.get('/')
+        request.user = self.user
+        view = view_class(**initkwargs)
+        if isinstance(view, APIView):
+            request = Request(request)
+            request.user = self.user
+        view.setup(request)
+        return view.get_queryset()
+
+    def assertUsesIndex(self, queryset, index_name):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables are cheaper to scan, make the planner show whether the index is usable
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_pending_list_uses_index(self):
+        self.assertUsesIndex(self.view_queryset(GenericTaskView), 'task_user_pending_idx')
+
+    def test_all_tasks_list_uses_index(self):
+        self.assertUsesIndex(self.view_queryset(GenericAllTaskView), 'task_user_live_idx')
+
+    def test_completed_list_uses_index(self):
+        self.assertUsesIndex(self.view_queryset(GenericTaskCompleteListView), 'task_user_completed_idx')
+
+    def test_keyset_page_uses_index(self):
+        paginator = KeysetPaginator(self.view_queryset(GenericAllTaskView), GenericAllTaskView.keyset_ordering, 5)
+        page = paginator.queryset.filter(paginator.seek([False, 1, self.task_one.id])).order_by(*paginator.ordering)
+        self.assertUsesIndex(page, 'task_user_live_idx')
+
+    def test_api_list_uses_index(self):
+        self.assertUsesIndex(self.view_queryset(TaskViewSet, action='list'), 'task_user_live_idx')
+
+    def test_task_summary_uses_index(self):
+        self.assertUsesIndex(task_status_summary([self.user.id]), 'task_user_live_status_idx')
@@ -0,0 +1,59 @@
+import json
+import os
+import tempfile
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from tasks.benchmark import seed
+from tasks.loadreplay import AsgiSender, ClientSender, Replay, load_stream, save_stream, synthetic_stream
+
+
+class StreamTest(SimpleTestCase):
+    def setUp(self):
+        descriptor, self.path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(descriptor)
+        self.addCleanup(os.remove, self.path)
+
+    def test_lines_that_are_not_requests_are_skipped(self):
+        with open(self.path, 'w') as lines:
+            lines.write(json.dumps({'request_id': 'user-001', 'title': 'not a request'}) + '\n')
+            lines.write('{not json\n\n')
+            lines.write(json.dumps({'method': 'GET', 'path': '/api/task/{task}/'}) + '\n')
+            lines.write(json.dumps({'method': 'post', 'path': '/api/task/', 'data': {'title': 'a'}, 'json': True}) + '\n')
+        stream, skipped = load_stream(self.path)
+        self.assertEqual(skipped, 2)
+        self.assertEqual([(route.name, route.method, route.as_json) for route in stream], [('api-task-detail', 'get', False), ('api-task-list post', 'post', True)])
+
+    def test_recorded_stream_replays_the_same_requests(self):
+        stream = synthetic_stream(50, writes=True, seed=3)
+        save_stream(stream, self.path)
+        loaded, skipped = load_stream(self.path)
+        self.assertEqual(skipped, 0)
+        self.assertEqual([(route.method, route.path, route.data) for route in loaded], [(route.method, route.path, route.data) for route in stream])
+        self.assertFalse(any(route.name == 'user-logout' for route in stream))
+
+
+@override_settings(TASK_EVENTS_REDIS_URL=None, REQUEST_SLOW_SECONDS=None)
+class ReplayTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user, self.ids = seed(1, 5, 1)
+
+    def test_replay_in_process(self):
+        # A single worker : the test database is SQLite in memory, where a connection finding a table locked by the
+        # write of another fails at once rather than waiting. replay_load runs on a file, its workers wait.
+        replay = Replay(synthetic_stream(40), concurrency=1).run(ClientSender(self.user, self.ids))
+        summary = replay.summary()
+        self.assertEqual(replay.failures, [])
+        self.assertEqual(sum(route['requests'] for route in summary.values()), 40)
+        self.assertEqual(sum(route['errors'] + route['4xx'] for route in summary.values()), 0)
+        self.assertTrue(all(route['p50_ms'] <= route['p95_ms'] <= route['p99_ms'] for route in summary.values()))
+
+    def test_replay_through_the_asgi_application(self):
+        stream = [route for route in synthetic_stream(200) if route.name in ('taskapi export', 'async-task-list')]
+        replay = Replay(stream, concurrency=2).run_async(AsgiSender(self.user, self.ids))
+        self.assertEqual(replay.failures, [])
+        self.assertEqual({name: route['requests'] for name, route in replay.summary().items()}, {
+            name: sum(route.name == name for route in stream) for name in ('taskapi export', 'async-task-list')
+        })
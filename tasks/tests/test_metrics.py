@@ -0,0 +1,100 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from tasks.metrics import known_routes, render_metrics, store
+from tasks.models import Task
+
+
+@override_settings(REQUEST_METRICS_FLUSH_SECONDS=0, TASK_CACHE_SHARED=True)
+class RequestMetricsTest(TestCase):
+    def setUp(self):
+        # Observations left pending by other tests would land in the counters read here
+        store.flush()
+        cache.clear()
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman", is_staff=True)
+        Task.objects.create(title='abcdefg1', description='test', user=self.user)
+        self.client.login(username="bruce_wayne", password="i_am_batman")
+
+    def metrics(self, **headers):
+        response = self.client.get(reverse('metrics'), **headers)
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode().splitlines()
+
+    def test_server_timing(self):
+        self.client.get(reverse('tasks-view'))
+        timing = self.client.get(reverse('tasks-view'))['Server-Timing']
+        self.assertRegex(timing, r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="2 queries", cache;desc="1 hits, 0 misses"$')
+        timing = self.client.get(reverse('api-task-detail', kwargs={'pk': Task.objects.get().id}))['Server-Timing']
+        self.assertRegex(timing, r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="3 queries"$')
+
+    def test_histograms_per_route(self):
+        self.client.get(reverse('tasks-view'))
+        self.client.get(reverse('tasks-view'))
+        self.client.get(reverse('api-task-list'))
+        lines = self.metrics()
+        self.assertIn('tasks_request_duration_seconds_count{route="tasks-view"} 2', lines)
+        self.assertIn('tasks_request_duration_seconds_count{route="api-task-list"} 1', lines)
+        self.assertIn('tasks_request_queries_bucket{route="tasks-view",le="+Inf"} 2', lines)
+        self.assertIn('tasks_request_cache_reads_total{route="tasks-view",outcome="hit"} 1', lines)
+        self.assertIn('tasks_request_cache_reads_total{route="tasks-view",outcome="miss"} 1', lines)
+        self.assertIn('tasks_requests_total{route="tasks-view",status="2xx"} 2', lines)
+        # The queries of the page : session and user on both requests, the tasks on the cache miss only
+        self.assertIn('tasks_request_queries_sum{route="tasks-view"} 5', lines)
+
+    def test_unnamed_and_unmatched_routes(self):
+        self.client.get('/taskapi')
+        self.client.get('/no-such-page/')
+        lines = self.metrics()
+        self.assertIn('tasks_requests_total{route="taskapi",status="2xx"} 1', lines)
+        self.assertIn('tasks_requests_total{route="unmatched",status="4xx"} 1', lines)
+        self.assertIn('taskapi', known_routes())
+
+    def test_scraping_needs_staff_or_the_token(self):
+        User.objects.create_user(username="clark_kent", password="i_am_superman")
+        self.client.login(username="clark_kent", password="i_am_superman")
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.client.logout()
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.metrics(HTTP_AUTHORIZATION='Bearer secret')
+
+    def test_quiet_processes_are_flushed(self):
+        # Nothing comes after the request to flush it, the timer does
+        with override_settings(REQUEST_METRICS_FLUSH_SECONDS=0.2):
+            store.flush()
+            self.client.get(reverse('tasks-view'))
+            self.assertNotIn('tasks_requests_total{route="tasks-view",status="2xx"} 1', render_metrics().splitlines())
+            time.sleep(0.5)
+        self.assertIn('tasks_requests_total{route="tasks-view",status="2xx"} 1', render_metrics().splitlines())
+
+    def test_counters_of_one_process_are_said_so(self):
+        self.assertFalse(self.metrics()[0].startswith('# Counters'))
+        with override_settings(TASK_CACHE_SHARED=False):
+            self.assertEqual(self.metrics()[0], '# Counters of the process serving this scrape only : TASK_CACHE_SHARED is off')
+
+    @override_settings(REQUEST_SLOW_SECONDS=0, REQUEST_SLOW_STATEMENTS=1)
+    def test_slow_request_log(self):
+        with self.assertLogs('tasks.requests', 'WARNING') as logs:
+            self.client.get(reverse('api-task-list'))
+        self.assertEqual(len(logs.output), 1)
+        message = logs.output[0]
+        self.assertIn('GET /api/task/ (api-task-list)', message)
+        self.assertEqual(message.count(' ms : SELECT'), 1)
+
+
+@override_settings(REQUEST_METRICS_FLUSH_SECONDS=0)
+class AsyncRequestMetricsTest(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
+        Task.objects.create(title='abcdefg1', description='test', user=self.user)
+        self.client.login(username="bruce_wayne", password="i_am_batman")
+
+    async def test_queries_of_the_read_threads_are_counted(self):
+        self.async_client.cookies = self.client.cookies
+        response = await self.async_client.get(reverse('async-task-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
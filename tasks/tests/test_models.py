@@ -0,0 +1,194 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from tasks.models import STATUS_CHOICES, Task, TaskStats, TaskStatusChange, TaskStatusRollup, bucket_starts
+
+
+class TaskStatusHistoryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
+        self.task_one = Task.objects.create(title='abcdefg1', description='test', priority=1, status = STATUS_CHOICES[0][0] , user=self.user)
+        self.task_two = Task.objects.create(title='abcdefg2', description='test', priority=2, status = STATUS_CHOICES[0][0] , user=self.user)
+
+    def history(self, task):
+        return list(TaskStatusChange.objects.filter(task=task).order_by('id').values_list('old_status', 'new_status'))
+
+    def test_create_records_no_history(self):
+        self.assertEqual(TaskStatusChange.objects.count(), 0)
+
+    def test_save_with_status_change_records_history_without_reading(self):
+        Task.objects.filter(id=self.task_two.id).update_status(STATUS_CHOICES[1][0])
+        task = Task.objects.get(id=self.task_one.id)
+        task.status = STATUS_CHOICES[1][0]
+        # UPDATE of the task and INSERT of the history row, and for the rollups the time the task entered its status,
+        # the buckets it falls in and their UPDATE
+        with self.assertNumQueries(5):
+            task.save()
+        self.assertEqual(self.history(task), [(STATUS_CHOICES[0][0], STATUS_CHOICES[1][0])])
+
+    def test_save_without_status_change_records_nothing(self):
+        task = Task.objects.get(id=self.task_one.id)
+        task.title = 'abcdefg11'
+        with self.assertNumQueries(1):
+            task.save()
+        self.assertEqual(self.history(task), [])
+
+    def test_consecutive_saves_track_the_saved_status(self):
+        task = Task.objects.get(id=self.task_one.id)
+        task.status = STATUS_CHOICES[1][0]
+        task.save()
+        task.save()
+        task.status = STATUS_CHOICES[2][0]
+        task.save()
+        self.assertEqual(self.history(task), [(STATUS_CHOICES[0][0], STATUS_CHOICES[1][0]), (STATUS_CHOICES[1][0], STATUS_CHOICES[2][0])])
+
+    def test_deferred_status_is_not_loaded(self):
+        with self.assertNumQueries(1):
+            tasks = list(Task.objects.only('id', 'title'))
+        task = tasks[0]
+        task.status = STATUS_CHOICES[3][0]
+        task.save(update_fields=['status'])
+        self.assertEqual(self.history(task), [(STATUS_CHOICES[0][0], STATUS_CHOICES[3][0])])
+
+    def test_queryset_update_status_records_history(self):
+        Task.objects.filter(id=self.task_two.id).update(status=STATUS_CHOICES[1][0])
+        updated = Task.objects.filter(user=self.user).update_status(STATUS_CHOICES[1][0])
+        self.assertEqual(updated, 1)
+        self.assertEqual(self.history(self.task_one), [(STATUS_CHOICES[0][0], STATUS_CHOICES[1][0])])
+        self.assertEqual(self.history(self.task_two), [])
+
+    def test_bulk_update_with_history(self):
+        tasks = list(Task.objects.filter(user=self.user).order_by('id'))
+        tasks[0].status = STATUS_CHOICES[2][0]
+        tasks[1].title = 'abcdefg22'
+        Task.objects.bulk_update_with_history(tasks, ['status', 'title'])
+        self.assertEqual(self.history(self.task_one), [(STATUS_CHOICES[0][0], STATUS_CHOICES[2][0])])
+        self.assertEqual(self.history(self.task_two), [])
+        self.assertFalse(tasks[0].status_changed())
+
+
+class TaskStatsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
+        self.task_one = Task.objects.create(title='abcdefg1', description='test', priority=1, status = STATUS_CHOICES[0][0] , user=self.user)
+        self.task_two = Task.objects.create(title='abcdefg2', description='test', priority=2, status = STATUS_CHOICES[0][0] , user=self.user, completed=True)
+
+    def assertCounts(self, all_count, completed_count):
+        stats = TaskStats.objects.get(user=self.user)
+        self.assertEqual((stats.all_count, stats.completed_count), (all_count, completed_count))
+        TaskStats.objects.rebuild([self.user.id])
+        stats = TaskStats.objects.get(user=self.user)
+        self.assertEqual((stats.all_count, stats.completed_count), (all_count, completed_count))
+
+    def test_create_counts_tasks(self):
+        self.assertCounts(2, 1)
+
+    def test_save_adjusts_counts(self):
+        task = Task.objects.get(id=self.task_one.id)
+        task.completed = True
+        task.save()
+        self.assertCounts(2, 2)
+        task.deleted = True
+        task.save()
+        self.assertCounts(1, 1)
+
+    def test_queryset_helpers_adjust_counts(self):
+        Task.objects.filter(id=self.task_one.id).mark_completed()
+        self.assertCounts(2, 2)
+        Task.objects.filter(user=self.user).soft_delete()
+        self.assertCounts(0, 0)
+        Task.objects.filter(user=self.user).soft_delete()
+        self.assertCounts(0, 0)
+
+    def test_bulk_update_with_history_adjusts_counts(self):
+        tasks = list(Task.objects.filter(user=self.user).order_by('id'))
+        tasks[0].completed = True
+        tasks[1].deleted = True
+        Task.objects.bulk_update_with_history(tasks, ['completed', 'deleted'])
+        self.assertCounts(1, 1)
+
+    def test_hard_delete_adjusts_counts(self):
+        Task.objects.get(id=self.task_two.id).delete()
+        self.assertCounts(1, 0)
+
+    def test_hard_delete_without_counters(self):
+        TaskStats.objects.all().delete()
+        Task.objects.get(id=self.task_two.id).delete()
+        stats = TaskStats.objects.for_user(self.user)
+        self.assertEqual((stats.all_count, stats.completed_count), (1, 0))
+        self.assertCounts(1, 0)
+
+    def test_missing_counters_are_rebuilt(self):
+        TaskStats.objects.all().delete()
+        self.assertEqual(TaskStats.objects.for_user(self.user).all_count, 2)
+        Task.objects.create(title='abcdefg3', description='test', priority=3, user=self.user)
+        self.assertCounts(3, 1)
+
+    def test_rebuild_command(self):
+        TaskStats.objects.filter(user=self.user).update(all_count=10, completed_count=10)
+        call_command('rebuild_task_stats', stdout=StringIO())
+        self.assertCounts(2, 1)
+
+
+class TaskStatusRollupTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
+        self.task_one = Task.objects.create(title='abcdefg1', description='test', priority=1, status = STATUS_CHOICES[0][0] , user=self.user)
+        self.task_two = Task.objects.create(title='abcdefg2', description='test', priority=2, status = STATUS_CHOICES[0][0] , user=self.user)
+
+    def rollups(self, period='day'):
+        return {
+            status: (entered, exited, round(seconds / 60))
+            for status, entered, exited, seconds in TaskStatusRollup.objects.filter(user=self.user, period=period).values_list(
+                'status', 'entered', 'exited', 'seconds_in_status'
+            )
+        }
+
+    def assertRollups(self, expected):
+        for period in ('day', 'week'):
+            self.assertEqual(self.rollups(period), expected)
+        TaskStatusRollup.objects.rebuild([self.user.id])
+        for period in ('day', 'week'):
+            self.assertEqual(self.rollups(period), expected)
+
+    def test_status_changes_are_rolled_up(self):
+        Task.objects.filter(created_date__isnull=False).update(created_date=timezone.now() - timedelta(minutes=30))
+        task = Task.objects.get(id=self.task_one.id)
+        task.status = STATUS_CHOICES[1][0]
+        task.save()
+        # Backdated as if the task had been created 40 minutes ago and its status changed 10 minutes ago
+        Task.objects.filter(id=task.id).update(created_date=timezone.now() - timedelta(minutes=40))
+        TaskStatusChange.objects.filter(task=task).update(timestamp=timezone.now() - timedelta(minutes=10))
+        Task.objects.filter(user=self.user).update_status(STATUS_CHOICES[2][0])
+        self.assertRollups({
+            STATUS_CHOICES[0][0]: (0, 2, 60),
+            STATUS_CHOICES[1][0]: (1, 1, 10),
+            STATUS_CHOICES[2][0]: (2, 0, 0),
+        })
+
+    def test_bulk_update_with_history_is_rolled_up(self):
+        tasks = list(Task.objects.filter(user=self.user))
+        for task in tasks:
+            task.status = STATUS_CHOICES[3][0]
+        Task.objects.bulk_update_with_history(tasks, ['status'])
+        self.assertRollups({STATUS_CHOICES[0][0]: (0, 2, 0), STATUS_CHOICES[3][0]: (2, 0, 0)})
+
+    def test_buckets(self):
+        day = timezone.now().date()
+        Task.objects.filter(id=self.task_one.id).update_status(STATUS_CHOICES[1][0])
+        self.assertEqual(
+            set(TaskStatusRollup.objects.filter(status=STATUS_CHOICES[1][0]).values_list('period', 'start')), set(bucket_starts(day))
+        )
+        self.assertEqual(dict(bucket_starts(day))['week'].weekday(), 0)
+
+    def test_rebuild_command(self):
+        Task.objects.filter(id=self.task_one.id).update_status(STATUS_CHOICES[1][0])
+        TaskStatusRollup.objects.update(entered=10)
+        call_command('rebuild_task_rollups', stdout=StringIO())
+        self.assertEqual(self.rollups()[STATUS_CHOICES[1][0]], (1, 0, 0))
+
@@ -0,0 +1,87 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from tasks.models import Notification, NotificationReadState
+from tasks.notifications import compact_notifications
+
+
+class NotificationReadStateTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
+        self.ids = [Notification.objects.create(user=self.user, content=f'report {i}').id for i in range(5)]
+        self.state = NotificationReadState.objects.locked(self.user)
+
+    def unread(self):
+        return list(self.state.unread(Notification.objects.filter(user=self.user)).order_by('id').values_list('id', flat=True))
+
+    def test_out_of_order_reads_are_kept_above_the_watermark(self):
+        self.state.mark_read([self.ids[1], self.ids[3]])
+        self.assertEqual((self.state.read_through, self.state.read_ids), (0, [self.ids[1], self.ids[3]]))
+        self.assertEqual(self.unread(), [self.ids[0], self.ids[2], self.ids[4]])
+
+    def test_reads_in_order_move_the_watermark(self):
+        self.state.mark_read([self.ids[1], self.ids[3]])
+        self.state.mark_read([self.ids[0]])
+        self.assertEqual((self.state.read_through, self.state.read_ids), (self.ids[1], [self.ids[3]]))
+        self.state.mark_read([self.ids[2], self.ids[4]])
+        self.assertEqual((self.state.read_through, self.state.read_ids), (self.ids[4], []))
+        self.assertEqual(self.unread(), [])
+
+    def test_deleted_notifications_do_not_hold_the_watermark(self):
+        self.state.mark_read([self.ids[2]])
+        Notification.objects.filter(id__in=self.ids[:2]).delete()
+        self.state.mark_read([self.ids[4]])
+        self.assertEqual((self.state.read_through, self.state.read_ids), (self.ids[2], [self.ids[4]]))
+
+    def test_read_through(self):
+        self.state.mark_read([self.ids[4]])
+        self.state.mark_read_through(self.ids[2])
+        self.assertEqual((self.state.read_through, self.state.read_ids), (self.ids[2], [self.ids[4]]))
+        self.assertTrue(self.state.is_read(self.ids[4]))
+        self.assertFalse(self.state.is_read(self.ids[3]))
+
+
+class CompactNotificationsTest(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.users = [User.objects.create_user(username=f"user_{i}", password="i_am_batman") for i in range(2)]
+        for user in self.users:
+            for days in (200, 150, 100, 10):
+                notification = Notification.objects.create(user=user, content=f'report of {user.username}')
+                # auto_now sets the time on save, an update sets it in the past
+                Notification.objects.filter(id=notification.id).update(timestamp=self.now - timedelta(days=days))
+
+    def test_summarize_keeps_one_notification_per_user(self):
+        deleted = compact_notifications(self.now, days=90, policy='summarize', batch_size=3)
+        self.assertEqual(deleted, 4)
+        for user in self.users:
+            summary, recent = Notification.objects.filter(user=user).order_by('id')
+            self.assertEqual(summary.count, 3)
+            self.assertEqual(summary.timestamp.date(), (self.now - timedelta(days=100)).date())
+            self.assertIn('3 notifications', summary.content)
+            self.assertEqual((recent.count, recent.content), (1, f'report of {user.username}'))
+
+    def test_summaries_are_compacted_again(self):
+        compact_notifications(self.now, days=120, policy='summarize')
+        compact_notifications(self.now, days=90, policy='summarize')
+        for user in self.users:
+            self.assertEqual(list(Notification.objects.filter(user=user).order_by('id').values_list('count', flat=True)), [3, 1])
+
+    def test_delete(self):
+        self.assertEqual(compact_notifications(self.now, days=90, policy='delete', batch_size=2), 6)
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            compact_notifications(self.now, policy='archive')
+
+    def test_command(self):
+        out = StringIO()
+        call_command('compact_notifications', '--days', '90', '--policy', 'delete', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'Compacted 6 notifications')
+        self.assertEqual(Notification.objects.count(), 2)
@@ -0,0 +1,114 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from tasks.models import STATUS_CHOICES, Task
+from tasks.pagination import InvalidCursor, KeysetPaginator, decode_cursor, encode_cursor
+
+
+class KeysetPaginatorTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
+        for priority in range(1, 8):
+            Task.objects.create(title=f'abcdefg{priority}', description='test', priority=priority, status = STATUS_CHOICES[0][0] , user=self.user, completed = priority % 2 == 0)
+        self.tasks = Task.objects.filter(user=self.user, deleted=False)
+
+    def titles(self, page):
+        return [task.title for task in page]
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor([True, 3, 12], reverse=True), 3), ([True, 3, 12], True))
+
+    def test_invalid_cursors(self):
+        for cursor in ('garbage', encode_cursor([1, 2]), encode_cursor(['1', 2, 3]), 'é'):
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor, 3)
+
+    def test_pages_forward_and_back(self):
+        paginator = KeysetPaginator(self.tasks, ('completed', 'priority', 'id'), 3)
+        first = paginator.page()
+        self.assertEqual(self.titles(first), ['abcdefg1', 'abcdefg3', 'abcdefg5'])
+        self.assertFalse(first.has_previous())
+        second = paginator.page(first.next_cursor)
+        self.assertEqual(self.titles(second), ['abcdefg7', 'abcdefg2', 'abcdefg4'])
+        third = paginator.page(second.next_cursor)
+        self.assertEqual(self.titles(third), ['abcdefg6'])
+        self.assertFalse(third.has_next())
+        back = paginator.page(third.previous_cursor)
+        self.assertEqual(self.titles(back), self.titles(second))
+        back = paginator.page(back.previous_cursor)
+        self.assertEqual(self.titles(back), self.titles(first))
+        self.assertFalse(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_descending_fields(self):
+        paginator = KeysetPaginator(self.tasks, ('completed', '-priority', 'id'), 3)
+        first = paginator.page()
+        self.assertEqual(self.titles(first), ['abcdefg7', 'abcdefg5', 'abcdefg3'])
+        second = paginator.page(first.next_cursor)
+        self.assertEqual(self.titles(second), ['abcdefg1', 'abcdefg6', 'abcdefg4'])
+        self.assertEqual(self.titles(paginator.page(second.previous_cursor)), ['abcdefg7', 'abcdefg5', 'abcdefg3'])
+        self.assertEqual(self.titles(paginator.page(second.next_cursor)), ['abcdefg2'])
+
+    def test_ties_are_broken_by_id(self):
+        Task.objects.filter(user=self.user).update(priority=1, completed=False)
+        paginator = KeysetPaginator(self.tasks, ('priority', 'id'), 2)
+        seen = []
+        page = paginator.page()
+        while True:
+            seen += [task.id for task in page]
+            if not page.has_next():
+                break
+            page = paginator.page(page.next_cursor)
+        self.assertEqual(seen, list(self.tasks.order_by('id').values_list('id', flat=True)))
+
+    def test_page_runs_no_count(self):
+        paginator = KeysetPaginator(self.tasks, ('priority', 'id'), 3)
+        with CaptureQueriesContext(connection) as queries:
+            paginator.page(paginator.page().next_cursor)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+        self.assertIsNone(paginator.count)
+        self.assertEqual(KeysetPaginator(self.tasks, ('priority', 'id'), 3, count=lambda: 7).count, 7)
+
+
+class KeysetPaginationViewTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
+        for priority in range(1, 8):
+            Task.objects.create(title=f'abcdefg{priority}', description='test', priority=priority, status = STATUS_CHOICES[0][0] , user=self.user)
+        self.client.login(username="bruce_wayne", password="i_am_batman")
+
+    def test_task_list_next_page(self):
+        response = self.client.get(reverse('tasks-view'))
+        page = response.context['page_obj']
+        self.assertContains(response, f'?cursor={page.next_cursor}')
+        response = self.client.get(reverse('tasks-view'), {'cursor': page.next_cursor})
+        self.assertEqual([task.title for task in response.context['tasks']], ['abcdefg6', 'abcdefg7'])
+
+    def test_task_list_invalid_cursor(self):
+        response = self.client.get(reverse('tasks-view'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_api_task_list_pages(self):
+        response = self.client.get(reverse('api-task-list'), {'page_size': 4})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 7)
+        self.assertIsNone(response.data['previous'])
+        self.assertEqual(len(response.data['results']), 4)
+        response = self.client.get(response.data['next'])
+        self.assertEqual([task['title'] for task in response.data['results']], ['abcdefg5', 'abcdefg6', 'abcdefg7'])
+        self.assertIsNone(response.data['next'])
+        self.assertIn('page_size=4', response.data['previous'])
+
+    def test_api_task_list_filtered_has_no_count(self):
+        response = self.client.get(reverse('api-task-list'), {'title': 'abc'})
+        self.assertIsNone(response.data['count'])
+        self.assertEqual(len(response.data['results']), 7)
+
+    def test_api_task_list_invalid_cursor(self):
+        response = self.client.get(reverse('api-task-list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
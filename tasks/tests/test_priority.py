@@ -0,0 +1,116 @@
+import random
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+
+from tasks.models import Task
+from tasks.priority import PriorityLayout, find_collision_run, make_room_for_priority
+
+
+class MakeRoomForPriorityTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
+        self.other_user = User.objects.create_user(username="clark_kent", email="clark@dailyplanet.com", password="i_am_superman")
+
+    def priorities(self):
+        return list(Task.objects.filter(user=self.user).order_by('id').values_list('priority', flat=True))
+
+    def test_free_priority_is_left_untouched(self):
+        Task.objects.create(title='abcdefg1', description='test', priority=2, user=self.user)
+        self.assertIsNone(find_collision_run(self.user, 1))
+        self.assertEqual(make_room_for_priority(self.user, 1), 0)
+        self.assertEqual(self.priorities(), [2])
+
+    def test_run_is_shifted_up_to_the_first_gap(self):
+        for priority in (1, 2, 3, 5):
+            Task.objects.create(title=f'abcdefg{priority}', description='test', priority=priority, user=self.user)
+        self.assertEqual(find_collision_run(self.user, 1), 3)
+        self.assertEqual(make_room_for_priority(self.user, 1), 3)
+        self.assertEqual(self.priorities(), [2, 3, 4, 5])
+
+    def test_completed_deleted_and_foreign_tasks_do_not_collide(self):
+        Task.objects.create(title='abcdefg1', description='test', priority=1, user=self.user)
+        Task.objects.create(title='abcdefg2', description='test', priority=2, user=self.user, completed=True)
+        Task.objects.create(title='abcdefg3', description='test', priority=2, user=self.user, deleted=True)
+        Task.objects.create(title='abcdefg4', description='test', priority=1, user=self.other_user)
+        make_room_for_priority(self.user, 1)
+        self.assertEqual(self.priorities(), [2, 2, 2])
+        self.assertEqual(Task.objects.get(user=self.other_user).priority, 1)
+
+    def test_excluded_task_slot_is_vacated(self):
+        task_one = Task.objects.create(title='abcdefg1', description='test', priority=1, user=self.user)
+        task_two = Task.objects.create(title='abcdefg2', description='test', priority=2, user=self.user)
+        Task.objects.create(title='abcdefg3', description='test', priority=3, user=self.user)
+        make_room_for_priority(self.user, 1, exclude_pk=task_two.pk)
+        self.assertEqual(Task.objects.get(id=task_one.id).priority, 2)
+        self.assertEqual(self.priorities(), [2, 2, 3])
+
+    def test_query_count_does_not_depend_on_run_length(self):
+        Task.objects.bulk_create(Task(title=f'task {i}', description='test', priority=i, user=self.user) for i in range(1, 201))
+        # savepoint, gap query, UPDATE, savepoint release
+        with self.assertNumQueries(4):
+            make_room_for_priority(self.user, 1)
+        self.assertEqual(sorted(self.priorities()), list(range(2, 202)))
+
+
+def sequential_insert(priorities, key, priority):
+    """
+    make_room_for_priority then save, on a {key: priority} dict of the active tasks
+    """
+    occupied = set(priorities.values())
+    if priority in occupied:
+        end = priority
+        while end + 1 in occupied:
+            end += 1
+        for other, other_priority in priorities.items():
+            if priority <= other_priority <= end:
+                priorities[other] = other_priority + 1
+    if key is not None:
+        priorities[key] = priority
+
+
+class PriorityLayoutTest(SimpleTestCase):
+    def test_insert_shifts_the_run_up_to_the_first_gap(self):
+        layout = PriorityLayout([(1, 'a'), (2, 'b'), (3, 'c'), (5, 'd')])
+        layout.insert('e', 1)
+        self.assertEqual(layout.priorities(), {'e': 1, 'a': 2, 'b': 3, 'c': 4, 'd': 5})
+        self.assertEqual(layout.moved(), {'a': 2, 'b': 3, 'c': 4})
+
+    def test_removed_task_leaves_a_gap(self):
+        layout = PriorityLayout([(1, 'a'), (2, 'b'), (3, 'c')])
+        layout.remove('b')
+        layout.insert('d', 1)
+        self.assertEqual(layout.priorities(), {'d': 1, 'a': 2, 'c': 3})
+
+    def test_place_and_make_room(self):
+        layout = PriorityLayout([(1, 'a'), (2, 'b')])
+        layout.place('c', 2)
+        layout.make_room(1)
+        self.assertEqual(layout.priorities(), {'a': 2, 'b': 3, 'c': 3})
+
+    def test_matches_sequential_moves(self):
+        generator = random.Random(42)
+        for _ in range(200):
+            slots = sorted((generator.randint(1, 15), key) for key in range(generator.randint(0, 10)))
+            layout = PriorityLayout(slots)
+            expected = {key: priority for priority, key in slots}
+            for step in range(20):
+                key, priority = f'new{step}', generator.randint(1, 20)
+                move = generator.random()
+                if move < 0.5:
+                    layout.insert(key, priority)
+                    sequential_insert(expected, key, priority)
+                elif move < 0.7 and expected:
+                    key = generator.choice(sorted(expected, key=str))
+                    layout.remove(key)
+                    expected.pop(key)
+                    layout.insert(key, priority)
+                    sequential_insert(expected, key, priority)
+                elif move < 0.85 and expected:
+                    key = generator.choice(sorted(expected, key=str))
+                    layout.remove(key)
+                    expected.pop(key)
+                else:
+                    layout.make_room(priority)
+                    sequential_insert(expected, None, priority)
+                self.assertEqual(layout.priorities(), expected)
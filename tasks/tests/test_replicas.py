@@ -0,0 +1,113 @@
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from tasks.cache import mark_recent_writes, task_cache
+from tasks.management.commands.sync_replica import copy_database
+from tasks.models import ReportConfig, Task, TaskStats
+from tasks.replicas import replica_reads
+from tasks.reports import send_due_reports
+
+
+@override_settings(DATABASE_REPLICA='replica', TASK_CACHE_SHARED=True)
+class ReplicaRoutingTest(TransactionTestCase):
+    """
+    Two SQLite files, the primary and a replica copied from it : the tasks created after the copy are only on the
+    primary, a read that finds them did not go to the replica. The replica is not a test database : it is added once
+    the test databases are set up, and overwritten by each copy.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        connections.settings['replica'] = {**connections['default'].settings_dict, 'NAME': f'{cls.directory}/replica.sqlite3'}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        shutil.rmtree(cls.directory)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='bruce_wayne', email='bruce@wayne.org', password='i_am_batman')
+        self.task = Task.objects.create(title='replicated', description='test', user=self.user)
+        copy_database(connections['default'], connections['replica'])
+        self.unreplicated = Task.objects.create(title='not replicated', description='test', user=self.user)
+        # The writes above are older than the sticky window
+        task_cache().clear()
+        self.client.login(username='bruce_wayne', password='i_am_batman')
+
+    def task_titles(self):
+        response = self.client.get(reverse('api-task-list'))
+        self.assertEqual(response.status_code, 200)
+        return [task['title'] for task in response.json()['results']]
+
+    def test_lists_read_the_replica(self):
+        self.assertEqual(self.task_titles(), ['replicated'])
+        response = self.client.get(reverse('tasks-view'))
+        self.assertContains(response, 'replicated')
+        self.assertNotContains(response, 'not replicated')
+        self.assertEqual(self.client.get(reverse('api-task-detail', args=[self.unreplicated.id])).status_code, 404)
+
+    def test_reads_stick_to_the_primary_after_a_write(self):
+        response = self.client.post(reverse('api-task-list'), {'title': 'created', 'description': 'test'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sorted(self.task_titles()), ['created', 'not replicated', 'replicated'])
+        self.assertEqual(self.client.get(reverse('api-task-detail', args=[self.unreplicated.id])).status_code, 200)
+        # Once the window is over the replica serves the user again
+        task_cache().clear()
+        self.assertEqual(self.task_titles(), ['replicated'])
+
+    def test_counters_missing_on_the_replica_are_rebuilt_on_the_primary(self):
+        TaskStats.objects.using('replica').all().delete()
+        TaskStats.objects.all().delete()
+        response = self.client.get(reverse('all-tasks-view'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['all_count'], 2)
+        task_cache().clear()
+        TaskStats.objects.all().delete()
+        self.assertEqual(self.task_titles(), ['replicated'])
+        self.assertEqual(TaskStats.objects.using('default').get(user=self.user).all_count, 2)
+
+    def test_writes_go_to_the_primary(self):
+        with replica_reads() as alias:
+            self.assertEqual(alias, 'replica')
+            task = Task.objects.get(id=self.task.id)
+            task.title = 'renamed'
+            task.save()
+        self.assertEqual(Task.objects.using('default').get(id=self.task.id).title, 'renamed')
+        self.assertEqual(Task.objects.using('replica').get(id=self.task.id).title, 'replicated')
+
+    def test_transactions_read_the_primary(self):
+        with replica_reads():
+            self.assertEqual(Task.objects.count(), 1)
+            with transaction.atomic():
+                self.assertEqual(Task.objects.count(), 2)
+
+    def test_sticky_users_read_the_primary(self):
+        mark_recent_writes([self.user.id])
+        with replica_reads(self.user.id) as alias:
+            self.assertEqual(alias, 'default')
+            self.assertEqual(Task.objects.count(), 2)
+
+    def test_replica_needs_a_shared_cache(self):
+        with override_settings(TASK_CACHE_SHARED=False), self.assertRaises(ImproperlyConfigured):
+            with replica_reads():
+                pass
+
+    def test_report_aggregation_reads_the_replica(self):
+        now = timezone.now()
+        ReportConfig.objects.create(user=self.user, time=(now - timedelta(minutes=1)).time())
+        ReportConfig.objects.update(next_send_at=now - timedelta(minutes=1))
+        self.assertEqual(send_due_reports(now), [self.user.email])
+        self.assertIn('PENDING : 1', mail.outbox[0].body)
@@ -0,0 +1,89 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from tasks.models import STATUS_CHOICES, Task
+from tasks.search import search_tasks
+
+
+class SearchTasksTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
+        self.other_user = User.objects.create_user(username="clark_kent", email="clark@kent.org", password="i_am_superman")
+        self.batmobile = Task.objects.create(title='Repair the batmobile', description='New tyres', priority=1, user=self.user)
+        self.cave = Task.objects.create(title='Clean the cave', description='Mind the batmobile parts', priority=2, user=self.user)
+        self.planet = Task.objects.create(title='Write for the planet', description='Batmobile sighting', priority=1, user=self.other_user)
+
+    def search(self, term, user=None):
+        tasks = Task.objects.filter(deleted=False)
+        if user is not None:
+            tasks = tasks.filter(user=user)
+        return list(search_tasks(tasks, term, user=user).order_by('search_rank', 'id'))
+
+    def test_matches_title_and_description_ranked(self):
+        self.assertEqual(self.search('batmobile', self.user), [self.batmobile, self.cave])
+
+    def test_matches_word_prefixes_case_insensitively(self):
+        self.assertEqual(self.search('BATM', self.user), [self.batmobile, self.cave])
+        self.assertEqual(self.search('tyr rep', self.user), [self.batmobile])
+        self.assertEqual(self.search('mobile', self.user), [])
+
+    def test_user_restricts_the_index_search(self):
+        self.assertEqual(self.search('batmobile', self.other_user), [self.planet])
+        self.assertEqual(set(self.search('batmobile')), {self.batmobile, self.cave, self.planet})
+        # The owner tokens are not searchable as text
+        self.assertEqual(self.search(f'u{self.user.id}'), [])
+
+    def test_term_without_words_matches_nothing(self):
+        self.assertEqual(self.search('"*:()', self.user), [])
+
+    def test_index_follows_task_writes(self):
+        task = Task.objects.get(id=self.cave.id)
+        task.title = 'Sweep the cave'
+        task.save()
+        Task.objects.filter(id=self.batmobile.id).update(description='Joker sighting')
+        self.assertEqual(self.search('sweep', self.user), [self.cave])
+        self.assertEqual(self.search('clean', self.user), [])
+        self.assertEqual(self.search('joker', self.user), [self.batmobile])
+        Task.objects.filter(id=self.planet.id).update(user=self.user)
+        self.assertEqual(self.search('planet', self.user), [self.planet])
+        self.assertEqual(self.search('planet', self.other_user), [])
+        Task.objects.filter(id=self.planet.id).delete()
+        self.assertEqual(self.search('planet', self.user), [])
+
+    def test_search_uses_full_text_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('The FTS5 table only exists on SQLite')
+        plan = search_tasks(Task.objects.filter(user=self.user, deleted=False), 'batmobile', user=self.user).explain()
+        self.assertIn('VIRTUAL TABLE INDEX', plan)
+        self.assertNotIn('LIKE', str(search_tasks(Task.objects.all(), 'batmobile').query))
+
+
+class SearchViewsTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
+        for priority in range(1, 6):
+            Task.objects.create(title=f'abcdefg{priority}', description='gotham ' * priority, priority=priority, status = STATUS_CHOICES[0][0] , user=self.user)
+        Task.objects.create(title='unrelated', description='metropolis', priority=6, user=self.user)
+        self.client.login(username="bruce_wayne", password="i_am_batman")
+
+    def test_task_list_search_description(self):
+        response = self.client.get(reverse('tasks-view'), {'search': 'goth'})
+        self.assertEqual(len(response.context['tasks']), 5)
+        self.assertNotContains(response, 'unrelated')
+
+    def test_api_search_pages_ranked_results(self):
+        response = self.client.get(reverse('api-task-list'), {'search': 'gotham', 'page_size': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['count'])
+        titles = [task['title'] for task in response.data['results']]
+        response = self.client.get(response.data['next'])
+        titles += [task['title'] for task in response.data['results']]
+        self.assertIsNone(response.data['next'])
+        # More occurrences of the term rank higher
+        self.assertEqual(titles, [f'abcdefg{priority}' for priority in range(5, 0, -1)])
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([task['title'] for task in response.data['results']], titles[:3])
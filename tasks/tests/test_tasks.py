@@ -1,22 +1,164 @@
 import datetime
 from datetime import datetime, timedelta
+from unittest import mock
 
 from celery.contrib.testing.worker import start_worker
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from task_manager.celery import app
-from tasks.models import STATUS_CHOICES, Notification, ReportConfig, Task
-from tasks.tasks import send_task_summary
+from tasks.models import STATUS_CHOICES, Notification, ReportConfig, ReportDelivery, Task
+from tasks.reports import REPORT_CLAIM_TIMEOUT, purge_report_deliveries, report_shards, send_due_reports
+from tasks.tasks import send_report_shard, send_task_summary
 
 
 class TestCelery(TestCase):
     def setUp(self):
         start_worker(app)
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', False)
         self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
         self.task_one = Task.objects.create(title='abcdefg', description='test', priority=1, status = STATUS_CHOICES[0][0] , user=self.user)
         self.report_config = ReportConfig.objects.create(user = self.user, time = (datetime.now() - timedelta(hours=1)).time())
 
     def test_send_task_summary(self):
         result = send_task_summary.apply().get()
-        self.assertIn(self.user.email, result)
+        self.assertEqual(result, [(self.user.id, self.user.id)])
+        self.assertEqual([message.to for message in mail.outbox], [[self.user.email]])
         self.assertEqual(Notification.objects.filter(user=self.user).count(), 1)
+
+
+class SendDueReportsTest(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.users = [User.objects.create_user(username=f"user_{i}", email=f"user_{i}@wayne.org", password="i_am_batman") for i in range(3)]
+        for user in self.users:
+            Task.objects.create(title='abcdefg', description='test', priority=1, status = STATUS_CHOICES[0][0] , user=user)
+            ReportConfig.objects.create(user = user, time = (self.now - timedelta(minutes=1)).time())
+        ReportConfig.objects.update(next_send_at = self.now - timedelta(minutes=1))
+
+    def test_due_reports_are_sent_once(self):
+        with self.assertLogs('tasks.reports', 'INFO') as logs:
+            result = send_due_reports(self.now)
+        self.assertEqual(logs.output, ['INFO:tasks.reports:Completed task summary email for 3 users'])
+        self.assertEqual(sorted(result), sorted(user.email for user in self.users))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertIn('PENDING : 1', mail.outbox[0].body)
+        self.assertEqual(Notification.objects.count(), 3)
+        self.assertEqual(send_due_reports(self.now + timedelta(hours=1)), [])
+        for config in ReportConfig.objects.all():
+            self.assertEqual(config.last_sent_time, self.now)
+            self.assertGreater(config.next_send_at, self.now)
+
+    def test_reports_not_due_are_not_sent(self):
+        ReportConfig.objects.filter(user=self.users[0]).update(next_send_at = self.now + timedelta(minutes=5))
+        result = send_due_reports(self.now)
+        self.assertNotIn(self.users[0].email, result)
+        self.assertEqual(len(result), 2)
+
+    def test_query_count_does_not_depend_on_user_count(self):
+        with CaptureQueriesContext(connection) as few_users:
+            send_due_reports(self.now)
+        for i in range(3, 10):
+            user = User.objects.create_user(username=f"user_{i}", email=f"user_{i}@wayne.org", password="i_am_batman")
+            Task.objects.create(title='abcdefg', description='test', priority=1, status = STATUS_CHOICES[0][0] , user=user)
+            ReportConfig.objects.create(user = user, time = (self.now - timedelta(minutes=1)).time())
+        ReportConfig.objects.filter(last_sent_time__isnull = True).update(next_send_at = self.now - timedelta(minutes=1))
+        with CaptureQueriesContext(connection) as more_users:
+            send_due_reports(self.now)
+        self.assertEqual(len(mail.outbox), 10)
+        self.assertEqual(len(few_users), len(more_users))
+
+    def test_next_report_is_due_the_following_day(self):
+        config = ReportConfig.objects.get(user=self.users[0])
+        send_due_reports(self.now)
+        config.refresh_from_db()
+        self.assertEqual(config.next_send_at.date(), (self.now + timedelta(days=1)).date())
+        self.assertEqual(config.next_send_at.time(), config.time)
+
+
+class FlakyEmailBackend(EmailBackend):
+    """
+    Locmem backend that crashes once, when asked to send message number `crash_on`
+    """
+    crash_on = None
+    sent = 0
+
+    def send_messages(self, messages):
+        FlakyEmailBackend.sent += 1
+        if FlakyEmailBackend.sent == FlakyEmailBackend.crash_on:
+            raise ConnectionError("Simulated worker crash")
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='tasks.tests.test_tasks.FlakyEmailBackend')
+class ReportShardDeliveryTest(TestCase):
+    def setUp(self):
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', False)
+        FlakyEmailBackend.sent = 0
+        FlakyEmailBackend.crash_on = None
+        self.now = timezone.now()
+        self.users = [User.objects.create_user(username=f"user_{i}", email=f"user_{i}@wayne.org", password="i_am_batman") for i in range(5)]
+        for user in self.users:
+            ReportConfig.objects.create(user = user, time = (self.now - timedelta(minutes=1)).time())
+        ReportConfig.objects.update(next_send_at = self.now - timedelta(minutes=1))
+
+    def assertDeliveredOnce(self, users):
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), sorted(user.email for user in users))
+
+    def test_shards_partition_users_by_id_range(self):
+        shards = report_shards(self.now, shard_size=2)
+        self.assertEqual(shards, [(self.users[0].id, self.users[1].id), (self.users[2].id, self.users[3].id), (self.users[4].id, self.users[4].id)])
+
+    def test_shards_in_flight_are_not_queued_again(self):
+        with mock.patch('tasks.tasks.group') as group:
+            self.assertEqual(send_task_summary.apply().get(), [(self.users[0].id, self.users[-1].id)])
+            self.assertEqual(send_task_summary.apply().get(), [])
+            self.assertEqual(group.call_count, 1)
+            # The lease of a shard lost on the way expires like a claim
+            ReportConfig.objects.update(dispatched_at = timezone.now() - REPORT_CLAIM_TIMEOUT - timedelta(seconds=1))
+            self.assertEqual(send_task_summary.apply().get(), [(self.users[0].id, self.users[-1].id)])
+        send_due_reports(self.now)
+        self.assertFalse(ReportConfig.objects.filter(dispatched_at__isnull = False).exists())
+
+    def test_old_deliveries_are_purged(self):
+        today = self.now.date()
+        for user, days in zip(self.users, (0, 6, 7, 8, 30)):
+            ReportDelivery.objects.create(user = user, day = today - timedelta(days = days))
+        self.assertEqual(purge_report_deliveries(self.now, days = 7, batch_size = 1), 2)
+        self.assertEqual(sorted(ReportDelivery.objects.values_list('user_id', flat = True)), [user.id for user in self.users[:3]])
+
+    def test_dispatch_twice_sends_once(self):
+        send_task_summary.apply()
+        send_task_summary.apply()
+        self.assertDeliveredOnce(self.users)
+        self.assertEqual(Notification.objects.count(), 5)
+
+    def test_retry_after_crash_mid_batch_sends_each_report_once(self):
+        FlakyEmailBackend.crash_on = 3
+        send_report_shard.apply(args=(self.users[0].id, self.users[-1].id, self.now.isoformat()))
+        self.assertDeliveredOnce(self.users)
+        self.assertEqual(ReportDelivery.objects.filter(sent_at__isnull = False).count(), 5)
+        self.assertFalse(ReportConfig.objects.filter(next_send_at__lte = self.now).exists())
+
+    def test_crash_after_sending_does_not_resend(self):
+        with mock.patch('tasks.reports.reschedule', side_effect=ConnectionError("Simulated worker crash")):
+            with self.assertRaises(ConnectionError):
+                send_due_reports(self.now)
+        self.assertTrue(ReportConfig.objects.filter(next_send_at__lte = self.now).exists())
+        send_due_reports(self.now)
+        self.assertDeliveredOnce(self.users)
+        self.assertFalse(ReportConfig.objects.filter(next_send_at__lte = self.now).exists())
+
+    def test_claim_of_a_dead_worker_expires(self):
+        ReportDelivery.objects.create(user = self.users[0], day = (self.now - timedelta(minutes=1)).date(), claim_token = 'dead', claimed_at = timezone.now())
+        send_due_reports(self.now)
+        self.assertDeliveredOnce(self.users[1:])
+        ReportDelivery.objects.filter(claim_token = 'dead').update(claimed_at = timezone.now() - REPORT_CLAIM_TIMEOUT - timedelta(seconds=1))
+        send_due_reports(self.now)
+        self.assertDeliveredOnce(self.users)
@@ -2,10 +2,12 @@ import datetime
 
 from django.contrib.auth.models import User
 from django.contrib.sessions.middleware import SessionMiddleware
+from django.db import connection
 from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from tasks.models import STATUS_CHOICES, ReportConfig, Task
+from tasks.models import STATUS_CHOICES, ReportConfig, Task, TaskStatusChange
 
 from tasks.views import TaskCreateForm, session_storage_view
 
@@ -169,6 +171,12 @@ class GenericTaskUpdateViewTest(TestCase):
         self.assertEqual(Task.objects.filter(id=self.task_two.id).first().priority, 1)
         self.assertEqual(Task.objects.filter(id=self.task_four.id).first().priority, 4)
 
+    def test_generic_task_update_POST_completed_moves_to_completed_status(self):
+        self.client.login(username="bruce_wayne", password="i_am_batman")
+        self.client.post(reverse('update-task', kwargs = {'pk':self.task_two.id}), {'title':'abcdefg2','description':'test','priority':2,'completed':'on','status':STATUS_CHOICES[0][0]})
+        self.assertEqual(Task.objects.get(id=self.task_two.id).status, STATUS_CHOICES[2][0])
+        self.assertEqual(TaskStatusChange.objects.filter(task=self.task_two, new_status=STATUS_CHOICES[2][0]).count(), 1)
+
 
 class GenericAllTaskViewTest(TestCase):
     def setUp(self):
@@ -187,6 +195,16 @@ class GenericAllTaskViewTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertQuerysetEqual(response.context['all_tasks'],Task.objects.filter(deleted = False, user = self.user).order_by('completed','priority'))
 
+    def test_generic_list_all_tasks_GET_counts_from_task_stats(self):
+        self.client.login(username="bruce_wayne", password="i_am_batman")
+        Task.objects.filter(id=self.task_one.id).soft_delete()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('all-tasks-view'), follow=True)
+        self.assertContains(response, '1 of 1 tasks completed')
+        task_queries = [query['sql'] for query in queries if 'FROM "tasks_task"' in query['sql']]
+        # Only the page itself reads the Task table, the keyset paginator runs no COUNT
+        self.assertEqual(len(task_queries), 1)
+
 class GenericTaskCompleteListViewTest(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(username="bruce_wayne", email="bruce@wayne.org", password="i_am_batman")
@@ -1,15 +1,21 @@
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.views import LoginView
 from django.forms import ModelForm, NumberInput, TextInput, Textarea, TimeInput, ValidationError, Select
-from django.http import HttpResponse, HttpResponseRedirect
-from django.shortcuts import render
+from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.shortcuts import get_object_or_404, render
 from django.views import View
 from django.views.generic.detail import DetailView
 from django.views.generic.edit import CreateView, DeleteView, UpdateView
 from django.views.generic.list import ListView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import F
-from tasks.models import Task, ReportConfig
+from django.db import transaction
+from tasks.cache import CachedKeysetPageMixin, cached_read
+from tasks.metrics import PROMETHEUS_CONTENT_TYPE, render_metrics, scrape_allowed, store
+from tasks.models import COMPLETED_STATUS, ArchivedTask, Task, ReportConfig, TaskStats
+from tasks.pagination import KeysetPaginationMixin
+from tasks.priority import make_room_for_priority
+from tasks.replicas import ReplicaReadMixin
+from tasks.search import SEARCH_ORDERING, search_tasks
 from django.contrib.auth.models import User
 
 class AuthorizedTaskManager(LoginRequiredMixin):
@@ -56,6 +62,15 @@ class UserCreateView(CreateView):
     success_url = "/user/login"
 
 
+def metrics_view(request):
+    """
+    Per route request metrics of every process, in the Prometheus text format
+    """
+    if not scrape_allowed(request):
+        return HttpResponse(status=403)
+    store.flush()
+    return HttpResponse(render_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
+
 def session_storage_view(request):
     total_views = request.session.get('total_views', 0)
     request.session['total_views'] = total_views + 1
@@ -68,13 +83,20 @@ class GenericTaskDeleteView(AuthorizedTaskManager, DeleteView):
 
     def form_valid(self, form):
         success_url = self.get_success_url()
-        Task.objects.filter(id=self.object.id).update(deleted = True)
+        Task.objects.filter(id=self.object.id).soft_delete()
         return HttpResponseRedirect(success_url)
 
-class GenericTaskDetailView(AuthorizedTaskManager, DetailView):
+class GenericTaskDetailView(ReplicaReadMixin, AuthorizedTaskManager, DetailView):
     model = Task
     template_name = "task_detail.html"
 
+    def get_object(self, queryset=None):
+        try:
+            return super().get_object(queryset)
+        except Http404:
+            # Completed tasks moved to the archive keep their page, deleted ones stay gone
+            return get_object_or_404(ArchivedTask, pk = self.kwargs['pk'], deleted = False, user=self.request.user)
+
 
 
 class TaskCreateForm(ModelForm):
@@ -106,17 +128,14 @@ class GenericTaskUpdateView(AuthorizedTaskManager, UpdateView):
     success_url = "/tasks"
 
     def form_valid(self, form):
-        if 'priority' in form.changed_data and Task.objects.filter(priority=form.cleaned_data['priority'], deleted = False, completed = False, user = self.request.user).exists():
-            i = 0
-            while(True):
-                updatedRowsCount = Task.objects.filter(priority=form.cleaned_data['priority']+i, deleted = False, completed = False, user = self.request.user).count()
-                if updatedRowsCount == 0:
-                    break
-                i += 1
-            Task.objects.filter(priority__gte=form.cleaned_data['priority'], priority__lte=form.cleaned_data['priority']+i ,deleted = False, completed = False, user = self.request.user).update(priority = F('priority')+1)
-        self.object = form.save()
-        self.object.user = self.request.user
-        self.object.save()
+        with transaction.atomic():
+            if 'priority' in form.changed_data:
+                make_room_for_priority(self.request.user, form.cleaned_data['priority'], exclude_pk = self.object.pk)
+            form.instance.user = self.request.user
+            # Completing a task without changing its status moves it to COMPLETED, as the complete views do
+            if 'completed' in form.changed_data and form.instance.completed and 'status' not in form.changed_data:
+                form.instance.status = COMPLETED_STATUS
+            self.object = form.save()
         return HttpResponseRedirect(self.get_success_url())
 
 class GenericTaskCreateView(LoginRequiredMixin, CreateView):
@@ -125,33 +144,46 @@ class GenericTaskCreateView(LoginRequiredMixin, CreateView):
     success_url = "/tasks"
 
     def form_valid(self, form):
-        if Task.objects.filter(priority=form.cleaned_data['priority'], deleted = False, completed = False, user = self.request.user).exists():
-            i = 0
-            while(True):
-                updatedRowsCount = Task.objects.filter(priority=form.cleaned_data['priority']+i, deleted = False, completed = False, user = self.request.user).count()
-                if updatedRowsCount == 0:
-                    break
-                i += 1
-            Task.objects.filter(priority__gte=form.cleaned_data['priority'], priority__lte=form.cleaned_data['priority']+i ,deleted = False, completed = False, user = self.request.user).update(priority = F('priority')+1)
-        self.object = form.save()
-        self.object.user = self.request.user
-        self.object.save()
+        with transaction.atomic():
+            make_room_for_priority(self.request.user, form.cleaned_data['priority'])
+            form.instance.user = self.request.user
+            self.object = form.save()
         return HttpResponseRedirect(self.get_success_url())
 
 
-class GenericTaskView(LoginRequiredMixin ,ListView):
+class TaskStatsMixin:
+    def get_task_stats(self):
+        if not hasattr(self, 'task_stats'):
+            user = self.request.user
+            self.task_stats, _ = cached_read('task-stats', user.id, '', lambda: TaskStats.objects.for_user(user))
+        return self.task_stats
+
+
+class GenericTaskView(ReplicaReadMixin, LoginRequiredMixin, TaskStatsMixin, CachedKeysetPageMixin, KeysetPaginationMixin, ListView):
     queryset = Task.objects.filter(deleted = False, completed = False)
     template_name = "tasks.html"
     context_object_name = "tasks"
     paginate_by = 5
+    cache_name = "tasks"
+
+    def estimate_count(self):
+        if self.request.GET.get("search"):
+            return None
+        stats = self.get_task_stats()
+        return stats.all_count - stats.completed_count
 
     def get_queryset(self):
         search_term = self.request.GET.get("search")
-        tasks = Task.objects.filter(deleted = False, completed = False, user=self.request.user).order_by('priority')
+        tasks = Task.objects.filter(deleted = False, completed = False, user=self.request.user).order_by('priority', 'id')
         if search_term:
-            tasks = tasks.filter(title__icontains = search_term)
+            tasks = search_tasks(tasks, search_term, user=self.request.user)
         return tasks
 
+    def get_keyset_ordering(self):
+        if self.request.GET.get("search"):
+            return SEARCH_ORDERING
+        return self.keyset_ordering
+
 class CreateTaskView(LoginRequiredMixin, View):
     def get(self,request):
         return render(request, "task_create.html")
@@ -166,14 +198,14 @@ class TaskView(View):
         search_term = request.GET.get("search")
         tasks = Task.objects.filter(deleted = False, completed = False)
         if search_term:
-            tasks = tasks.filter(title__icontains = search_term)
+            tasks = search_tasks(tasks, search_term)
         return render(request, "tasks.html", {"tasks":tasks})
 
 def tasks_view(request):
     search_term = request.GET.get("search")
     tasks = Task.objects.filter(deleted = False, completed = False)
     if search_term:
-        tasks = tasks.filter(title__icontains = search_term)
+        tasks = search_tasks(tasks, search_term)
     return render(request, "tasks.html", {"tasks":tasks})
 
 def add_task_view(request):
@@ -183,11 +215,11 @@ def add_task_view(request):
 
 def delete_task_view(request, index):
     task_obj = Task.objects.filter(id=index, user = request.user)
-    task_obj.update(deleted = True)
+    task_obj.soft_delete()
     return HttpResponseRedirect("/tasks")
 
 def complete_task_view(request,index):
-    Task.objects.filter(id=index, user = request.user).update(completed = True)
+    Task.objects.filter(id=index, user = request.user).mark_completed()
     return HttpResponseRedirect("/tasks")
 
 def complete_list_view(request):
@@ -201,33 +233,40 @@ def all_tasks_view(request):
     return render(request, "all_tasks.html", {"tasks":tasks, "completed_tasks":completed_tasks})
 
 
-class GenericAllTaskView(LoginRequiredMixin, ListView):
+class GenericAllTaskView(ReplicaReadMixin, LoginRequiredMixin, TaskStatsMixin, CachedKeysetPageMixin, KeysetPaginationMixin, ListView):
     model = Task
     context_object_name = 'all_tasks'   
     template_name = 'all_tasks.html'
     paginate_by = 5
+    cache_name = 'all-tasks'
+    keyset_ordering = ('completed', 'priority', 'id')
+
+    def estimate_count(self):
+        return self.get_task_stats().all_count
 
     def get_queryset(self):
-        all_tasks = Task.objects.filter(deleted = False, user = self.request.user).order_by('completed','priority')
+        all_tasks = Task.objects.filter(deleted = False, user = self.request.user).order_by('completed', 'priority', 'id')
         return all_tasks
 
     def get_context_data(self, **kwargs):
         context = super(GenericAllTaskView, self).get_context_data(**kwargs)
-        context['tasks'] = Task.objects.filter(deleted = False, completed = False, user = self.request.user).order_by('priority')
-        context['completed_tasks'] = Task.objects.filter(completed = True, user = self.request.user).order_by('priority')
-        all_tasks = Task.objects.filter(deleted = False, user = self.request.user).order_by('completed','priority')
-        context['completed_count'] = all_tasks.filter(completed=True).count()
-        context['all_count'] = all_tasks.count()
+        stats = self.get_task_stats()
+        context['completed_count'] = stats.completed_count
+        context['all_count'] = stats.all_count
         return context
 
 
-class GenericTaskCompleteListView(LoginRequiredMixin ,ListView):
+class GenericTaskCompleteListView(ReplicaReadMixin, LoginRequiredMixin, TaskStatsMixin, CachedKeysetPageMixin, KeysetPaginationMixin, ListView):
     template_name = "completed_tasks.html"
     context_object_name = "tasks"
     paginate_by = 5
+    cache_name = "completed-tasks"
+
+    def estimate_count(self):
+        return self.get_task_stats().completed_count
 
     def get_queryset(self):
-        completed_tasks = Task.objects.filter(completed = True, deleted = False, user=self.request.user).order_by('priority')
+        completed_tasks = Task.objects.filter(completed = True, deleted = False, user=self.request.user).order_by('priority', 'id')
         return completed_tasks
 
 # Alternative class of GenericTaskCompleteUpdateView
@@ -237,7 +276,7 @@ class GenericTaskCompleteView(AuthorizedTaskManager, DeleteView):
 
     def form_valid(self, form):
         success_url = self.get_success_url()
-        Task.objects.filter(id=self.object.id).update(completed = True)
+        Task.objects.filter(id=self.object.id).mark_completed()
         return HttpResponseRedirect(success_url)
 
 
@@ -247,9 +286,9 @@ class GenericTaskCompleteUpdateView(AuthorizedTaskManager, UpdateView):
     success_url = "/tasks"
 
     def form_valid(self, form):
+        form.instance.completed = True
+        form.instance.status = COMPLETED_STATUS
         self.object = form.save()
-        self.object.completed = True
-        self.object.save()
         return HttpResponseRedirect(self.get_success_url())
 
 class ReportCreateForm(ModelForm):
@@ -269,9 +308,8 @@ class GenericReportUpdateView(LoginRequiredMixin, UpdateView):
     success_url = "/tasks"
 
     def form_valid(self, form):
+        form.instance.user = self.request.user
         self.object = form.save()
-        self.object.user = self.request.user
-        self.object.save()
         return HttpResponseRedirect(self.get_success_url())
 
     def get_object(self, queryset=None):